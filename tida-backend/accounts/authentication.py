@@ -0,0 +1,203 @@
+# accounts/authentication.py
+"""
+JWT authentication without a users-table lookup per request.
+
+Access tokens carry the user's id, username, staff flag and token version. The
+authenticated user is a ``ClaimsUser`` built from those claims; its other fields
+are loaded on first use from a short-lived per-process cache.
+
+Revocation works through the token version: changing the password, deactivating
+the account or changing its staff flag bumps ``User.token_version``, and tokens
+carrying an older version are rejected. The current version of each user is kept
+in the shared cache and, for ``AUTH_USER_CACHE_SECONDS``, in the process, so other
+workers notice a revocation within that many seconds.
+"""
+import copy
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from tida_backend.db_router import primary_reads
+from .models import User, ClaimsUser
+
+USERNAME_CLAIM = 'username'
+STAFF_CLAIM = 'is_staff'
+VERSION_CLAIM = 'ver'
+
+USER_CACHE_SIZE = 4096
+
+# Per process: user id -> (expires, value).
+_versions = {}
+_values = {}
+
+def version_key(user_id):
+    return f"token-version:{user_id}"
+
+def _remember(store, user_id, value):
+    if len(store) >= USER_CACHE_SIZE:
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in store.items() if expires <= now]:
+            store.pop(key, None)
+        if len(store) >= USER_CACHE_SIZE:
+            store.pop(next(iter(store)), None)
+    store[user_id] = (time.monotonic() + settings.AUTH_USER_CACHE_SECONDS, value)
+
+def _recall(store, user_id):
+    entry = store.get(user_id)
+    if entry is None or entry[0] <= time.monotonic():
+        return None
+    return entry[1]
+
+def forget_user(user_id):
+    """Drop the cached version and fields of a user from this process."""
+    _versions.pop(user_id, None)
+    _values.pop(user_id, None)
+
+def _version_timeout():
+    # A cached version is only needed while tokens carrying it can still be valid.
+    return int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+def current_token_version(user_id):
+    """Return the token version of an active user, or None if the user is missing or inactive."""
+    version = _recall(_versions, user_id)
+    if version is None:
+        version = cache.get(version_key(user_id))
+        if version is None:
+            # From the primary, so replica lag cannot cache a revoked version again.
+            with primary_reads():
+                version = User.objects.filter(
+                    pk=user_id, is_active=True
+                ).values_list('token_version', flat=True).first()
+            # Missing and inactive users are cached as -1 so bad tokens cannot hammer the database.
+            version = -1 if version is None else version
+            cache.set(version_key(user_id), version, timeout=_version_timeout())
+        _remember(_versions, user_id, version)
+    return None if version < 0 else version
+
+async def acurrent_token_version(user_id):
+    """Async counterpart of ``current_token_version``."""
+    version = _recall(_versions, user_id)
+    if version is None:
+        version = await cache.aget(version_key(user_id))
+        if version is None:
+            with primary_reads():
+                version = await User.objects.filter(
+                    pk=user_id, is_active=True
+                ).values_list('token_version', flat=True).afirst()
+            version = -1 if version is None else version
+            await cache.aset(version_key(user_id), version, timeout=_version_timeout())
+        _remember(_versions, user_id, version)
+    return None if version < 0 else version
+
+def user_values(user_id):
+    """Return every field of a user by attname, from the per-process cache when fresh."""
+    values = _recall(_values, user_id)
+    if values is None:
+        values = User.objects.filter(pk=user_id).values(
+            *(field.attname for field in User._meta.concrete_fields)
+        ).first()
+        if values is None:
+            return None
+        _remember(_values, user_id, values)
+    # Callers get their own copy, so mutating a JSON field cannot leak into the cache.
+    return copy.deepcopy(values)
+
+def revoke_tokens(user_id):
+    """
+    Invalidate every token issued to a user.
+
+    Saving a user revokes its tokens on its own when needed; call this after bulk
+    updates that bypass ``save``.
+    """
+    User.objects.filter(pk=user_id).update(token_version=models.F('token_version') + 1)
+    forget_user(user_id)
+    transaction.on_commit(lambda: (cache.delete(version_key(user_id)), forget_user(user_id)))
+
+def claims_user(user_id, username, is_staff, version):
+    """Return a ``ClaimsUser`` with only the claimed fields loaded."""
+    claims = {
+        User._meta.pk.attname: user_id,
+        'username': username,
+        'is_staff': is_staff,
+        'is_active': True,
+        'token_version': version,
+    }
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in claims]
+    return ClaimsUser.from_db(DEFAULT_DB_ALIAS, fields, [claims[name] for name in fields])
+
+class UserRefreshToken(RefreshToken):
+    """Refresh token carrying the claims ``ClaimsJWTAuthentication`` builds users from."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[USERNAME_CLAIM] = user.username
+        token[STAFF_CLAIM] = user.is_staff
+        token[VERSION_CLAIM] = user.token_version
+        return token
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = UserRefreshToken
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuse to refresh tokens that were revoked after they were issued."""
+    token_class = UserRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id is not None and current_token_version(user_id) != refresh.payload.get(VERSION_CLAIM, 0):
+            raise AuthenticationFailed("Token has been revoked.", code='token_revoked')
+        return super().validate(attrs)
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that builds the user from token claims.
+
+    Tokens issued before the claims existed still work: their user is loaded in
+    full, through the same per-process cache.
+    """
+    def get_user(self, validated_token):
+        user_id = self.user_id(validated_token)
+        return self.build_user(user_id, validated_token, current_token_version(user_id))
+
+    async def aget_user(self, validated_token):
+        user_id = self.user_id(validated_token)
+        user = self.build_user(user_id, validated_token, await acurrent_token_version(user_id))
+        return user if USERNAME_CLAIM in validated_token else await user.aload()
+
+    async def aauthenticate(self, request):
+        """Async counterpart of ``authenticate``; stays on the event loop while the process cache is warm."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+    def build_user(self, user_id, validated_token, version):
+        if version is None:
+            raise AuthenticationFailed("User not found or inactive.", code='user_inactive')
+        if validated_token.get(VERSION_CLAIM, 0) != version:
+            raise AuthenticationFailed("Token has been revoked.", code='token_revoked')
+
+        if USERNAME_CLAIM not in validated_token:
+            # Issued before the claims existed: every field but the id loads on first use.
+            return ClaimsUser.from_db(DEFAULT_DB_ALIAS, [User._meta.pk.attname], [user_id])
+        return claims_user(
+            user_id, validated_token[USERNAME_CLAIM], validated_token.get(STAFF_CLAIM, False), version
+        )
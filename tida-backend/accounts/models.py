@@ -5,8 +5,47 @@ from django.contrib.auth.models import AbstractUser
 class User(AbstractUser):
     """Custom user model that extends the Django AbstractUser model."""
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     theme_preference = models.CharField(max_length=10, default='light')
+    timezone = models.CharField(max_length=64, blank=True)
     bio = models.TextField(blank=True)
+    # Part of every issued token; bumping it revokes them (see accounts.authentication).
+    token_version = models.PositiveIntegerField(default=0, editable=False)
     
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # Lets a save tell whether it revokes tokens without reading the row again.
+        user._loaded_access = (user.__dict__.get('is_active'), user.__dict__.get('is_staff'))
+        return user
+
+class ClaimsUser(User):
+    """
+    A user built from the claims of an access token instead of a database row.
+
+    Only the claimed fields are loaded. Reading any other field loads all of them at
+    once from the per-process cache in ``accounts.authentication``, so requests that
+    only need the user's id never query the users table.
+    """
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if from_queryset is None and fields is not None and deferred and set(fields) <= deferred:
+            from .authentication import user_values
+            values = user_values(self.pk)
+            if values is not None:
+                self.__dict__.update({name: values[name] for name in deferred})
+                return
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+    async def aload(self):
+        """Load the unclaimed fields, for async code that cannot trigger a lazy load."""
+        deferred = self.get_deferred_fields()
+        if deferred:
+            await self.arefresh_from_db(fields=deferred)
+        return self
\ No newline at end of file
@@ -1,20 +1,38 @@
+from zoneinfo import available_timezones
 from rest_framework import serializers
+from tida_backend.serializers import ModelSerializer
+from core.images import variant_urls
 from .models import User
 
-class UserSerializer(serializers.ModelSerializer):
+class AvatarVariantsMixin:
+    def get_avatar_variants(self, obj):
+        """Get URLs of the resized avatar variants."""
+        return variant_urls(obj.avatar, obj.avatar_variants, 'avatar', self.context.get('request'))
+
+class UserSerializer(AvatarVariantsMixin, ModelSerializer):
+    avatar_variants = serializers.SerializerMethodField()
+    
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'avatar', 'theme_preference', 'bio']
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'avatar', 'avatar_variants', 'theme_preference', 'timezone', 'bio']
         read_only_fields = ['id', 'username']  # Added 'username' to the read-only fields
+    
+    def validate_timezone(self, value):
+        """Validate the timezone is a known IANA zone name."""
+        if value and value not in available_timezones():
+            raise serializers.ValidationError("Unknown timezone.")
+        return value
 
-class UserLightSerializer(serializers.ModelSerializer):
+class UserLightSerializer(AvatarVariantsMixin, ModelSerializer):
     """Lightweight user serializer for nested representations."""
+    avatar_variants = serializers.SerializerMethodField()
+    
     class Meta:
         model = User
-        fields = ['id', 'username', 'avatar']
+        fields = ['id', 'username', 'avatar', 'avatar_variants']
         read_only_fields = fields
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(ModelSerializer):
     """Custom serializer for user registration."""
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
     password_confirm = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
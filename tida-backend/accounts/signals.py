@@ -0,0 +1,62 @@
+# accounts/signals.py
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from core.images import delete_variants, schedule_variants
+from .authentication import forget_user, revoke_tokens
+from .models import User, ClaimsUser
+
+# Request users are ClaimsUser proxies, and signals are sent with the proxy as sender.
+USER_MODELS = (User, ClaimsUser)
+
+def generate_avatar_variants(sender, instance, **kwargs):
+    """Render resized avatar variants after a new avatar is uploaded, deleting those of the avatar it replaced."""
+    source = instance.avatar_variants.get('source')
+    if instance.avatar_variants and source != instance.avatar.name:
+        User.objects.filter(pk=instance.pk).update(avatar_variants={})
+        instance.avatar_variants = {}
+        if source:
+            storage = instance.avatar.storage
+            transaction.on_commit(lambda: delete_variants(storage, source, 'avatar'), using=instance._state.db)
+    
+    schedule_variants(instance, 'avatar', 'avatar_variants', 'avatar')
+
+def detect_token_revocation(sender, instance, update_fields=None, **kwargs):
+    """Flag saves that change the password, deactivate the account or change its staff flag."""
+    if instance._state.adding or instance.pk is None:
+        return
+    # set_password() leaves the raw password in _password until the next save.
+    if instance._password is not None:
+        instance._revoke_tokens = True
+        return
+    if update_fields is not None and not {'is_active', 'is_staff'} & set(update_fields):
+        return
+    if {'is_active', 'is_staff'} & instance.get_deferred_fields():
+        return
+
+    access = (instance.is_active, instance.is_staff)
+    loaded = getattr(instance, '_loaded_access', (None, None))
+    if None in loaded:
+        instance._revoke_tokens = User.objects.filter(pk=instance.pk).exclude(
+            is_active=instance.is_active, is_staff=instance.is_staff
+        ).exists()
+    else:
+        instance._revoke_tokens = access != loaded
+
+def revoke_changed_tokens(sender, instance, **kwargs):
+    """Bump the token version of flagged saves and drop the user from this process's cache."""
+    if not {'is_active', 'is_staff'} & instance.get_deferred_fields():
+        instance._loaded_access = (instance.is_active, instance.is_staff)
+    if instance.__dict__.pop('_revoke_tokens', False):
+        revoke_tokens(instance.pk)
+        instance.refresh_from_db(fields=['token_version'])
+    else:
+        forget_user(instance.pk)
+
+def forget_deleted_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+for model in USER_MODELS:
+    post_save.connect(generate_avatar_variants, sender=model)
+    pre_save.connect(detect_token_revocation, sender=model)
+    post_save.connect(revoke_changed_tokens, sender=model)
+    post_delete.connect(forget_deleted_user, sender=model)
@@ -23,7 +23,8 @@ class UserViewSet(viewsets.ModelViewSet):
         """Create a new user with encrypted password."""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.validated_data['password'] = make_password(serializer.validated_data['password'])
+        # UserSerializer has no password field; without one in the request the account gets an unusable password.
+        serializer.validated_data['password'] = make_password(request.data.get('password'))
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
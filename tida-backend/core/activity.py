@@ -0,0 +1,228 @@
+# core/activity.py
+"""
+Append-only log of who created, moved, assigned, archived or deleted what.
+
+Views call ``record`` next to their writes, but nothing is written there: each
+entry waits for ``transaction.on_commit``, so entries of a rolled back transaction
+vanish with it. Entries committed while a request is processed are held in memory
+and written with a single INSERT when its response is ready (``ActivityMiddleware``);
+outside a request they are written as soon as they commit.
+
+On PostgreSQL the table is partitioned by month on ``created_at``. The
+``maintain_activity_partitions`` job keeps ``ACTIVITY_PARTITIONS_AHEAD`` months of
+partitions ready and, when ``ACTIVITY_RETENTION_MONTHS`` is set, drops older ones
+whole instead of deleting their rows.
+"""
+import functools
+import logging
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.utils import timezone
+from .jobs import enqueue, job
+from .models import Activity, Job
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = getattr(settings, 'ACTIVITY_BUFFER_SIZE', 500)
+PARTITIONS_AHEAD = getattr(settings, 'ACTIVITY_PARTITIONS_AHEAD', 3)
+RETENTION_MONTHS = getattr(settings, 'ACTIVITY_RETENTION_MONTHS', 0)
+MAINTENANCE_INTERVAL = timedelta(days=1)
+
+# Written by hand because the primary key of a partitioned table must include the
+# partition key; keep the columns in step with the Activity model.
+PARTITIONED_TABLE_SQL = """
+CREATE TABLE %(table)s (
+    "id" bigserial NOT NULL,
+    "created_at" timestamp with time zone NOT NULL,
+    "project_id" bigint NOT NULL,
+    "task_id" bigint NULL,
+    "actor_id" bigint NULL,
+    "verb" varchar(40) NOT NULL,
+    "object_id" bigint NOT NULL CHECK ("object_id" >= 0),
+    "data" jsonb NOT NULL,
+    PRIMARY KEY ("id", "created_at")
+) PARTITION BY RANGE ("created_at")
+"""
+
+PARTITION_SUFFIX = re.compile(r'_y(\d{4})m(\d{2})$')
+
+_buffer = ContextVar('activity_buffer', default=None)
+
+def record(actor, verb, obj, project, task=None, **data):
+    """Log that ``actor`` did ``verb`` to ``obj`` in ``project`` once the current transaction commits."""
+    entry = Activity(
+        created_at=timezone.now(),
+        project_id=project.pk,
+        task_id=task.pk if task is not None else None,
+        actor_id=actor.pk if actor is not None else None,
+        verb=verb,
+        object_id=obj.pk,
+        data=data
+    )
+    transaction.on_commit(functools.partial(_committed, entry), using=router.db_for_write(Activity))
+
+def _committed(entry):
+    buffer = _buffer.get()
+    if buffer is None:
+        write([entry])
+        return
+
+    buffer.append(entry)
+    if len(buffer) >= BUFFER_SIZE:
+        flush(buffer)
+
+def write(entries):
+    """Insert committed entries; the log is best effort, so a failure is logged rather than raised."""
+    try:
+        Activity.objects.bulk_create(entries, batch_size=BUFFER_SIZE)
+    except Exception:
+        logger.exception("Could not write %s activity entries", len(entries))
+
+def flush(buffer):
+    """Write and empty ``buffer``."""
+    entries = buffer[:]
+    buffer.clear()
+    if entries:
+        write(entries)
+
+@contextmanager
+def collect_activity():
+    """Hold the entries committed inside the block and write them in one batch when it ends."""
+    buffer = []
+    token = _buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _buffer.reset(token)
+        flush(buffer)
+
+class ActivityMiddleware:
+    """Write the activity entries a request commits in one INSERT once its response is ready."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with collect_activity():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        buffer = []
+        token = _buffer.set(buffer)
+        try:
+            return await self.get_response(request)
+        finally:
+            _buffer.reset(token)
+            if buffer:
+                await sync_to_async(flush)(buffer)
+
+def month_start(value, months=0):
+    """Return midnight UTC on the first day of the month ``months`` after the one holding ``value``."""
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+def partition_name(month):
+    return f"{Activity._meta.db_table}_y{month:%Y}m{month:%m}"
+
+def partitions(cursor):
+    """Return the names of the existing partitions of the activity table."""
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits"
+        " JOIN pg_class parent ON parent.oid = pg_inherits.inhparent"
+        " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+        " WHERE parent.relname = %s",
+        [Activity._meta.db_table]
+    )
+    return {name for name, in cursor.fetchall()}
+
+def ensure_partitions(using=DEFAULT_DB_ALIAS, now=None):
+    """
+    Create the monthly partitions from this month to ``ACTIVITY_PARTITIONS_AHEAD`` months ahead
+    and drop those past ``ACTIVITY_RETENTION_MONTHS``; PostgreSQL only.
+
+    Rows that fell into the default partition because their month had none yet are
+    moved into the new partition before it is attached.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+
+    now = now or timezone.now()
+    quote = connection.ops.quote_name
+    table = Activity._meta.db_table
+    default = f"{table}_default"
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        existing = partitions(cursor)
+        if default not in existing:
+            cursor.execute(f"CREATE TABLE {quote(default)} PARTITION OF {quote(table)} DEFAULT")
+
+        for offset in range(PARTITIONS_AHEAD + 1):
+            start, end = month_start(now, offset), month_start(now, offset + 1)
+            name = partition_name(start)
+            if name in existing:
+                continue
+            bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {quote(default)} WHERE created_at >= %s AND created_at < %s RETURNING *)"
+                f" INSERT INTO {quote(name)} SELECT * FROM moved",
+                [start, end]
+            )
+            cursor.execute(f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES {bounds}")
+
+        if RETENTION_MONTHS:
+            oldest = month_start(now, -RETENTION_MONTHS)
+            for name in existing:
+                match = PARTITION_SUFFIX.search(name)
+                if match and datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc) < oldest:
+                    cursor.execute(f"DROP TABLE {quote(name)}")
+
+@job
+def maintain_activity_partitions():
+    """Keep the activity partitions of every shard ahead of the clock; runs daily."""
+    try:
+        for alias in settings.DATABASE_SHARDS:
+            ensure_partitions(alias)
+    finally:
+        schedule_partition_maintenance(delay=MAINTENANCE_INTERVAL)
+
+def schedule_partition_maintenance(delay=None):
+    """Queue ``maintain_activity_partitions`` unless a run is already waiting."""
+    name = f"{maintain_activity_partitions.__module__}.{maintain_activity_partitions.__name__}"
+    if not Job.objects.filter(task=name, status=Job.PENDING).exists():
+        enqueue(maintain_activity_partitions, delay=delay)
+
+def create_activity_table(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """``post_migrate`` receiver creating the activity table, partitioned by month on PostgreSQL."""
+    if not router.allow_migrate_model(using, Activity):
+        return
+
+    connection = connections[using]
+    table = Activity._meta.db_table
+    if table not in connection.introspection.table_names():
+        with connection.schema_editor() as editor:
+            if connection.vendor == 'postgresql':
+                editor.execute(PARTITIONED_TABLE_SQL % {'table': editor.quote_name(table)})
+            else:
+                editor.create_model(Activity)
+            # Not created with the table because the model is unmanaged.
+            for index in Activity._meta.indexes:
+                editor.add_index(Activity, index)
+
+    if connection.vendor == 'postgresql':
+        ensure_partitions(using)
+        schedule_partition_maintenance()
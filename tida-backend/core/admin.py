@@ -1,74 +1,225 @@
 # core/admin.py
+"""
+Admin for tables that grow to millions of rows.
+
+Foreign keys are edited through autocomplete or raw-id widgets instead of selects
+listing every row, changelists load the objects they display with their parents,
+list filters never enumerate a related table, inlines of unbounded relations show
+their newest rows read-only, and the changelists of the big tables page with the
+planner's row estimate instead of counting the whole table.
+"""
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 from .models import (
-    Project, Board, Column, Task, SubTask, 
-    Tag, TaskTag, Comment, Attachment
+    Workspace, Project, Board, Column, Task, SubTask,
+    Tag, TaskTag, Comment, Attachment, Blob, Job
 )
 
+# Below this many rows the exact count is cheap enough, and exact.
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+def estimated_count(model, using):
+    """Return PostgreSQL's row estimate for a model's table, or None where there is none."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [connection.ops.quote_name(model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    # -1 until the table is first analyzed.
+    return row[0] if row and row[0] >= 0 else None
+
+class EstimatedCountPaginator(Paginator):
+    """Paginate an unfiltered changelist of a big table without ``SELECT COUNT(*)`` over all of it."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too big to count or sort in full."""
+    paginator = EstimatedCountPaginator
+    # Filtered changelists otherwise count the whole table too, for "N of M selected".
+    show_full_result_count = False
+    # Newest first along the primary key; the default orderings sort the whole table.
+    ordering = ('-pk',)
+
+class CappedInlineFormSet(BaseInlineFormSet):
+    """Inline formset showing only the first ``cap`` related rows."""
+    cap = None
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            self._queryset = super().get_queryset()[:self.cap]
+        return self._queryset
+
+class CappedInline(admin.TabularInline):
+    """
+    Read-only inline listing the newest ``cap`` rows of an unbounded relation.
+
+    Each row links to its own change page, and the heading to the changelist of all of them.
+    """
+    formset = CappedInlineFormSet
+    extra = 0
+    cap = 20
+    ordering = ('-pk',)
+    show_change_link = True
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.cap = self.cap
+        if obj is not None:
+            opts = self.model._meta
+            url = reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist')
+            self.verbose_name_plural = format_html(
+                '{} (newest {}, <a href="{}?{}__id__exact={}">view all</a>)',
+                opts.verbose_name_plural, self.cap, url, formset.fk.name, obj.pk
+            )
+        return formset
+
 class ColumnInline(admin.TabularInline):
     model = Column
     extra = 0
 
+class WorkspaceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'shard', 'is_moving', 'created_by', 'created_at')
+    list_select_related = ('created_by',)
+    search_fields = ('name',)
+    list_filter = ('shard', 'is_moving')
+    autocomplete_fields = ('created_by', 'members')
+    # Changed only by `manage.py move_workspace`, which copies the rows along.
+    readonly_fields = ('shard', 'is_moving')
+
+class ProjectAdmin(admin.ModelAdmin):
+    list_display = ('name', 'created_by', 'is_archived', 'created_at')
+    list_select_related = ('created_by',)
+    search_fields = ('name',)
+    list_filter = ('is_archived',)
+    autocomplete_fields = ('created_by', 'members')
+
 class BoardAdmin(admin.ModelAdmin):
     list_display = ('name', 'project')
+    list_select_related = ('project',)
     search_fields = ('name', 'project__name')
-    list_filter = ('project',)
+    autocomplete_fields = ('project',)
     inlines = [ColumnInline]
 
-class TaskInline(admin.TabularInline):
+class TaskInline(CappedInline):
     model = Task
-    extra = 0
+    fields = ('title', 'priority', 'due_date', 'assigned_to', 'position')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('assigned_to')
 
-class ColumnAdmin(admin.ModelAdmin):
+class ColumnAdmin(LargeTableAdmin):
     list_display = ('name', 'position', 'board')
+    list_select_related = ('board__project',)
     search_fields = ('name', 'board__name')
-    list_filter = ('board',)
+    autocomplete_fields = ('board',)
     inlines = [TaskInline]
 
-class SubTaskInline(admin.TabularInline):
+class SubTaskInline(CappedInline):
     model = SubTask
-    extra = 0
+    fields = ('title', 'is_completed')
 
-class CommentInline(admin.TabularInline):
+class CommentInline(CappedInline):
     model = Comment
-    extra = 0
+    fields = ('user', 'content', 'created_at')
+    readonly_fields = ('created_at',)
+
+    def get_queryset(self, request):
+        # Both are read by the row's title.
+        return super().get_queryset(request).select_related('task', 'user')
 
-class AttachmentInline(admin.TabularInline):
+class AttachmentInline(CappedInline):
     model = Attachment
-    extra = 0
+    fields = ('name', 'uploaded_by', 'uploaded_at')
+    readonly_fields = ('uploaded_at',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('uploaded_by')
 
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(LargeTableAdmin):
     list_display = ('title', 'priority', 'due_date', 'column', 'created_by', 'assigned_to')
+    list_select_related = ('column__board', 'created_by', 'assigned_to')
     search_fields = ('title', 'description')
-    list_filter = ('priority', 'column', 'created_by', 'assigned_to')
+    list_filter = ('priority', 'is_completed')
+    autocomplete_fields = ('column', 'created_by', 'assigned_to')
     inlines = [SubTaskInline, CommentInline, AttachmentInline]
 
-class SubTaskAdmin(admin.ModelAdmin):
+class SubTaskAdmin(LargeTableAdmin):
     list_display = ('title', 'is_completed', 'task')
+    list_select_related = ('task',)
     search_fields = ('title', 'task__title')
-    list_filter = ('is_completed', 'task')
+    list_filter = ('is_completed',)
+    raw_id_fields = ('task',)
 
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'color', 'user')
+    list_select_related = ('user',)
     search_fields = ('name',)
-    list_filter = ('user',)
+    autocomplete_fields = ('user',)
 
-class CommentAdmin(admin.ModelAdmin):
+class TaskTagAdmin(LargeTableAdmin):
+    list_select_related = ('task', 'tag')
+    raw_id_fields = ('task', 'tag')
+
+class CommentAdmin(LargeTableAdmin):
     list_display = ('task', 'user', 'created_at')
+    list_select_related = ('task', 'user')
     search_fields = ('content', 'task__title', 'user__username')
-    list_filter = ('user', 'created_at')
+    list_filter = ('created_at',)
+    raw_id_fields = ('task',)
+    autocomplete_fields = ('user',)
 
-class AttachmentAdmin(admin.ModelAdmin):
+class AttachmentAdmin(LargeTableAdmin):
     list_display = ('name', 'task', 'uploaded_by', 'uploaded_at')
+    list_select_related = ('task', 'uploaded_by')
     search_fields = ('name', 'task__title', 'uploaded_by__username')
-    list_filter = ('uploaded_by', 'uploaded_at')
+    list_filter = ('uploaded_at',)
+    raw_id_fields = ('task',)
+    autocomplete_fields = ('uploaded_by',)
+
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'size', 'ref_count', 'created_at')
+    search_fields = ('digest',)
+    readonly_fields = ('digest', 'file', 'size', 'ref_count', 'created_at')
+
+class JobAdmin(LargeTableAdmin):
+    list_display = ('task', 'status', 'attempts', 'run_after', 'wait_ms', 'duration_ms', 'finished_at')
+    search_fields = ('task',)
+    list_filter = ('status', 'task')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'wait_ms', 'duration_ms', 'last_error')
 
-admin.site.register(Project)
+admin.site.register(Workspace, WorkspaceAdmin)
+admin.site.register(Project, ProjectAdmin)
 admin.site.register(Board, BoardAdmin)
 admin.site.register(Column, ColumnAdmin)
 admin.site.register(Task, TaskAdmin)
 admin.site.register(SubTask, SubTaskAdmin)
 admin.site.register(Tag, TagAdmin)
-admin.site.register(TaskTag)
+admin.site.register(TaskTag, TaskTagAdmin)
 admin.site.register(Comment, CommentAdmin)
-admin.site.register(Attachment, AttachmentAdmin)
\ No newline at end of file
+admin.site.register(Attachment, AttachmentAdmin)
+admin.site.register(Blob, BlobAdmin)
+admin.site.register(Job, JobAdmin)
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals  # noqa: F401
+        from .activity import create_activity_table
+        from .sharding import prepare_shard
+        
+        post_migrate.connect(create_activity_table, sender=self)
+        post_migrate.connect(prepare_shard, sender=self)
@@ -0,0 +1,220 @@
+# core/async_views.py
+"""
+Async versions of the hot read endpoints, served when running under ASGI.
+
+Each view answers GET itself on the async ORM and hands every other method (and
+any variant it does not implement) to the regular DRF viewset, so the URLs and
+payloads are the same in both serving modes.
+"""
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import models
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from accounts.authentication import ClaimsJWTAuthentication
+from tida_backend.renderers import ORJSONRenderer, MessagePackRenderer
+from tida_backend.throttling import TokenBucketThrottle
+from .cache import acached_user_data
+from .models import Project, Board, Column, Task, Comment
+from .serializers import (
+    ProjectLightSerializer, BoardSerializer, BoardLightSerializer, ColumnLightSerializer,
+    TaskSerializer, TaskLightSerializer, CommentSerializer, MyTaskSerializer
+)
+from .pagination import BucketPagination, CommentCursorPagination
+from .views import (
+    TaskViewSet, accessible_project_ids, board_scope, include_archived, board_snapshot_queryset,
+    task_snapshot_queryset, my_tasks_condition, my_task_bucket_filters, my_task_bucket_rows
+)
+
+def render(request, data, status=200):
+    """Render ``data`` as MessagePack when the client asks for it, JSON otherwise."""
+    renderer = ORJSONRenderer()
+    if MessagePackRenderer.media_type in request.headers.get('Accept', ''):
+        renderer = MessagePackRenderer()
+    return HttpResponse(renderer.render(data), status=status, content_type=renderer.media_type)
+
+async def authenticate(request):
+    """Authenticate the JWT bearer token the same way the DRF views do, or return a 401 response."""
+    authenticator = ClaimsJWTAuthentication()
+    try:
+        result = await authenticator.aauthenticate(request)
+    except exceptions.AuthenticationFailed as exc:
+        detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+    else:
+        if result is not None:
+            request.user = result[0]
+            return None
+        detail = {'detail': exceptions.NotAuthenticated.default_detail}
+
+    response = render(request, detail, status=401)
+    response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+    return response
+
+async def throttle(request, view_class, action):
+    """Charge the request to the user's token buckets as the DRF views do, or return a 429 response."""
+    seconds = await sync_to_async(TokenBucketThrottle().check)(request, view_class, action)
+    if seconds is None:
+        return None
+    exc = exceptions.Throttled(seconds)
+    response = render(request, {'detail': exc.detail}, status=exc.status_code)
+    response['Retry-After'] = str(exc.wait)
+    return response
+
+def async_reads(async_view, sync_view):
+    """
+    Route GET requests to ``async_view`` and everything else to ``sync_view``.
+
+    ``async_view`` may return None to fall back to the sync view for a variant it
+    does not implement.
+    """
+    view_class, action = sync_view.cls, sync_view.actions.get('get')
+    sync_view = sync_to_async(sync_view)
+
+    @csrf_exempt
+    async def view(request, *args, **kwargs):
+        if request.method == 'GET':
+            response = await authenticate(request)
+            if response is not None:
+                return response
+            response = await throttle(request, view_class, action)
+            if response is not None:
+                return response
+
+            response = await async_view(request, *args, **kwargs)
+            if response is not None:
+                return response
+        return await sync_view(request, *args, **kwargs)
+
+    view.__name__ = async_view.__name__
+    view.__module__ = async_view.__module__
+    return view
+
+async def is_member(user, project):
+    """Async counterpart of ``IdentityMap.is_member``."""
+    if user.pk == project.created_by_id:
+        return True
+    return await Project.members.through.objects.filter(
+        project_id=project.pk, user_id=user.pk
+    ).aexists()
+
+async def board_detail(request, pk):
+    """Full board snapshot: columns, tasks and everything nested in them."""
+    board = await board_snapshot_queryset().filter(
+        board_scope(request.user, include_archived=include_archived(request)), pk=pk
+    ).afirst()
+    if board is None:
+        return render(request, {"detail": "No Board matches the given query."}, status=404)
+
+    return render(request, BoardSerializer(board, context={'request': request}).data)
+
+async def project_light(request):
+    data = await acached_user_data(
+        request, 'projects', ('project',),
+        lambda: ProjectLightSerializer(
+            Project.objects.filter(id__in=accessible_project_ids(request.user, include_archived(request))),
+            many=True
+        ).data
+    )
+    return render(request, data)
+
+async def board_light(request):
+    data = await acached_user_data(
+        request, 'boards', ('project', 'board'),
+        lambda: BoardLightSerializer(
+            Board.objects.filter(board_scope(request.user, include_archived=include_archived(request))),
+            many=True
+        ).data
+    )
+    return render(request, data)
+
+async def column_light(request):
+    data = await acached_user_data(
+        request, 'columns', ('project', 'board', 'column'),
+        lambda: ColumnLightSerializer(
+            Column.objects.filter(board_scope(request.user, 'board', include_archived(request))), many=True
+        ).data
+    )
+    return render(request, data)
+
+async def task_light(request):
+    data = await acached_user_data(
+        request, 'tasks', ('project', 'board', 'column', 'task', 'user'),
+        lambda: TaskLightSerializer(
+            Task.objects.filter(
+                board_scope(request.user, 'column__board', include_archived(request))
+            ).select_related('assigned_to'), many=True
+        ).data
+    )
+    return render(request, data)
+
+async def my_tasks(request):
+    """
+    Tasks assigned to the current user, plain or split into due-date buckets.
+
+    Paging through a single ``?bucket=`` is left to the sync view.
+    """
+    params = request.GET
+    if params.get('mode') != 'buckets':
+        tasks = [
+            task async for task in task_snapshot_queryset().filter(my_tasks_condition(request))
+        ]
+        return render(request, TaskSerializer(tasks, many=True, context={'request': request}).data)
+
+    if 'bucket' in params:
+        return None
+
+    tz_name = params.get('tz') or (await request.user.aload()).timezone or settings.TIME_ZONE
+    try:
+        zone = ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return render(request, {"detail": "Unknown timezone."}, status=400)
+
+    bucket_filters = my_task_bucket_filters(zone)
+    open_tasks = Task.objects.filter(my_tasks_condition(request), is_completed=False)
+    counts = await open_tasks.aaggregate(**{
+        name: models.Count('id', filter=condition)
+        for name, condition in bucket_filters.items()
+    })
+
+    page_size = BucketPagination().get_page_size(Request(request))
+    buckets = {}
+    for name in TaskViewSet.MY_TASK_BUCKETS:
+        rows = my_task_bucket_rows(open_tasks, bucket_filters[name])[:page_size]
+        buckets[name] = MyTaskSerializer([task async for task in rows], many=True).data
+
+    return render(request, {'timezone': tz_name, 'counts': counts, 'buckets': buckets})
+
+async def task_comments(request):
+    """Comments on a task, newest first, a cursor-paginated page at a time."""
+    task_id = request.GET.get('task_id')
+    if not task_id:
+        return render(request, {"detail": "Task ID is required."}, status=400)
+
+    try:
+        task = await Task.objects.select_related('column__board__project').filter(pk=int(task_id)).afirst()
+    except ValueError:
+        task = None
+    if task is None:
+        return render(request, {"detail": "No Task matches the given query."}, status=404)
+
+    board = task.column.board
+    if board.deleted_at or board.project.deleted_at or not await is_member(request.user, board.project):
+        return render(
+            request, {"detail": "You do not have permission to view comments for this task."},
+            status=403
+        )
+
+    # DRF paginators only run synchronously; the page is a single indexed query.
+    paginator = CommentCursorPagination()
+    try:
+        page = await sync_to_async(paginator.paginate_queryset)(
+            Comment.objects.filter(task=task).select_related('user'), Request(request)
+        )
+    except exceptions.NotFound as exc:
+        return render(request, {'detail': exc.detail}, status=404)
+    data = CommentSerializer(page, many=True, context={'request': request}).data
+    return render(request, paginator.get_paginated_response(data).data)
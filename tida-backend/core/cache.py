@@ -0,0 +1,117 @@
+# core/cache.py
+import hashlib
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from tida_backend.db_router import current_shard, current_workspace, primary_reads
+
+LIGHT_CACHE_TIMEOUT = getattr(settings, 'LIGHT_CACHE_TIMEOUT', 24 * 60 * 60)
+
+_batched = ContextVar('batched_generations', default=None)
+
+def generation_key(name):
+    return f"generation:{name}"
+
+def membership_key(user_id):
+    return f"membership:{user_id}"
+
+def _new_version():
+    return uuid.uuid4().hex[:16]
+
+def _bump(keys):
+    transaction.on_commit(
+        lambda: cache.set_many({key: _new_version() for key in keys}, timeout=None), using=current_shard()
+    )
+
+def bump_generation(*names):
+    """Invalidate every cached response built from the given models once the transaction commits."""
+    batched = _batched.get()
+    if batched is not None:
+        batched.update(names)
+        return
+    _bump([generation_key(name) for name in names])
+
+@contextmanager
+def batched_generations():
+    """
+    Bump each generation once for all the writes in the block, instead of once per
+    saved or deleted row; enter it inside the transaction the writes commit with.
+    """
+    names = set()
+    token = _batched.set(names)
+    try:
+        yield
+    finally:
+        _batched.reset(token)
+    if names:
+        _bump([generation_key(name) for name in sorted(names)])
+
+def bump_membership(*user_ids):
+    """Invalidate the cached responses of users whose project memberships changed."""
+    _bump([membership_key(user_id) for user_id in user_ids])
+
+def current_versions(keys):
+    """Return the current version token of every key, creating tokens that do not exist yet."""
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, _new_version(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, '') for key in keys]
+
+def _data_key(request, name, versions):
+    fingerprint = hashlib.sha1(
+        '|'.join(versions + [request.GET.urlencode(), str(current_workspace())]).encode()
+    ).hexdigest()
+    return f"light:{name}:{request.user.pk}:{fingerprint}"
+
+def _version_keys(user_id, models):
+    return [membership_key(user_id)] + [generation_key(model) for model in models]
+
+def cached_user_data(request, name, models, build):
+    """
+    Return ``build()`` for the requesting user, cached under their membership version
+    and the generation of every model the data is built from.
+
+    Signals bump the versions on commit, so a stale entry is simply never read again.
+    Misses are built from the primary so replica lag cannot be cached under a new version.
+    """
+    key = _data_key(request, name, current_versions(_version_keys(request.user.pk, models)))
+
+    data = cache.get(key)
+    if data is None:
+        with primary_reads():
+            data = build()
+        cache.set(key, data, timeout=LIGHT_CACHE_TIMEOUT)
+    return data
+
+async def acurrent_versions(keys):
+    """Async counterpart of ``current_versions``."""
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, _new_version(), timeout=None)
+        versions.update(await cache.aget_many(missing))
+    return [versions.get(key, '') for key in keys]
+
+async def acached_user_data(request, name, models, build):
+    """
+    Async counterpart of ``cached_user_data``; both read and write the same entries.
+
+    Only a miss leaves the event loop: ``build()`` runs in a worker thread.
+    """
+    key = _data_key(request, name, await acurrent_versions(_version_keys(request.user.pk, models)))
+
+    data = await cache.aget(key)
+    if data is None:
+        with primary_reads():
+            data = await sync_to_async(build)()
+        await cache.aset(key, data, timeout=LIGHT_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,77 @@
+# core/concurrency.py
+"""
+Optimistic concurrency for tasks and columns.
+
+Both carry a ``version`` that every write increments with a conditional UPDATE
+(see ``VersionedModel``). Clients send the version their edit is based on, as
+``If-Match: "<version>"`` on a single object or as a ``versions`` map of ids to
+versions on the reorder endpoints, and get a 409 with the current version when
+someone else changed the object first. Detail responses carry the version as
+their ``ETag``.
+"""
+from django.db import models
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from .models import VersionConflict
+
+class Conflict(APIException):
+    """409 for a write that lost to another, naming the version it lost to when known."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This was changed by someone else; reload it and try again."
+    default_code = 'conflict'
+
+    def __init__(self, obj=None):
+        super().__init__()
+        self.current = {'id': obj.pk, 'version': obj.version} if obj is not None else {}
+
+def parse_version(value):
+    """Return the version in an ``If-Match`` value or ``versions`` entry; None for ``*``."""
+    value = str(value).strip()
+    if value == '*':
+        return None
+    if value.startswith('W/'):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise ParseError("Versions must be integers, as returned in the ETag header or version field.")
+
+def check_if_match(request, obj):
+    """Raise a 409 if the request's ``If-Match`` names another version of ``obj`` than the current one."""
+    header = request.headers.get('If-Match')
+    if header is None:
+        return
+    expected = {parse_version(value) for value in header.split(',')}
+    if None not in expected and obj.version not in expected:
+        raise Conflict(obj)
+
+def check_versions(request, objs):
+    """Raise a 409 if the request's ``versions`` map names another version of any of ``objs``."""
+    versions = request.data.get('versions') or {}
+    if not isinstance(versions, dict):
+        raise ParseError("versions must map ids to versions.")
+    for obj in objs:
+        expected = versions.get(str(obj.pk), versions.get(obj.pk))
+        if expected is not None and parse_version(expected) not in (None, obj.version):
+            raise Conflict(obj)
+
+def bulk_update_versioned(objs, fields):
+    """
+    ``bulk_update`` ``fields`` of ``objs`` in one statement per batch, each row only
+    while it still has the version it was read with; raise ``VersionConflict``
+    (rolling back the caller's transaction) if any of them had changed. A row
+    listed more than once is written once.
+    """
+    objs = list({obj.pk: obj for obj in objs}.values())
+    if not objs:
+        return
+    model = type(objs[0])
+    unchanged = models.Q()
+    for obj in objs:
+        unchanged |= models.Q(pk=obj.pk, version=obj.version)
+        obj.version += 1
+    updated = model.objects.filter(unchanged).bulk_update(objs, [*fields, 'version'])
+    if updated != len(objs):
+        for obj in objs:
+            obj.version -= 1
+        raise VersionConflict(f"Some of these {model._meta.verbose_name_plural} were changed by someone else.")
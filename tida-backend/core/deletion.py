@@ -0,0 +1,81 @@
+# core/deletion.py
+"""
+Background deletion of projects and boards.
+
+Deleting a big project through the ORM collects every board, column, task,
+subtask, tag link, comment and attachment in memory and removes them in one
+long transaction. Instead a delete request only stamps ``deleted_at``, which
+hides the project or board from every queryset at once, and queues a job that
+removes its tasks ``DELETE_BATCH_SIZE`` at a time, each batch in a short
+transaction of its own. Attachment files are unlinked once the batch that
+removed them commits, and the cached lists are invalidated once per batch
+rather than once per deleted row.
+"""
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from tida_backend.db_router import current_shard
+from .cache import batched_generations, bump_generation
+from .jobs import enqueue, job
+from .models import Project, Board, Task, Attachment
+from .tagging import release_task_tags
+
+BATCH_SIZE = getattr(settings, 'DELETE_BATCH_SIZE', 500)
+JOB_SECONDS = getattr(settings, 'DELETE_JOB_SECONDS', 60)
+
+def schedule_deletion(obj):
+    """Hide a project or board immediately and queue the removal of everything in it."""
+    with transaction.atomic(using=current_shard()):
+        type(obj).objects.filter(pk=obj.pk).update(deleted_at=timezone.now())
+        if isinstance(obj, Project):
+            bump_generation('project', 'board', 'column', 'task')
+            enqueue(purge_project, obj.pk)
+        else:
+            bump_generation('board', 'column', 'task')
+            enqueue(purge_board, obj.pk)
+
+def delete_task_batch(tasks):
+    """Delete up to ``BATCH_SIZE`` of ``tasks`` with everything attached to them; return how many went."""
+    with transaction.atomic(using=current_shard()), batched_generations():
+        task_ids = list(tasks.values_list('pk', flat=True)[:BATCH_SIZE])
+        if task_ids:
+            # Attachments first, so their blob references are released (and files unlinked on commit).
+            Attachment.objects.filter(task_id__in=task_ids).delete()
+            release_task_tags(task_ids)
+            Task.objects.filter(pk__in=task_ids).delete()
+    return len(task_ids)
+
+def purge(tasks, container, retry):
+    """
+    Delete ``tasks`` batch by batch, then ``container`` with its remaining columns.
+
+    Stops after ``DELETE_JOB_SECONDS`` and queues ``retry`` to carry on, so a single
+    job never outlives its lease however large the project is.
+    """
+    deadline = time.monotonic() + JOB_SECONDS
+    while delete_task_batch(tasks):
+        if time.monotonic() >= deadline:
+            retry()
+            return
+    with transaction.atomic(using=current_shard()), batched_generations():
+        container.delete()
+
+@job
+def purge_project(project_id):
+    """Remove a project that is pending deletion, with all of its boards."""
+    purge(
+        Task.objects.filter(column__board__project_id=project_id),
+        Project.objects.filter(pk=project_id, deleted_at__isnull=False),
+        lambda: enqueue(purge_project, project_id)
+    )
+
+@job
+def purge_board(board_id):
+    """Remove a board that is pending deletion."""
+    purge(
+        Task.objects.filter(column__board_id=board_id),
+        Board.objects.filter(pk=board_id, deleted_at__isnull=False),
+        lambda: enqueue(purge_board, board_id)
+    )
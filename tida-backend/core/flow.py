@@ -0,0 +1,249 @@
+# core/flow.py
+"""
+Kanban flow analytics: cumulative flow, lead time, cycle time and throughput.
+
+Whenever a task changes column a ``TaskTransition`` is written and two daily
+rollups are incremented in the same transaction: ``ColumnDailyFlow`` counts the
+tasks entering and leaving each column, ``BoardDailyFlow`` the tasks a board
+completed with their summed lead and cycle times. The analytics endpoints read
+the rollups alone, so their cost follows the number of days and columns shown,
+never the number of tasks or moves behind them.
+
+A task is completed each time it enters the last column of its board, and
+``Task.is_completed`` says whether it sits there now: it is set as tasks move and
+re-derived for the whole board when its columns are added, moved or deleted. Lead
+time runs from its creation, cycle time from ``Task.started_at``, when it first
+left the column it was created in. Days are UTC.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+from .cache import bump_generation
+from .models import Column, Task, TaskTransition, ColumnDailyFlow, BoardDailyFlow
+
+DEFAULT_DAYS = 90
+MAX_DAYS = 730
+
+COLUMN_COUNTERS = ('entered', 'exited')
+BOARD_COUNTERS = ('completed', 'lead_seconds', 'cycle_seconds')
+
+def _merge(rows, keys, counters):
+    """Sum the counters of rows sharing a key; an upsert may not touch the same row twice."""
+    merged = {}
+    for row in rows:
+        key = tuple(row[name] for name in keys)
+        if key not in merged:
+            merged[key] = {**row, **{name: 0 for name in counters}}
+        for name in counters:
+            merged[key][name] += row.get(name, 0)
+    return list(merged.values())
+
+def _increment(model, keys, counters, rows):
+    """
+    Add the counters of ``rows`` to the matching rollup rows, creating missing ones, in one upsert.
+
+    ``INSERT ... ON CONFLICT DO UPDATE`` reads the same on PostgreSQL and SQLite.
+    """
+    rows = _merge(rows, keys, counters)
+    if not rows:
+        return
+
+    connection = connections[router.db_for_write(model)]
+    names = [*keys, *(name for name in rows[0] if name not in keys and name not in counters), *counters]
+    fields = [model._meta.get_field(name) for name in names]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = [quote(field.column) for field in fields]
+
+    params = [
+        field.get_db_prep_value(row[name], connection)
+        for row in rows for name, field in zip(names, fields)
+    ]
+    values = ', '.join([f"({', '.join(['%s'] * len(names))})"] * len(rows))
+    updates = ', '.join(
+        f"{column} = {table}.{column} + EXCLUDED.{column}" for column in columns[-len(counters):]
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values}"
+            f" ON CONFLICT ({', '.join(columns[:len(keys)])}) DO UPDATE SET {updates}",
+            params
+        )
+
+def _seconds(delta):
+    return max(int(delta.total_seconds()), 0)
+
+def is_last_column(column):
+    return not Column.objects.filter(board_id=column.board_id, position__gt=column.position).exists()
+
+def start(task, now):
+    """Stamp ``started_at`` on a task leaving its first column; the caller saves it."""
+    if task.started_at is None:
+        task.started_at = now
+
+def complete(tasks, column):
+    """Mark ``tasks`` moving into ``column`` completed if it is their board's last column; the caller saves them."""
+    completed = is_last_column(column)
+    for task in tasks:
+        task.is_completed = completed
+
+def sync_completion(board_id):
+    """Re-derive ``is_completed`` for the tasks of a board after its columns changed, in one UPDATE."""
+    columns = Column.objects.filter(board_id=board_id)
+    last = columns.filter(position=models.Subquery(columns.order_by('-position').values('position')[:1]))
+    completed = models.ExpressionWrapper(models.Q(column__in=last), output_field=models.BooleanField())
+    if Task.objects.filter(column__in=columns).exclude(is_completed=completed).update(is_completed=completed):
+        # update() sends no post_save.
+        bump_generation('task')
+
+def record_entry(task, column):
+    """Count a new task entering ``column``."""
+    _increment(ColumnDailyFlow, ('column', 'day'), COLUMN_COUNTERS, [
+        {'column': column.pk, 'day': task.created_at.date(), 'board': column.board_id, 'entered': 1},
+    ])
+
+def record_exit(task, column):
+    """Count a deleted task leaving ``column``."""
+    _increment(ColumnDailyFlow, ('column', 'day'), COLUMN_COUNTERS, [
+        {'column': column.pk, 'day': timezone.now().date(), 'board': column.board_id, 'exited': 1},
+    ])
+
+def record_moves(tasks, from_column, to_column, now):
+    """
+    Log ``tasks`` moving between columns at ``now`` and add the moves to the rollups.
+
+    Callers ``start`` and ``complete`` the tasks and save them first.
+    """
+    if not tasks or from_column.pk == to_column.pk:
+        return
+
+    day = now.date()
+    TaskTransition.objects.bulk_create([
+        TaskTransition(
+            task=task, board_id=to_column.board_id, from_column=from_column,
+            to_column=to_column, moved_at=now
+        )
+        for task in tasks
+    ])
+    _increment(ColumnDailyFlow, ('column', 'day'), COLUMN_COUNTERS, [
+        {'column': from_column.pk, 'day': day, 'board': from_column.board_id, 'exited': len(tasks)},
+        {'column': to_column.pk, 'day': day, 'board': to_column.board_id, 'entered': len(tasks)},
+    ])
+    if tasks[0].is_completed:
+        _increment(BoardDailyFlow, ('board', 'day'), BOARD_COUNTERS, [{
+            'board': to_column.board_id,
+            'day': day,
+            'completed': len(tasks),
+            'lead_seconds': sum(_seconds(now - task.created_at) for task in tasks),
+            'cycle_seconds': sum(_seconds(now - (task.started_at or now)) for task in tasks),
+        }])
+
+def rebuild(board):
+    """
+    Recompute a board's rollups from its tasks and their transitions.
+
+    Backfills boards whose tasks predate the rollups: a task without transitions is
+    counted as having entered its current column when it was created. Their
+    ``is_completed`` flags are re-derived too.
+    """
+    columns = list(Column.objects.filter(board=board).order_by('position').values_list('id', flat=True))
+    last_column = columns[-1] if columns else None
+    tasks = {
+        task_id: (column_id, created_at, started_at)
+        for task_id, column_id, created_at, started_at in Task.objects.filter(
+            column__board=board
+        ).values_list('id', 'column_id', 'created_at', 'started_at')
+    }
+
+    flow, completions, first_columns = [], [], {}
+    transitions = TaskTransition.objects.filter(board=board, task__in=tasks).order_by('task', 'moved_at', 'id')
+    for task_id, from_column, to_column, moved_at in transitions.values_list(
+        'task_id', 'from_column_id', 'to_column_id', 'moved_at'
+    ):
+        first_columns.setdefault(task_id, from_column)
+        day = moved_at.date()
+        if from_column:
+            flow.append({'column': from_column, 'day': day, 'exited': 1})
+        if to_column:
+            flow.append({'column': to_column, 'day': day, 'entered': 1})
+        if to_column and to_column == last_column:
+            _, created_at, started_at = tasks[task_id]
+            completions.append({
+                'day': day, 'completed': 1,
+                'lead_seconds': _seconds(moved_at - created_at),
+                'cycle_seconds': _seconds(moved_at - (started_at or moved_at)),
+            })
+    for task_id, (column_id, created_at, _) in tasks.items():
+        column_id = first_columns.get(task_id, column_id)
+        if column_id:
+            flow.append({'column': column_id, 'day': created_at.date(), 'entered': 1})
+
+    with transaction.atomic(using=router.db_for_write(ColumnDailyFlow)):
+        ColumnDailyFlow.objects.filter(board=board).delete()
+        BoardDailyFlow.objects.filter(board=board).delete()
+        ColumnDailyFlow.objects.bulk_create([
+            ColumnDailyFlow(board=board, column_id=row['column'], day=row['day'], entered=row['entered'], exited=row['exited'])
+            for row in _merge(flow, ('column', 'day'), COLUMN_COUNTERS)
+        ])
+        BoardDailyFlow.objects.bulk_create([
+            BoardDailyFlow(board=board, **row) for row in _merge(completions, ('day',), BOARD_COUNTERS)
+        ])
+        sync_completion(board.pk)
+
+def window(days):
+    """Return the last ``days`` UTC dates, oldest first."""
+    today = timezone.now().date()
+    return [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+
+def cumulative_flow(board, days):
+    """Return the number of tasks in each column of ``board`` at the end of each of the last ``days`` days."""
+    dates = window(days)
+    columns = list(Column.objects.filter(board=board).order_by('position').values('id', 'name'))
+
+    # Tasks already in each column when the window opens, then the daily changes inside it.
+    counts = dict(
+        ColumnDailyFlow.objects.filter(board=board, day__lt=dates[0]).values('column').annotate(
+            net=models.Sum('entered') - models.Sum('exited')
+        ).values_list('column', 'net')
+    )
+    changes = defaultdict(dict)
+    for column_id, day, entered, exited in ColumnDailyFlow.objects.filter(
+        board=board, day__gte=dates[0]
+    ).values_list('column_id', 'day', 'entered', 'exited'):
+        changes[column_id][day] = entered - exited
+
+    series = []
+    for column in columns:
+        count = counts.get(column['id']) or 0
+        daily = []
+        for day in dates:
+            count += changes[column['id']].get(day, 0)
+            daily.append(count)
+        series.append({**column, 'counts': daily})
+    return {'days': dates, 'columns': series}
+
+def _hours(seconds, count):
+    return round(seconds / count / 3600, 2) if count else None
+
+def flow_metrics(board, days):
+    """Return the daily throughput and average lead and cycle times of ``board`` over the last ``days`` days."""
+    dates = window(days)
+    rows = {
+        day: (completed, lead_seconds, cycle_seconds)
+        for day, completed, lead_seconds, cycle_seconds in BoardDailyFlow.objects.filter(
+            board=board, day__gte=dates[0]
+        ).values_list('day', 'completed', 'lead_seconds', 'cycle_seconds')
+    }
+    daily = [rows.get(day, (0, 0, 0)) for day in dates]
+    completed = sum(row[0] for row in daily)
+    return {
+        'days': dates,
+        'throughput': [row[0] for row in daily],
+        'lead_time_hours': [_hours(row[1], row[0]) for row in daily],
+        'cycle_time_hours': [_hours(row[2], row[0]) for row in daily],
+        'completed': completed,
+        'average_lead_time_hours': _hours(sum(row[1] for row in daily), completed),
+        'average_cycle_time_hours': _hours(sum(row[2] for row in daily), completed),
+    }
@@ -0,0 +1,154 @@
+# core/identity.py
+from django.http import Http404
+from accounts.models import User
+from .models import Project, Board, Column, Task
+
+# Ancestors loaded alongside each model so one query resolves the whole chain up to the project.
+ANCESTORS = {
+    Project: (),
+    Board: ('project',),
+    Column: ('board__project',),
+    Task: ('column__board__project',),
+}
+
+PARENTS = {
+    Board: 'project',
+    Column: 'board',
+    Task: 'column',
+}
+
+class IdentityMap:
+    """
+    Request-scoped store of projects, boards, columns, tasks, users and project memberships.
+
+    Every object is loaded at most once per request and repeated walks from a task
+    up to its project are answered from memory.
+    """
+    def __init__(self):
+        self._objects = {}
+        self._members = {}
+        self._users = {}
+
+    def register(self, obj):
+        """Store ``obj`` (and any ancestors already loaded with it) and return the canonical instance."""
+        key = (type(obj), obj.pk)
+        if key in self._objects:
+            return self._objects[key]
+
+        self._objects[key] = obj
+        parent_field = PARENTS.get(type(obj))
+        if parent_field and obj._meta.get_field(parent_field).is_cached(obj):
+            setattr(obj, parent_field, self.register(getattr(obj, parent_field)))
+        return obj
+
+    def get(self, model, pk):
+        """Return the instance of ``model`` with ``pk``, raising Http404 if it does not exist."""
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise Http404(f"No {model._meta.object_name} matches the given query.")
+
+        obj = self._objects.get((model, pk))
+        if obj is None:
+            obj = model.objects.select_related(*ANCESTORS[model]).filter(pk=pk).first()
+            if obj is None:
+                raise Http404(f"No {model._meta.object_name} matches the given query.")
+            obj = self.register(obj)
+        return obj
+
+    def get_many(self, model, pks):
+        """Return instances for ``pks`` in order, loading the missing ones in a single query."""
+        try:
+            pks = [int(pk) for pk in pks]
+        except (TypeError, ValueError):
+            raise Http404(f"No {model._meta.object_name} matches the given query.")
+
+        missing = {pk for pk in pks if (model, pk) not in self._objects}
+        if missing:
+            for obj in model.objects.select_related(*ANCESTORS[model]).filter(pk__in=missing):
+                self.register(obj)
+
+        try:
+            return [self._objects[(model, pk)] for pk in pks]
+        except KeyError:
+            raise Http404(f"No {model._meta.object_name} matches the given query.")
+
+    def project(self, pk):
+        return self.get(Project, pk)
+
+    def board(self, pk):
+        return self.get(Board, pk)
+
+    def column(self, pk):
+        return self.get(Column, pk)
+
+    def task(self, pk):
+        return self.get(Task, pk)
+
+    def user(self, pk):
+        """Return the user with ``pk`` or None if there is no such user."""
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            return None
+
+        if pk not in self._users:
+            self._users[pk] = User.objects.filter(pk=pk).first()
+        return self._users[pk]
+
+    def parent(self, obj):
+        """Return the board, column or project directly above ``obj``."""
+        parent_field = PARENTS[type(obj)]
+        if obj._meta.get_field(parent_field).is_cached(obj):
+            return self.register(getattr(obj, parent_field))
+        
+        parent_model = obj._meta.get_field(parent_field).related_model
+        parent = self.get(parent_model, getattr(obj, f"{parent_field}_id"))
+        setattr(obj, parent_field, parent)
+        return parent
+
+    def project_for(self, obj):
+        """Walk from a board, column or task up to its project."""
+        obj = self.register(obj)
+        while not isinstance(obj, Project):
+            obj = self.parent(obj)
+        return obj
+
+    def pending_deletion(self, obj):
+        """Return True if ``obj``, its board or its project is waiting to be deleted."""
+        obj = self.register(obj)
+        while True:
+            if getattr(obj, 'deleted_at', None) is not None:
+                return True
+            if isinstance(obj, Project):
+                return False
+            obj = self.parent(obj)
+
+    def member_ids(self, project):
+        """Return the ids of the project's members, loaded once per request."""
+        if project.pk not in self._members:
+            self._members[project.pk] = set(
+                Project.members.through.objects.filter(
+                    project_id=project.pk
+                ).values_list('user_id', flat=True)
+            )
+        return self._members[project.pk]
+
+    def forget_members(self, project):
+        """Drop the cached membership of a project after it changes."""
+        self._members.pop(project.pk, None)
+
+    def is_member(self, user, project):
+        """Return True if the user created the project or is one of its members."""
+        return user.pk == project.created_by_id or user.pk in self.member_ids(project)
+
+    def can_access(self, user, obj):
+        """Return True if the user is a member of the project owning ``obj`` and none of it is being deleted."""
+        return not self.pending_deletion(obj) and self.is_member(user, self.project_for(obj))
+
+def identity_map(request):
+    """Return the identity map attached to the current request, creating it on first use."""
+    request = getattr(request, '_request', request)
+    if not hasattr(request, 'identity_map'):
+        request.identity_map = IdentityMap()
+    return request.identity_map
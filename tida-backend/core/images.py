@@ -0,0 +1,105 @@
+# core/images.py
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.apps import apps
+from django.core.files.base import ContentFile
+from .jobs import enqueue, job
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+
+VARIANT_SPECS = {
+    'avatar': {
+        'crop': True,
+        'sizes': {'thumbnail': (48, 48), 'card': (128, 128), 'full': (512, 512)},
+    },
+    'attachment': {
+        'crop': False,
+        'sizes': {'thumbnail': (160, 160), 'card': (480, 480), 'full': (1600, 1600)},
+    },
+}
+
+def is_image(name):
+    """Return True if the file name looks like an image Pillow can resize."""
+    return os.path.splitext(name or '')[1].lower() in IMAGE_EXTENSIONS
+
+def variant_path(source_name, variant):
+    """Return the storage path of one variant of a source image."""
+    stem = os.path.splitext(source_name)[0]
+    return f"variants/{stem}/{variant}.webp"
+
+def variant_urls(field_file, variants, kind, request=None):
+    """
+    Map every variant name of ``kind`` to a URL.
+
+    Variants that have not been generated for the current file yet fall back
+    to the original upload, so clients can always pick a size.
+    """
+    if not field_file:
+        return None
+
+    storage = field_file.storage
+    ready = variants.get('source') == field_file.name
+    urls = {}
+    for name in VARIANT_SPECS[kind]['sizes']:
+        path = variants.get(name) if ready else None
+        url = storage.url(path) if path else field_file.url
+        urls[name] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+def delete_variants(storage, source_name, kind):
+    """Remove the variant files generated for a source image."""
+    for name in VARIANT_SPECS[kind]['sizes']:
+        storage.delete(variant_path(source_name, name))
+
+def schedule_variants(instance, field_name, variants_field, kind):
+    """Queue variant generation for an instance's image if it has not been rendered yet."""
+    source = getattr(instance, field_name)
+    if not source or not is_image(source.name):
+        return
+    if getattr(instance, variants_field).get('source') == source.name:
+        return
+
+    enqueue(generate_variants, instance._meta.label, instance.pk, field_name, variants_field, kind)
+
+@job
+def generate_variants(model_label, pk, field_name, variants_field, kind):
+    """Render the fixed-size variants of an image field and record them on the row."""
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    source = getattr(instance, field_name)
+    if not source or not is_image(source.name):
+        return
+
+    spec = VARIANT_SPECS[kind]
+    storage = source.storage
+
+    with source.open('rb') as handle:
+        image = Image.open(handle)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    variants = {'source': source.name}
+    for name, size in spec['sizes'].items():
+        path = variant_path(source.name, name)
+
+        if not storage.exists(path):
+            if spec['crop']:
+                resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+            else:
+                resized = image.copy()
+                resized.thumbnail(size, Image.Resampling.LANCZOS)
+
+            buffer = BytesIO()
+            resized.save(buffer, format='WEBP', quality=82, method=4)
+            path = storage.save(path, ContentFile(buffer.getvalue()))
+
+        variants[name] = path
+
+    model.objects.filter(pk=pk, **{field_name: source.name}).update(**{variants_field: variants})
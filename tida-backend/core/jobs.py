@@ -0,0 +1,136 @@
+# core/jobs.py
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from tida_backend.db_router import current_shard, use_shard
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = getattr(settings, 'JOB_LEASE_SECONDS', 600)
+BACKOFF_BASE_SECONDS = getattr(settings, 'JOB_BACKOFF_BASE_SECONDS', 5)
+BACKOFF_MAX_SECONDS = getattr(settings, 'JOB_BACKOFF_MAX_SECONDS', 3600)
+
+def job(func):
+    """Mark a module-level function as safe to run from the job queue."""
+    func.is_job = True
+    return func
+
+def enqueue(func, *args, delay=None, max_attempts=5, **kwargs):
+    """
+    Queue ``func(*args, **kwargs)`` for a worker.
+
+    The job row is written in the caller's transaction, so work queued from
+    ``perform_create``/``perform_destroy`` only runs if the request commits; jobs
+    queued on another shard than ``default`` are written once its transaction
+    commits, and return None. The job runs routed to the caller's shard.
+    Arguments must be JSON serialisable.
+    """
+    if not getattr(func, 'is_job', False):
+        raise ValueError(f"{func.__qualname__} is not registered with @job.")
+
+    shard = current_shard()
+
+    def create():
+        return Job.objects.create(
+            task=f"{func.__module__}.{func.__name__}",
+            payload={'args': list(args), 'kwargs': kwargs},
+            run_after=timezone.now() + (delay or timedelta()),
+            max_attempts=max_attempts,
+            shard=shard
+        )
+
+    if shard == 'default':
+        return create()
+    transaction.on_commit(create, using=shard)
+    return None
+
+def backoff(attempts):
+    """Return the delay before retrying a job that has failed ``attempts`` times."""
+    seconds = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+def claim():
+    """
+    Lock the next runnable job and mark it as running.
+
+    ``SKIP LOCKED`` lets any number of workers poll the same table without
+    blocking on each other. Jobs whose lease expired (a worker died mid-run)
+    are picked up again, unless that was their last attempt: then they fail,
+    so a job that kills its worker every time is not retried forever.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        expired = Job.objects.filter(status=Job.RUNNING, locked_until__lt=now)
+        given_up = expired.filter(attempts__gte=models.F('max_attempts')).update(
+            status=Job.FAILED, finished_at=now, locked_until=None,
+            last_error="The lease expired on the last attempt; its worker probably died."
+        )
+        if given_up:
+            logger.warning("Failed %s job(s) whose last attempt's lease expired", given_up)
+
+        locked = Job.objects.select_for_update(skip_locked=True).order_by('run_after')
+        job = locked.filter(status=Job.PENDING, run_after__lte=now).first()
+        if job is None:
+            job = locked.filter(
+                status=Job.RUNNING, locked_until__lt=now, attempts__lt=models.F('max_attempts')
+            ).first()
+        if job is None:
+            return None
+
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.started_at = now
+        job.locked_until = now + timedelta(seconds=LEASE_SECONDS)
+        job.wait_ms = max(int((now - job.run_after).total_seconds() * 1000), 0)
+        job.save(update_fields=['status', 'attempts', 'started_at', 'locked_until', 'wait_ms'])
+        return job
+
+def execute(job):
+    """Run a claimed job and record its outcome, rescheduling failures with backoff."""
+    started = time.monotonic()
+    try:
+        func = import_string(job.task)
+        if not getattr(func, 'is_job', False):
+            raise ValueError(f"{job.task} is not registered with @job.")
+        with use_shard(job.shard):
+            func(*job.payload.get('args', []), **job.payload.get('kwargs', {}))
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Job %s #%s failed (attempt %s)", job.task, job.pk, job.attempts)
+    else:
+        error = None
+
+    now = timezone.now()
+    job.duration_ms = int((time.monotonic() - started) * 1000)
+    job.finished_at = now
+    job.locked_until = None
+
+    if error is None:
+        job.status = Job.DONE
+    elif job.attempts >= job.max_attempts:
+        job.status = Job.FAILED
+        job.last_error = error
+    else:
+        job.status = Job.PENDING
+        job.last_error = error
+        job.run_after = now + backoff(job.attempts)
+
+    # Guard on attempts so a worker whose lease expired cannot overwrite a newer run.
+    Job.objects.filter(pk=job.pk, attempts=job.attempts).update(
+        status=job.status,
+        finished_at=job.finished_at,
+        locked_until=None,
+        duration_ms=job.duration_ms,
+        last_error=job.last_error,
+        run_after=job.run_after
+    )
+    return job
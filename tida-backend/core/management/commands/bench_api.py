@@ -0,0 +1,187 @@
+# core/management/commands/bench_api.py
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.test import Client, override_settings
+from accounts.authentication import UserRefreshToken
+from accounts.models import User
+from core.models import Board, Column, Task, TaskTag
+from core.views import accessible_project_ids
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+class Command(BaseCommand):
+    help = (
+        "Drive the hot API endpoints through the Django test client against a seed_bench "
+        "dataset and write p50/p99 latency, query counts and peak memory to a JSON file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bench', help="Dataset created by seed_bench.")
+        parser.add_argument('--user', help="Username to benchmark as; defaults to the dataset's busiest member.")
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--endpoint', action='append', help="Only run the named endpoint(s).")
+        parser.add_argument('--output', default='bench.json')
+
+    def handle(self, *args, **options):
+        user = self.pick_user(options)
+        endpoints = self.endpoints(user)
+        if options['endpoint']:
+            unknown = set(options['endpoint']) - set(endpoints)
+            if unknown:
+                raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}. Choose from {', '.join(endpoints)}.")
+            endpoints = {name: spec for name, spec in endpoints.items() if name in options['endpoint']}
+
+        client = Client(headers={'Authorization': f"Bearer {UserRefreshToken.for_user(user).access_token}"})
+        results = {}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name, (method, path, payload) in endpoints.items():
+                results[name] = self.measure(client, method, path, payload, options)
+                self.stdout.write(
+                    f"{name:<18}{results[name]['p50_ms']:>9.1f} ms p50{results[name]['p99_ms']:>9.1f} ms p99"
+                    f"{results[name]['queries']:>7} queries{results[name]['peak_memory_kb']:>9} KB peak"
+                )
+
+        report = {
+            'meta': {
+                'commit': self.commit(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'repeat': options['repeat'],
+                'user': user.username,
+                'dataset': self.dataset(user),
+            },
+            'endpoints': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+            output.write('\n')
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+
+    def pick_user(self, options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.filter(
+                username__startswith=f"{options['prefix']}-user-"
+            ).annotate(
+                project_count=models.Count('member_projects')
+            ).order_by('-project_count', 'pk').first()
+        if user is None:
+            raise CommandError("No benchmark user found; run seed_bench first or pass --user.")
+        return user
+
+    def endpoints(self, user):
+        """Return the benchmarked requests as name -> (method, path, payload)."""
+        projects = accessible_project_ids(user)
+        board = Board.objects.filter(project__in=projects).annotate(
+            task_count=models.Count('columns__tasks')
+        ).order_by('-task_count', 'pk').first()
+        if board is None:
+            raise CommandError(f"{user.username} cannot access any board.")
+
+        column = Column.objects.filter(board=board).annotate(
+            task_count=models.Count('tasks')
+        ).order_by('-task_count', 'pk').first()
+        task_order = list(
+            Task.objects.filter(column=column).order_by('-position').values_list('id', flat=True)
+        )
+        tag_id = TaskTag.objects.filter(
+            task__column__board__project__in=projects
+        ).values('tag_id').annotate(uses=models.Count('id')).order_by('-uses').values_list('tag_id', flat=True).first()
+
+        endpoints = {
+            'board_detail': ('get', f"/api/boards/{board.pk}/", None),
+            'projects': ('get', "/api/projects/", None),
+            'my_tasks': ('get', "/api/tasks/my_tasks/", None),
+            'my_tasks_buckets': ('get', "/api/tasks/my_tasks/?mode=buckets", None),
+            'reorder': ('post', "/api/tasks/reorder/", {
+                'source_column_id': column.pk,
+                'destination_column_id': column.pk,
+                'task_order': task_order,
+            }),
+        }
+        if tag_id is not None:
+            endpoints['filter_by_tags'] = ('get', f"/api/tasks/filter_by_tags/?tag_ids={tag_id}", None)
+        return endpoints
+
+    def request(self, client, method, path, payload):
+        if payload is None:
+            return getattr(client, method)(path)
+
+        # Writes are rolled back so every run sees the same data.
+        with transaction.atomic():
+            response = getattr(client, method)(path, data=payload, content_type='application/json')
+            transaction.set_rollback(True)
+        return response
+
+    def measure(self, client, method, path, payload, options):
+        for _ in range(options['warmup']):
+            self.request(client, method, path, payload)
+
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            response = self.request(client, method, path, payload)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # Counting queries and tracing allocations slow requests down, so they get runs of their own.
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            self.request(client, method, path, payload)
+
+        tracemalloc.start()
+        try:
+            self.request(client, method, path, payload)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'method': method.upper(),
+            'path': path,
+            'status': response.status_code,
+            'response_bytes': len(response.content),
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'queries': queries,
+            'peak_memory_kb': peak // 1024,
+        }
+
+    def dataset(self, user):
+        projects = accessible_project_ids(user)
+        return {
+            'accessible_projects': len(projects),
+            'accessible_tasks': Task.objects.filter(column__board__project__in=projects).count(),
+            'assigned_tasks': Task.objects.filter(assigned_to=user).count(),
+            'total_tasks': Task.objects.count(),
+        }
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
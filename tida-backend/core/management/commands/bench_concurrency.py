@@ -0,0 +1,93 @@
+# core/management/commands/bench_concurrency.py
+import os
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts.authentication import UserRefreshToken
+from accounts.models import User
+
+class Command(BaseCommand):
+    help = (
+        "Load a running server (gunicorn WSGI or uvicorn ASGI) with concurrent GETs and "
+        "report throughput, latency percentiles and the server's resident memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="API paths requested round-robin, e.g. /api/boards/1/")
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--username', required=True, help="User the requests are authenticated as.")
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--timeout', type=float, default=60)
+        parser.add_argument('--pid', type=int, help="Server master pid; its RSS plus its children's is reported.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}.")
+        headers = {'Authorization': f"Bearer {UserRefreshToken.for_user(user).access_token}"}
+
+        urls = [options['base_url'].rstrip('/') + path for path in options['paths']]
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def fetch(index):
+            request = urllib.request.Request(urls[index % len(urls)], headers=headers)
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=options['timeout']) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError) as exc:
+                with lock:
+                    errors.append(str(exc))
+                return
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        rss_before = self.server_rss(options['pid'])
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(fetch, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        rss_after = self.server_rss(options['pid'])
+
+        self.stdout.write(f"requests      {len(latencies)} ok, {len(errors)} failed in {elapsed:.2f}s")
+        self.stdout.write(f"throughput    {len(latencies) / elapsed:.1f} req/s at concurrency {options['concurrency']}")
+        if latencies:
+            percentiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f"latency ms    p50 {percentiles[49]:.1f}  p90 {percentiles[89]:.1f}  "
+                f"p99 {percentiles[98]:.1f}  max {max(latencies):.1f}"
+            )
+        if rss_before is not None:
+            self.stdout.write(f"server RSS    {rss_before:.0f} MB before, {rss_after:.0f} MB after")
+        for error in sorted(set(errors))[:5]:
+            self.stderr.write(error)
+
+    def server_rss(self, pid):
+        """Return the RSS in MB of ``pid`` and all of its descendants, or None if unavailable."""
+        if pid is None:
+            return None
+
+        total_kb = 0
+        pending = [pid]
+        while pending:
+            current = pending.pop()
+            try:
+                with open(f"/proc/{current}/status") as status:
+                    for line in status:
+                        if line.startswith('VmRSS:'):
+                            total_kb += int(line.split()[1])
+                for task in os.listdir(f"/proc/{current}/task"):
+                    with open(f"/proc/{current}/task/{task}/children") as children:
+                        pending.extend(int(child) for child in children.read().split())
+            except OSError:
+                continue
+        return total_kb / 1024
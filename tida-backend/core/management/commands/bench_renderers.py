@@ -0,0 +1,103 @@
+# core/management/commands/bench_renderers.py
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from accounts.models import User
+from core.models import Project, Board, Column, Task, SubTask, Tag, TaskTag, Comment
+from core.serializers import BoardSerializer
+from tida_backend.renderers import ORJSONRenderer, MessagePackRenderer
+
+WORDS = (
+    "update fix review deploy design api board column sprint release customer "
+    "report draft test refactor migrate cache query page mobile login export"
+).split()
+
+class Command(BaseCommand):
+    help = "Compare encode time and payload size of the API renderers on BoardSerializer output."
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--board', type=int, help="Benchmark an existing board instead of a generated one.")
+        parser.add_argument('--columns', type=int, default=6)
+        parser.add_argument('--tasks', type=int, default=400, help="Tasks spread across the generated board.")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+    
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['board']:
+                board = Board.objects.get(pk=options['board'])
+            else:
+                board = self.generate_board(options['columns'], options['tasks'], random.Random(options['seed']))
+            data = BoardSerializer(board).data
+            # Generated rows are only needed for serialization.
+            transaction.set_rollback(True)
+        
+        renderers = [
+            ('json (stdlib)', JSONRenderer()),
+            ('orjson', ORJSONRenderer()),
+            ('msgpack', MessagePackRenderer()),
+        ]
+        
+        self.stdout.write(f"{'renderer':<16}{'median ms':>12}{'min ms':>10}{'bytes':>12}{'gzip bytes':>12}")
+        for name, renderer in renderers:
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                body = renderer.render(data)
+                timings.append((time.perf_counter() - started) * 1000)
+            
+            self.stdout.write(
+                f"{name:<16}{statistics.median(timings):>12.2f}{min(timings):>10.2f}"
+                f"{len(body):>12}{len(compress_string(body)):>12}"
+            )
+    
+    def sentence(self, rng, words):
+        return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+    
+    def generate_board(self, column_count, task_count, rng):
+        users = [
+            User.objects.create(username=f"bench-renderer-{index}-{rng.random():.8f}")
+            for index in range(8)
+        ]
+        project = Project.objects.create(name="Renderer benchmark", created_by=users[0])
+        project.members.add(*users[1:])
+        board = Board.objects.create(project=project, name="Benchmark board")
+        columns = Column.objects.bulk_create(
+            Column(board=board, name=self.sentence(rng, 2), position=index) 
+            for index in range(column_count)
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f"{word}-{index}", user=users[0]) for index, word in enumerate(WORDS[:10])
+        )
+        
+        tasks = Task.objects.bulk_create(
+            Task(
+                column=rng.choice(columns),
+                title=self.sentence(rng, rng.randint(3, 8)),
+                description=self.sentence(rng, rng.randint(0, 60)),
+                priority=rng.choice(['low', 'medium', 'high']),
+                created_by=rng.choice(users),
+                assigned_to=rng.choice(users + [None]),
+                position=index
+            )
+            for index in range(task_count)
+        )
+        
+        SubTask.objects.bulk_create(
+            SubTask(task=task, title=self.sentence(rng, 4), is_completed=rng.random() < 0.5)
+            for task in tasks for _ in range(rng.randint(0, 5))
+        )
+        TaskTag.objects.bulk_create(
+            TaskTag(task=task, tag=tag) 
+            for task in tasks for tag in rng.sample(tags, rng.randint(0, 3))
+        )
+        Comment.objects.bulk_create(
+            Comment(task=task, user=rng.choice(users), content=self.sentence(rng, rng.randint(5, 40)))
+            for task in tasks for _ in range(rng.randint(0, 4))
+        )
+        return board
@@ -0,0 +1,30 @@
+# core/management/commands/move_workspace.py
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Workspace
+from core.sharding import move_workspace
+
+class Command(BaseCommand):
+    help = (
+        "Move a workspace's projects, boards, columns, tasks and everything below them to "
+        "another shard. Writes to the workspace get a 503 until the copy has finished."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('workspace', type=int, help="Id of the workspace to move.")
+        parser.add_argument('shard', help="Alias of the target shard, one of DATABASE_SHARDS.")
+        parser.add_argument(
+            '--grace', type=float, default=5,
+            help="Seconds to wait for in-flight writes after blocking new ones (default 5)."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            workspace = Workspace.objects.get(pk=options['workspace'])
+        except Workspace.DoesNotExist:
+            raise CommandError(f"Workspace {options['workspace']} does not exist.")
+
+        try:
+            move_workspace(workspace, options['shard'], grace=options['grace'], log=self.stdout.write)
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f"Workspace {workspace.pk} is now on {workspace.shard}."))
@@ -0,0 +1,24 @@
+# core/management/commands/rebuild_flow_rollups.py
+from django.core.management.base import BaseCommand
+from core.flow import rebuild
+from core.models import Board
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily flow rollups behind the board analytics from tasks and their "
+        "column transitions; backfills boards created before the rollups existed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--board', type=int, action='append', help="Only rebuild the given board id(s).")
+
+    def handle(self, *args, **options):
+        boards = Board.objects.filter(deleted_at__isnull=True).order_by('pk')
+        if options['board']:
+            boards = boards.filter(pk__in=options['board'])
+
+        count = 0
+        for board in boards.iterator():
+            rebuild(board)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the flow rollups of {count} board(s)."))
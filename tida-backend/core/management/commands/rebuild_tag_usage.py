@@ -0,0 +1,20 @@
+# core/management/commands/rebuild_tag_usage.py
+from django.core.management.base import BaseCommand
+from core.models import Tag
+from core.tagging import rebuild_usage
+
+class Command(BaseCommand):
+    help = (
+        "Recount how many tasks carry each tag. The counters are kept up to date as tasks "
+        "are tagged and deleted; this repairs them after bulk changes made outside the API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help="Only recount the tags of the given user id(s).")
+
+    def handle(self, *args, **options):
+        tags = Tag.objects.all()
+        if options['user']:
+            tags = tags.filter(user_id__in=options['user'])
+        rebuild_usage(tags)
+        self.stdout.write(self.style.SUCCESS(f"Recounted the usage of {tags.count()} tag(s)."))
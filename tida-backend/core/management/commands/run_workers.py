@@ -0,0 +1,65 @@
+# core/management/commands/run_workers.py
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from core.jobs import claim, execute
+
+class Command(BaseCommand):
+    help = "Run background job workers that poll the database job queue."
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help="Number of worker threads.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--burst', action='store_true', help="Exit once the queue is empty.")
+    
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        self.output_lock = threading.Lock()
+        
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.stop)
+        
+        threads = [
+            threading.Thread(
+                target=self.work, 
+                args=(options['poll_interval'], options['burst']),
+                name=f"job-worker-{index}"
+            )
+            for index in range(max(options['concurrency'], 1))
+        ]
+        
+        self.stdout.write(f"Starting {len(threads)} job worker(s).")
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+        self.stdout.write("Job workers stopped.")
+    
+    def stop(self, signum, frame):
+        """Finish in-flight jobs, then exit."""
+        self.stdout.write("Shutting down after in-flight jobs finish...")
+        self.stopping.set()
+    
+    def work(self, poll_interval, burst):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                job = claim()
+                
+                if job is None:
+                    if burst:
+                        return
+                    self.stopping.wait(poll_interval)
+                    continue
+                
+                job = execute(job)
+                with self.output_lock:
+                    self.stdout.write(
+                        f"{job.task} #{job.pk} {job.status} after attempt {job.attempts} "
+                        f"in {job.duration_ms}ms (waited {job.wait_ms}ms)"
+                    )
+        finally:
+            connections.close_all()
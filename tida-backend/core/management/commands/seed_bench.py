@@ -0,0 +1,41 @@
+# core/management/commands/seed_bench.py
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import User
+from core.seeding import DEFAULTS, seed
+
+class Command(BaseCommand):
+    help = (
+        "Generate skewed synthetic users, projects, memberships, boards, columns, tasks, "
+        "subtasks, tags, comments and attachments for benchmarks."
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=DEFAULTS['users'])
+        parser.add_argument('--projects', type=int, default=DEFAULTS['projects'])
+        parser.add_argument('--boards', type=int, default=DEFAULTS['boards'], help="Average boards per project.")
+        parser.add_argument('--columns', type=int, default=DEFAULTS['columns'], help="Average columns per board.")
+        parser.add_argument('--tasks', type=int, default=DEFAULTS['tasks'], help="Total tasks, spread unevenly over columns.")
+        parser.add_argument('--subtasks', type=float, default=DEFAULTS['subtasks'], help="Average subtasks per task.")
+        parser.add_argument('--tags', type=int, default=DEFAULTS['tags'], help="Tags per user.")
+        parser.add_argument('--comments', type=float, default=DEFAULTS['comments'], help="Average comments per task.")
+        parser.add_argument('--attachments', type=float, default=DEFAULTS['attachments'], help="Average attachments per task.")
+        parser.add_argument('--archived', type=float, default=DEFAULTS['archived'], help="Fraction of projects that are archived.")
+        parser.add_argument('--skew', type=float, default=DEFAULTS['skew'], help="Zipf exponent; 0 spreads everything evenly.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='bench', help="Username prefix of the generated users.")
+    
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f"{prefix}-user-").exists():
+            raise CommandError(f"Users named {prefix}-user-* already exist; pick another --prefix.")
+        
+        counts = seed(
+            seed=options['seed'], skew=options['skew'], prefix=prefix,
+            **{name: options[name] for name in (
+                'users', 'projects', 'boards', 'columns', 'tasks', 
+                'subtasks', 'tags', 'comments', 'attachments', 'archived'
+            )}
+        )
+        for name, count in counts.items():
+            self.stdout.write(f"{name:<14}{count:>10}")
+        self.stdout.write(self.style.SUCCESS(f"Seeded dataset '{prefix}'."))
@@ -1,22 +1,93 @@
 # core/models.py
-from django.db import models
+from django.db import models, router, transaction, IntegrityError
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from accounts.models import User
+from .storage import file_digest, blob_path
+
+class LiveProjectManager(models.Manager):
+    """Projects that are neither archived nor being deleted, which is all the hot paths ever read."""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(is_archived=False, deleted_at__isnull=True)
+
+class VersionConflict(Exception):
+    """Raised when a versioned row was changed by someone else since it was read."""
+
+class VersionedModel(models.Model):
+    """
+    Model saved with optimistic concurrency control.
+    
+    Every UPDATE issued by ``save()`` only applies while the row still has the
+    version the instance was read with (``WHERE version = n``) and increments it,
+    so a write based on stale data raises ``VersionConflict`` instead of silently
+    overwriting the one that got there first. No lock is held in between.
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+    
+    class Meta:
+        abstract = True
+    
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        field = self._meta.get_field('version')
+        values = [value for value in values if value[0] is not field] + [(field, None, self.version + 1)]
+        updated = super()._do_update(
+            base_qs.filter(version=self.version), using, pk_val, values, update_fields, forced_update
+        )
+        if updated:
+            self.version += 1
+        elif base_qs.filter(pk=pk_val).exists():
+            raise VersionConflict(f"{self._meta.verbose_name.capitalize()} {pk_val} was changed by someone else.")
+        return updated
+
+class Workspace(models.Model):
+    """Model for a group of projects stored together on one database shard (see ``core.sharding``)."""
+    name = models.CharField(max_length=100)
+    shard = models.CharField(max_length=50, default='default')
+    # Writes are refused while ``move_workspace`` copies the workspace to another shard.
+    is_moving = models.BooleanField(default=False)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_workspaces')
+    members = models.ManyToManyField(User, related_name='workspaces', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.name
 
 class Project(models.Model):
     """Model for representing a project."""
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    # Workspaces live on 'default' and projects on their workspace's shard, so no constraint.
+    # Projects without one stay on 'default'.
+    workspace = models.ForeignKey(
+        Workspace, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='projects'
+    )
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_projects')
     members = models.ManyToManyField(User, related_name='member_projects', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_archived = models.BooleanField(default=False)
+    # Set when a delete is requested; the project is hidden until core.deletion removes it.
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    objects = models.Manager()
+    live = LiveProjectManager()
     
     class Meta:
         indexes = [
             models.Index(fields=['created_by']),
             models.Index(fields=['is_archived']),
+            models.Index(fields=['workspace']),
+            # Partial indexes over live projects only, for the access checks every request makes.
+            models.Index(
+                fields=['created_by'], name='core_project_live_owner_idx',
+                condition=models.Q(is_archived=False, deleted_at__isnull=True)
+            ),
+            models.Index(
+                fields=['id'], name='core_project_live_idx',
+                condition=models.Q(is_archived=False, deleted_at__isnull=True)
+            ),
         ]
     
     def __str__(self):
@@ -27,16 +98,22 @@ class Board(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='boards')
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    # Set when a delete is requested; the board is hidden until core.deletion removes it.
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     class Meta:
         indexes = [
             models.Index(fields=['project']),
+            models.Index(
+                fields=['project'], name='core_board_live_project_idx',
+                condition=models.Q(deleted_at__isnull=True)
+            ),
         ]
     
     def __str__(self):
         return f"{self.project.name} - {self.name}"
 
-class Column(models.Model):
+class Column(VersionedModel):
     """Model for representing a column on a kanban board."""
     board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name='columns')
     name = models.CharField(max_length=100)
@@ -47,14 +124,14 @@ class Column(models.Model):
     class Meta:
         ordering = ['position']
         indexes = [
-            models.Index(fields=['board']),
+            models.Index(fields=['board', 'position']),
             models.Index(fields=['position']),
         ]
     
     def __str__(self):
         return f"{self.board.name} - {self.name}"
 
-class Task(models.Model):
+class Task(VersionedModel):
     """Model for representing a task within a column."""
     PRIORITY_CHOICES = [
         ('low', 'Low'),
@@ -72,13 +149,20 @@ class Task(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_tasks')
     assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_tasks')
     position = models.PositiveIntegerField()
+    is_completed = models.BooleanField(default=False)
+    # When the task first moved out of the column it was created in; cycle time counts from here.
+    started_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     class Meta:
         ordering = ['position']
         indexes = [
-            models.Index(fields=['column']),
+            models.Index(fields=['column', 'position']),
             models.Index(fields=['created_by']),
-            models.Index(fields=['assigned_to']),
+            models.Index(fields=['assigned_to', 'due_date']),
+            models.Index(
+                fields=['assigned_to', 'due_date'], name='core_task_open_assigned_idx',
+                condition=models.Q(is_completed=False)
+            ),
             models.Index(fields=['due_date']),
             models.Index(fields=['priority']),
         ]
@@ -94,8 +178,7 @@ class SubTask(models.Model):
     
     class Meta:
         indexes = [
-            models.Index(fields=['task']),
-            models.Index(fields=['is_completed']),
+            models.Index(fields=['task', 'is_completed']),
         ]
     
     def __str__(self):
@@ -106,11 +189,14 @@ class Tag(models.Model):
     name = models.CharField(max_length=50)
     color = models.CharField(max_length=20, default='#3490dc')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Tasks carrying the tag, maintained by core.tagging.
+    usage_count = models.PositiveIntegerField(default=0)
     
     class Meta:
         unique_together = ['name', 'user']
         indexes = [
-            models.Index(fields=['user']),
+            # The tag picker lists a user's tags most used first.
+            models.Index(fields=['user', '-usage_count', 'name']),
         ]
     
     def __str__(self):
@@ -124,8 +210,7 @@ class TaskTag(models.Model):
     class Meta:
         unique_together = ['task', 'tag']
         indexes = [
-            models.Index(fields=['task']),
-            models.Index(fields=['tag']),
+            models.Index(fields=['tag', 'task']),
         ]
     
     def __str__(self):
@@ -141,7 +226,7 @@ class Comment(models.Model):
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['task']),
+            models.Index(fields=['task', '-created_at', '-id']),
             models.Index(fields=['user']),
             models.Index(fields=['created_at']),
         ]
@@ -149,10 +234,78 @@ class Comment(models.Model):
     def __str__(self):
         return f"Comment by {self.user.username} on {self.task.title}"
 
+class BlobManager(models.Manager):
+    def acquire(self, content):
+        """Return the blob holding ``content``, writing it to storage only if its digest is new."""
+        digest, size = file_digest(content)
+        using = router.db_for_write(self.model)
+        
+        with transaction.atomic(using=using):
+            blob = self.select_for_update().filter(digest=digest).first()
+            
+            if blob is None:
+                storage = self.model._meta.get_field('file').storage
+                name = blob_path(digest, content.name)
+                if not storage.exists(name):
+                    name = storage.save(name, content)
+                
+                try:
+                    with transaction.atomic(using=using):
+                        return self.create(digest=digest, file=name, size=size, ref_count=1)
+                except IntegrityError:
+                    blob = self.select_for_update().get(digest=digest)
+                    if blob.file.name != name:
+                        storage.delete(name)
+            
+            self.filter(pk=blob.pk).update(ref_count=models.F('ref_count') + 1)
+            blob.ref_count += 1
+            return blob
+    
+    def release(self, blob_id):
+        """Drop one reference to a blob, deleting the blob and its file with the last one."""
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            blob = self.select_for_update().filter(pk=blob_id).first()
+            if blob is None:
+                return
+            
+            if blob.ref_count > 1:
+                self.filter(pk=blob.pk).update(ref_count=models.F('ref_count') - 1)
+                return
+            
+            storage = blob.file.storage
+            name = blob.file.name
+            blob.delete()
+            transaction.on_commit(lambda: self._delete_files(storage, name), using=using)
+    
+    def _delete_files(self, storage, name):
+        from .images import delete_variants
+        
+        storage.delete(name)
+        delete_variants(storage, name, 'attachment')
+
+class Blob(models.Model):
+    """Model for a stored file shared by every attachment with the same content."""
+    digest = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='blobs/', max_length=255)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = BlobManager()
+    
+    def __str__(self):
+        return self.digest
+
 class Attachment(models.Model):
     """Model for representing file attachments on tasks."""
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='attachments')
-    file = models.FileField(upload_to='attachments/')
+    file = models.FileField(upload_to='attachments/', max_length=255)
+    blob = models.ForeignKey(
+        Blob, on_delete=models.PROTECT, null=True, blank=True, 
+        editable=False, related_name='attachments'
+    )
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     name = models.CharField(max_length=100)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
@@ -169,5 +322,150 @@ class Attachment(models.Model):
         if self.file and self.file.size > 100 * 1024 * 1024:  # 100MB
             raise ValidationError("File size cannot exceed 100MB.")
     
+    def save(self, *args, **kwargs):
+        """Point newly uploaded files at a shared blob instead of writing a new copy."""
+        if not self.file or self.file._committed:
+            return super().save(*args, **kwargs)
+        
+        with transaction.atomic(using=router.db_for_write(type(self), instance=self)):
+            previous_blob_id = self.blob_id
+            self.blob = Blob.objects.acquire(self.file)
+            self.file = self.blob.file.name
+            super().save(*args, **kwargs)
+            
+            if previous_blob_id:
+                Blob.objects.release(previous_blob_id)
+    
+    def __str__(self):
+        return self.name
+
+class Job(models.Model):
+    """Model for a unit of background work picked up by the ``run_workers`` command."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed')
+    ]
+    
+    task = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    wait_ms = models.PositiveIntegerField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    # Shard the job's rows are on; the job runs routed to it.
+    shard = models.CharField(max_length=50, default='default')
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['run_after'], name='core_job_pending_idx',
+                condition=models.Q(status='pending')
+            ),
+            models.Index(
+                fields=['locked_until'], name='core_job_running_idx',
+                condition=models.Q(status='running')
+            ),
+            models.Index(fields=['status', 'finished_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+class TaskTransition(models.Model):
+    """Model for one move of a task from a column to another (see ``core.flow``)."""
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='transitions')
+    board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name='+')
+    from_column = models.ForeignKey(Column, on_delete=models.SET_NULL, null=True, related_name='+')
+    to_column = models.ForeignKey(Column, on_delete=models.SET_NULL, null=True, related_name='+')
+    moved_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['task', 'moved_at']),
+            models.Index(fields=['board', 'moved_at']),
+        ]
+    
+    def __str__(self):
+        return f"Task #{self.task_id}: column #{self.from_column_id} -> #{self.to_column_id}"
+
+class ColumnDailyFlow(models.Model):
+    """Model for the number of tasks that entered and left a column on one (UTC) day."""
+    board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name='+')
+    column = models.ForeignKey(Column, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    entered = models.PositiveIntegerField(default=0)
+    exited = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['column', 'day']
+        indexes = [
+            models.Index(fields=['board', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"Column #{self.column_id} on {self.day}: +{self.entered} -{self.exited}"
+
+class BoardDailyFlow(models.Model):
+    """Model for the tasks a board completed on one (UTC) day, with their summed lead and cycle times."""
+    board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    completed = models.PositiveIntegerField(default=0)
+    lead_seconds = models.PositiveBigIntegerField(default=0)
+    cycle_seconds = models.PositiveBigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['board', 'day']
+    
+    def __str__(self):
+        return f"Board #{self.board_id} on {self.day}: {self.completed} completed"
+
+class Activity(models.Model):
+    """
+    Model for one entry of the append-only activity log (see ``core.activity``).
+    
+    Entries outlive the objects they describe, so the references carry no database
+    constraint and deleting a project never has to touch its history. The table is
+    created by ``core.activity`` rather than syncdb: on PostgreSQL it is partitioned
+    by month on ``created_at``.
+    """
+    created_at = models.DateTimeField(default=timezone.now)
+    project = models.ForeignKey(
+        Project, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    task = models.ForeignKey(
+        Task, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    actor = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    verb = models.CharField(max_length=40)
+    # Id of the project, board, column, task or comment the verb applies to.
+    object_id = models.PositiveBigIntegerField()
+    data = models.JSONField(default=dict, blank=True)
+    
+    class Meta:
+        managed = False
+        verbose_name_plural = 'activities'
+        indexes = [
+            models.Index(fields=['project', '-created_at', '-id'], name='core_activity_project_idx'),
+            models.Index(
+                fields=['task', '-created_at', '-id'], name='core_activity_task_idx',
+                condition=models.Q(task__isnull=False)
+            ),
+        ]
+    
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f"{self.verb} #{self.object_id} at {self.created_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,27 @@
+# core/pagination.py
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+class BucketPagination(PageNumberPagination):
+    """Page through one due-date bucket of the current user's tasks."""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+class CommentCursorPagination(CursorPagination):
+    """
+    Page through a task's comments, newest first.
+    
+    Cursors seek on the (task, -created_at, -id) index, so every page costs the same
+    however deep into a long thread it is, and new comments do not shift pages.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+class ActivityCursorPagination(CursorPagination):
+    """Page through a project's or task's activity, newest first, on its (-created_at, -id) index."""
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
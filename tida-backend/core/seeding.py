@@ -0,0 +1,201 @@
+# core/seeding.py
+"""
+Synthetic data for benchmarks and query tests.
+
+Sizes follow a Zipf-like skew: a few projects hold most of the boards and tasks,
+and a few users are members of, assigned to and commenting on far more than the
+rest, which is what makes N+1 queries and missing indexes show up.
+"""
+import random
+from collections import Counter
+from datetime import timedelta
+from itertools import accumulate
+
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+from django.utils import timezone
+from accounts.models import User
+from .models import (
+    Project, Board, Column, Task, SubTask, Tag, TaskTag, Comment, Attachment, Blob
+)
+from .tagging import rebuild_usage
+
+WORDS = (
+    "update fix review deploy design api board column sprint release customer "
+    "report draft test refactor migrate cache query page mobile login export"
+).split()
+
+COLUMN_NAMES = ("Backlog", "To Do", "In Progress", "Review", "Done", "Archive")
+
+DEFAULTS = {
+    'users': 50,
+    'projects': 20,
+    'boards': 3,
+    'columns': 5,
+    'tasks': 2000,
+    'subtasks': 2,
+    'tags': 8,
+    'comments': 3,
+    'attachments': 0.2,
+    'archived': 0.3,
+    'skew': 1.1,
+}
+
+class Seeder:
+    """Generate one dataset; every count is an average the skew spreads unevenly."""
+
+    def __init__(self, seed=42, skew=DEFAULTS['skew'], prefix='bench', batch_size=2000):
+        self.rng = random.Random(seed)
+        self.skew = skew
+        self.prefix = prefix
+        self.batch_size = batch_size
+
+    def weights(self, count):
+        """Zipf weights for ``count`` items, shuffled so the heavy items are not always the first ones."""
+        weights = [1 / (rank + 1) ** self.skew for rank in range(count)]
+        self.rng.shuffle(weights)
+        return weights
+
+    def spread(self, total, count):
+        """Split ``total`` items over ``count`` buckets following the skew."""
+        counts = [0] * count
+        if count:
+            for index in self.rng.choices(range(count), weights=self.weights(count), k=total):
+                counts[index] += 1
+        return counts
+
+    def around(self, mean):
+        """A non-negative count averaging ``mean``, with an occasional long tail."""
+        return int(self.rng.expovariate(1 / mean)) if mean > 0 else 0
+
+    def sentence(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words)).capitalize()
+
+    def create(self, model, objects):
+        return model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    @transaction.atomic
+    def run(self, users, projects, boards, columns, tasks, subtasks, tags, comments, attachments, archived):
+        """Create the dataset and return the number of rows created per model."""
+        rng = self.rng
+        now = timezone.now()
+
+        user_rows = self.create(User, [
+            User(username=f"{self.prefix}-user-{index}", email=f"{self.prefix}-user-{index}@example.com")
+            for index in range(users)
+        ])
+        user_weights = list(accumulate(self.weights(len(user_rows))))
+
+        def pick_user():
+            return rng.choices(user_rows, cum_weights=user_weights)[0]
+
+        project_rows = self.create(Project, [
+            Project(
+                name=f"{self.sentence(2)} {index}", description=self.sentence(8), created_by=pick_user(),
+                is_archived=rng.random() < archived
+            )
+            for index in range(projects)
+        ])
+        memberships = []
+        for project, member_count in zip(project_rows, self.spread(projects * 5, projects)):
+            members = {pick_user().pk for _ in range(member_count + 1)} - {project.created_by_id}
+            memberships.extend(
+                Project.members.through(project_id=project.pk, user_id=user_id) for user_id in members
+            )
+        self.create(Project.members.through, memberships)
+
+        board_rows = self.create(Board, [
+            Board(project=project, name=f"{self.sentence(1)} board {index}")
+            for project, board_count in zip(project_rows, self.spread(projects * boards, projects))
+            for index in range(max(board_count, 1))
+        ])
+        column_rows = self.create(Column, [
+            Column(board=board, name=COLUMN_NAMES[index % len(COLUMN_NAMES)], position=index)
+            for board in board_rows
+            for index in range(max(columns + rng.randint(-1, 1), 1))
+        ])
+
+        # Columns come in board order, so each board's last one is seen last.
+        last_columns = {column.board_id: column for column in column_rows}
+        task_rows = []
+        for column, task_count in zip(column_rows, self.spread(tasks, len(column_rows))):
+            for position in range(task_count):
+                creator = pick_user()
+                task_rows.append(Task(
+                    column=column, title=self.sentence(4), description=self.sentence(12),
+                    priority=rng.choice(Task.PRIORITY_CHOICES)[0],
+                    due_date=now + timedelta(days=rng.randint(-30, 60)) if rng.random() < 0.7 else None,
+                    created_by=creator,
+                    assigned_to=pick_user() if rng.random() < 0.8 else None,
+                    position=position,
+                    is_completed=column is last_columns[column.board_id]
+                ))
+        task_rows = self.create(Task, task_rows)
+
+        subtask_rows = self.create(SubTask, [
+            SubTask(task=task, title=self.sentence(3), is_completed=rng.random() < 0.5)
+            for task in task_rows for _ in range(self.around(subtasks))
+        ])
+
+        tag_rows = self.create(Tag, [
+            Tag(user=user, name=f"{word}-{index}")
+            for user in user_rows
+            for index, word in enumerate(rng.sample(WORDS, min(tags, len(WORDS))))
+        ])
+        tag_weights = list(accumulate(self.weights(len(tag_rows))))
+        task_tags = {
+            (task.pk, tag.pk)
+            for task in task_rows
+            for tag in rng.choices(tag_rows, cum_weights=tag_weights, k=rng.randint(0, 3))
+        } if tag_rows else set()
+        self.create(TaskTag, [TaskTag(task_id=task_id, tag_id=tag_id) for task_id, tag_id in task_tags])
+        rebuild_usage(Tag.objects.filter(pk__in=[tag.pk for tag in tag_rows]))
+
+        comment_rows = self.create(Comment, [
+            Comment(task=task, user=pick_user(), content=self.sentence(10))
+            for task, comment_count in zip(task_rows, self.spread(len(task_rows) * comments, len(task_rows)))
+            for _ in range(comment_count)
+        ])
+
+        attachment_count = int(len(task_rows) * attachments)
+        attachment_rows = []
+        if attachment_count:
+            # A small pool of shared blobs, like the same files attached over and over.
+            blobs = [
+                Blob.objects.acquire(ContentFile(
+                    f"{self.prefix} attachment {index}\n".encode() * 64, name=f"{self.prefix}-{index}.txt"
+                ))
+                for index in range(min(20, attachment_count))
+            ]
+            attachment_rows = self.create(Attachment, [
+                Attachment(
+                    task=rng.choice(task_rows), blob=blob, file=blob.file.name,
+                    name=f"{self.sentence(2)}.txt", uploaded_by=pick_user()
+                )
+                for blob in rng.choices(blobs, k=attachment_count)
+            ])
+            uses = Counter(attachment.blob_id for attachment in attachment_rows)
+            for blob in blobs:
+                # acquire() already counted one reference that no attachment holds.
+                Blob.objects.filter(pk=blob.pk).update(ref_count=models.F('ref_count') + uses[blob.pk] - 1)
+
+        return {
+            'users': len(user_rows),
+            'projects': len(project_rows),
+            'archived': sum(project.is_archived for project in project_rows),
+            'memberships': len(memberships),
+            'boards': len(board_rows),
+            'columns': len(column_rows),
+            'tasks': len(task_rows),
+            'subtasks': len(subtask_rows),
+            'tags': len(tag_rows),
+            'task_tags': len(task_tags),
+            'comments': len(comment_rows),
+            'attachments': len(attachment_rows),
+        }
+
+def seed(seed=42, skew=DEFAULTS['skew'], prefix='bench', **counts):
+    """Create a dataset with ``DEFAULTS`` overridden by ``counts``; see ``Seeder.run``."""
+    sizes = {name: value for name, value in DEFAULTS.items() if name != 'skew'}
+    sizes.update(counts)
+    return Seeder(seed=seed, skew=skew, prefix=prefix).run(**sizes)
@@ -1,28 +1,50 @@
 # core/serializers.py
 from rest_framework import serializers
+from tida_backend.serializers import ModelSerializer
+from django.conf import settings
 from django.utils import timezone
-from .models import Project, Board, Column, Task, SubTask, Tag, TaskTag, Comment, Attachment
+from .models import Workspace, Project, Board, Column, Task, SubTask, Tag, TaskTag, Comment, Attachment, Activity
 from accounts.serializers import UserLightSerializer
+from .images import is_image, variant_urls
 
-class TagSerializer(serializers.ModelSerializer):
+class WorkspaceSerializer(ModelSerializer):
+    class Meta:
+        model = Workspace
+        fields = ['id', 'name', 'created_at']
+        read_only_fields = ['id', 'created_at']
+
+class TagSerializer(ModelSerializer):
     class Meta:
         model = Tag
         fields = ['id', 'name', 'color']
         read_only_fields = ['id']
 
-class SubTaskSerializer(serializers.ModelSerializer):
+class TagUsageSerializer(TagSerializer):
+    """Tags as the tag picker lists them, with the number of tasks carrying each."""
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['usage_count']
+        read_only_fields = ['id', 'usage_count']
+
+class SubTaskSerializer(ModelSerializer):
     class Meta:
         model = SubTask
         fields = ['id', 'title', 'is_completed', 'task']
         read_only_fields = ['id']
 
-class AttachmentSerializer(serializers.ModelSerializer):
+class AttachmentSerializer(ModelSerializer):
     uploaded_by = UserLightSerializer(read_only=True)
+    previews = serializers.SerializerMethodField()
     
     class Meta:
         model = Attachment
-        fields = ['id', 'file', 'name', 'uploaded_by', 'uploaded_at', 'task']
-        read_only_fields = ['id', 'uploaded_by', 'uploaded_at']
+        fields = ['id', 'file', 'name', 'uploaded_by', 'uploaded_at', 'task', 'previews']
+        read_only_fields = ['id', 'uploaded_by', 'uploaded_at', 'previews']
+    
+    def get_previews(self, obj):
+        """Get preview thumbnail URLs for image attachments."""
+        if not is_image(obj.file.name):
+            return None
+        return variant_urls(obj.file, obj.variants, 'attachment', self.context.get('request'))
     
     def validate_file(self, value):
         """Validate the file size."""
@@ -30,7 +52,13 @@ class AttachmentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("File size cannot exceed 100MB.")
         return value
 
-class CommentSerializer(serializers.ModelSerializer):
+LATEST_COMMENTS = getattr(settings, 'LATEST_COMMENTS', 3)
+
+def latest_comments(comments):
+    """Newest ``LATEST_COMMENTS`` of ``comments``, read from the (task, -created_at, -id) index."""
+    return comments.select_related('user').order_by('-created_at', '-id')[:LATEST_COMMENTS]
+
+class CommentSerializer(ModelSerializer):
     user = UserLightSerializer(read_only=True)
     
     class Meta:
@@ -38,12 +66,21 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'content', 'user', 'created_at', 'task']
         read_only_fields = ['id', 'user', 'created_at']
 
-class TaskSerializer(serializers.ModelSerializer):
+class ActivitySerializer(ModelSerializer):
+    actor = UserLightSerializer(read_only=True)
+    
+    class Meta:
+        model = Activity
+        fields = ['id', 'verb', 'actor', 'project', 'task', 'object_id', 'data', 'created_at']
+        read_only_fields = fields
+
+class TaskSerializer(ModelSerializer):
     created_by = UserLightSerializer(read_only=True)
     assigned_to = UserLightSerializer(read_only=True)
     subtasks = SubTaskSerializer(many=True, read_only=True)
     tags = serializers.SerializerMethodField()
-    comments = CommentSerializer(many=True, read_only=True)
+    comment_count = serializers.SerializerMethodField()
+    latest_comments = serializers.SerializerMethodField()
     attachments = AttachmentSerializer(many=True, read_only=True)
     column_detail = serializers.SerializerMethodField(read_only=True)
     
@@ -52,19 +89,36 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'priority', 'due_date', 
             'created_at', 'updated_at', 'created_by', 'assigned_to', 
-            'position', 'column', 'column_detail', 'subtasks', 'tags', 
-            'comments', 'attachments'
+            'position', 'is_completed', 'column', 'column_detail', 'subtasks', 'tags', 
+            'comment_count', 'latest_comments', 'attachments', 'version'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'created_by', 'column_detail']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'created_by', 'column_detail', 'is_completed', 'version']
 
     def get_tags(self, obj):
-        """Get all tags associated with this task."""
-        task_tags = TaskTag.objects.filter(task=obj)
+        """Get all tags associated with this task, using prefetched ``task_tags__tag`` when present."""
+        if 'task_tags' in getattr(obj, '_prefetched_objects_cache', {}):
+            task_tags = obj.task_tags.all()
+        else:
+            task_tags = TaskTag.objects.filter(task=obj).select_related('tag')
         return TagSerializer(
             [task_tag.tag for task_tag in task_tags], 
             many=True
         ).data
     
+    def get_comment_count(self, obj):
+        """Get the number of comments, using the ``comment_count`` annotation when present."""
+        if hasattr(obj, 'comment_count'):
+            return obj.comment_count
+        return Comment.objects.filter(task=obj).count()
+    
+    def get_latest_comments(self, obj):
+        """Get the newest ``LATEST_COMMENTS`` comments; the full thread is paged by ``comments/task_comments/``."""
+        if hasattr(obj, 'latest_comments'):
+            comments = obj.latest_comments
+        else:
+            comments = latest_comments(Comment.objects.filter(task=obj))
+        return CommentSerializer(comments, many=True, context=self.context).data
+    
     def get_column_detail(self, obj):
         """Get detailed column information including the board."""
         if obj.column:
@@ -74,19 +128,19 @@ class TaskSerializer(serializers.ModelSerializer):
                 'board': {
                     'id': obj.column.board.id,
                     'name': obj.column.board.name,
-                    'project': obj.column.board.project.id
+                    'project': obj.column.board.project_id
                 } if obj.column.board else None
             }
             return column_data
         return None
 
-class ColumnSerializer(serializers.ModelSerializer):
+class ColumnSerializer(ModelSerializer):
     tasks = TaskSerializer(many=True, read_only=True)
     
     class Meta:
         model = Column
-        fields = ['id', 'name', 'position', 'color', 'wip_limit', 'board', 'tasks']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'position', 'color', 'wip_limit', 'board', 'tasks', 'version']
+        read_only_fields = ['id', 'version']
     
     def validate_wip_limit(self, value):
         """Validate WIP limit is a positive integer."""
@@ -94,7 +148,7 @@ class ColumnSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("WIP limit must be a positive integer.")
         return value
 
-class BoardSerializer(serializers.ModelSerializer):
+class BoardSerializer(ModelSerializer):
     columns = ColumnSerializer(many=True, read_only=True)
     
     class Meta:
@@ -102,7 +156,7 @@ class BoardSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'project', 'columns']
         read_only_fields = ['id']
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(ModelSerializer):
     created_by = UserLightSerializer(read_only=True)
     members = UserLightSerializer(many=True, read_only=True)
     boards = BoardSerializer(many=True, read_only=True)
@@ -122,28 +176,46 @@ class ProjectSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Project name cannot be empty.")
         return value
 
-class ProjectLightSerializer(serializers.ModelSerializer):
+class ProjectLightSerializer(ModelSerializer):
     class Meta:
         model = Project
         fields = ['id', 'name', 'is_archived']
         read_only_fields = fields
 
-class BoardLightSerializer(serializers.ModelSerializer):
+class BoardLightSerializer(ModelSerializer):
     class Meta:
         model = Board
         fields = ['id', 'name', 'project']
         read_only_fields = fields
 
-class ColumnLightSerializer(serializers.ModelSerializer):
+class ColumnLightSerializer(ModelSerializer):
     class Meta:
         model = Column
         fields = ['id', 'name', 'position', 'color', 'board']
         read_only_fields = fields
 
-class TaskLightSerializer(serializers.ModelSerializer):
+class TaskLightSerializer(ModelSerializer):
     assigned_to = UserLightSerializer(read_only=True)
     
     class Meta:
         model = Task
-        fields = ['id', 'title', 'priority', 'due_date', 'assigned_to', 'position']
+        fields = ['id', 'title', 'priority', 'due_date', 'assigned_to', 'position', 'is_completed']
+        read_only_fields = fields
+
+class MyTaskSerializer(ModelSerializer):
+    """Flat task row for the My Tasks buckets; expects the queryset annotations from ``my_tasks``."""
+    column_name = serializers.CharField(source='column.name', read_only=True)
+    board = serializers.IntegerField(source='column.board_id', read_only=True)
+    board_name = serializers.CharField(source='column.board.name', read_only=True)
+    project = serializers.IntegerField(source='column.board.project_id', read_only=True)
+    subtask_count = serializers.IntegerField(read_only=True)
+    completed_subtask_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = Task
+        fields = [
+            'id', 'title', 'description', 'priority', 'due_date', 'position', 
+            'is_completed', 'column', 'column_name', 'board', 'board_name', 
+            'project', 'subtask_count', 'completed_subtask_count'
+        ]
         read_only_fields = fields
\ No newline at end of file
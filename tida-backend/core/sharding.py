@@ -0,0 +1,361 @@
+# core/sharding.py
+"""
+Workspaces spread over several databases.
+
+A workspace and its membership live on ``default``; its projects, with every
+board, column, task and row below them, live on the shard named by
+``Workspace.shard``. Requests pick a workspace with an ``X-Workspace: <id>``
+header and ``WorkspaceMiddleware`` routes the sharded models of the request to
+its shard (see ``tida_backend.db_router.ShardRouter``). Requests without one see
+the projects that belong to no workspace, on ``default``.
+
+Every shard holds the full schema. Users are replicated from ``default`` to the
+other shards once their save commits, so sharded rows keep their foreign keys to
+users, and access checks compare user ids on the shard that holds the project
+without ever joining across databases. The n-th shard allocates primary keys
+from ``n * SHARD_ID_SPACING``, so ids are unique across shards and a workspace
+keeps them when ``move_workspace`` copies it to another shard.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models.fields import AutoFieldMixin
+from django.http import JsonResponse
+from tida_backend.db_router import SAFE_METHODS, is_sharded, use_shard, use_workspace
+from accounts.models import User
+from .cache import bump_generation
+from .deletion import delete_task_batch
+from .models import (
+    Workspace, Project, Board, Column, Task, SubTask, Tag, TaskTag, Comment, Attachment, Blob,
+    Activity, TaskTransition, ColumnDailyFlow, BoardDailyFlow
+)
+from .tagging import adjust_usage
+
+WORKSPACE_HEADER = 'HTTP_X_WORKSPACE'
+CACHE_SECONDS = getattr(settings, 'WORKSPACE_CACHE_SECONDS', 300)
+COPY_BATCH_SIZE = 1000
+# Seconds a moving workspace's clients are told to wait before retrying a write.
+MOVE_RETRY_AFTER = 30
+
+def workspace_key(workspace_id):
+    return f"workspace:{workspace_id}"
+
+def workspace_route(workspace_id):
+    """Return ``(shard, is_moving)`` for a workspace, or None if it does not exist."""
+    route = cache.get(workspace_key(workspace_id))
+    if route is None:
+        route = Workspace.objects.filter(pk=workspace_id).values_list('shard', 'is_moving').first()
+        # Missing workspaces are cached too, as an empty tuple.
+        cache.set(workspace_key(workspace_id), route or (), timeout=CACHE_SECONDS)
+    return tuple(route) or None
+
+def forget_workspace(workspace_id):
+    cache.delete(workspace_key(workspace_id))
+
+def member_workspace_ids(user):
+    """Return a subquery of the ids of workspaces the user created or is a member of."""
+    return Workspace.objects.filter(created_by_id=user.pk).values('id').union(
+        Workspace.members.through.objects.filter(user_id=user.pk).values('workspace_id')
+    )
+
+def is_workspace_member(user, workspace_id):
+    """Return True if the user created or is a member of the workspace."""
+    return Workspace.objects.filter(
+        models.Q(created_by_id=user.pk) | models.Q(members__id=user.pk), pk=workspace_id
+    ).exists()
+
+def shard_for_new_workspace():
+    """Return the configured shard holding the fewest workspaces."""
+    counts = dict(
+        Workspace.objects.values('shard').annotate(count=models.Count('id')).values_list('shard', 'count')
+    )
+    return min(settings.DATABASE_SHARDS, key=lambda alias: counts.get(alias, 0))
+
+class WorkspaceMiddleware:
+    """
+    Route a request's sharded models to the shard of the workspace in its ``X-Workspace`` header.
+
+    Writes to a workspace that is being moved get a 503 with ``Retry-After``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        route = self.resolve(request)
+        if isinstance(route, JsonResponse):
+            return route
+        with use_workspace(*route):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        route = await sync_to_async(self.resolve)(request)
+        if isinstance(route, JsonResponse):
+            return route
+        with use_workspace(*route):
+            return await self.get_response(request)
+
+    def resolve(self, request):
+        """Return ``(workspace_id, shard)`` for the request, or the error response to send instead."""
+        value = request.META.get(WORKSPACE_HEADER)
+        if not value:
+            return None, DEFAULT_DB_ALIAS
+        try:
+            workspace_id = int(value)
+        except ValueError:
+            return JsonResponse({'detail': "Invalid workspace."}, status=400)
+
+        route = workspace_route(workspace_id)
+        if route is None:
+            return JsonResponse({'detail': "Workspace not found."}, status=404)
+        shard, is_moving = route
+        if is_moving and request.method not in SAFE_METHODS:
+            response = JsonResponse(
+                {'detail': "This workspace is being moved; try again shortly."}, status=503
+            )
+            response['Retry-After'] = str(MOVE_RETRY_AFTER)
+            return response
+        return workspace_id, shard
+
+def replica_shards():
+    return [alias for alias in settings.DATABASE_SHARDS if alias != DEFAULT_DB_ALIAS]
+
+def copy_users(users, aliases):
+    """Upsert the users of ``users``, a queryset on ``default``, into the shards ``aliases``."""
+    fields = [field for field in User._meta.concrete_fields]
+    rows = [User(**values) for values in users.using(DEFAULT_DB_ALIAS).values(*(field.attname for field in fields))]
+    for alias in aliases:
+        # bulk_create sends no signals, so the copies neither revoke tokens nor replicate again.
+        User._base_manager.using(alias).bulk_create(
+            rows, batch_size=COPY_BATCH_SIZE, update_conflicts=True,
+            unique_fields=[User._meta.pk.name],
+            update_fields=[field.name for field in fields if not field.primary_key]
+        )
+
+def replicate_user(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """``post_save`` receiver copying a user to every other shard once the save commits."""
+    aliases = replica_shards()
+    if using == DEFAULT_DB_ALIAS and aliases:
+        transaction.on_commit(lambda: copy_users(User.objects.filter(pk=instance.pk), aliases), using=using)
+
+def remove_replicated_user(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """``post_delete`` receiver deleting a user's copies, with what cascades from them on each shard."""
+    aliases = replica_shards()
+    if using == DEFAULT_DB_ALIAS and aliases:
+        user_id = instance.pk
+
+        def remove():
+            for alias in aliases:
+                User._base_manager.using(alias).filter(pk=user_id).delete()
+        transaction.on_commit(remove, using=using)
+
+def reserve_ids(using):
+    """Move the id sequences of the sharded tables on ``using`` to the start of its range."""
+    index = settings.DATABASE_SHARDS.index(using) if using in settings.DATABASE_SHARDS else 0
+    connection = connections[using]
+    if not index or connection.vendor not in ('postgresql', 'sqlite'):
+        return
+
+    start = index * settings.SHARD_ID_SPACING
+    tables = set(connection.introspection.table_names())
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for model in apps.get_models(include_auto_created=True):
+            pk = model._meta.pk
+            if not is_sharded(model) or not isinstance(pk, AutoFieldMixin) or model._meta.db_table not in tables:
+                continue
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [model._meta.db_table, pk.column])
+                sequence, = cursor.fetchone()
+                cursor.execute(f"SELECT last_value FROM {sequence}")
+                if cursor.fetchone()[0] < start:
+                    cursor.execute("SELECT setval(%s, %s, false)", [sequence, start])
+            else:
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [model._meta.db_table])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute(
+                        "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [model._meta.db_table, start - 1]
+                    )
+                elif row[0] < start - 1:
+                    cursor.execute(
+                        "UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [start - 1, model._meta.db_table]
+                    )
+
+def prepare_shard(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """``post_migrate`` receiver giving a shard its id range and a copy of every user."""
+    if using == DEFAULT_DB_ALIAS or using not in settings.DATABASE_SHARDS:
+        return
+    reserve_ids(using)
+    if User._meta.db_table in connections[DEFAULT_DB_ALIAS].introspection.table_names():
+        last_id = 0
+        while True:
+            batch = list(
+                User.objects.using(DEFAULT_DB_ALIAS).filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:COPY_BATCH_SIZE]
+            )
+            if not batch:
+                break
+            copy_users(User.objects.filter(pk__in=batch), [using])
+            last_id = batch[-1]
+
+def insert_rows(model, objs, using):
+    """Insert ``objs`` exactly as read, ids and timestamps included, without sending signals."""
+    fields = model._meta.local_concrete_fields
+    batch_size = max(connections[using].ops.bulk_batch_size(fields, objs), 1)
+    for start in range(0, len(objs), batch_size):
+        # A raw insert, as loaddata does: bulk_create would stamp auto_now fields with the current time.
+        model._base_manager.using(using)._insert(objs[start:start + batch_size], fields=fields, using=using, raw=True)
+
+def copy_model(model, queryset, source, target, transform=None):
+    """Copy the rows of ``queryset`` from ``source`` to ``target`` in batches; return how many were copied."""
+    count, batch = 0, []
+    for obj in queryset.using(source).order_by('pk').iterator(chunk_size=COPY_BATCH_SIZE):
+        batch.append(transform(obj) if transform else obj)
+        if len(batch) == COPY_BATCH_SIZE:
+            insert_rows(model, batch, target)
+            count, batch = count + len(batch), []
+    insert_rows(model, batch, target)
+    return count + len(batch)
+
+def map_rows(model, objs, target, match):
+    """
+    Return a map of the ids of ``objs`` to the ids of the matching rows on ``target``.
+
+    Rows are matched on their id first, then on the fields ``match`` returns; the
+    ones matching nothing are inserted with their ids.
+    """
+    mapping, missing = {}, []
+    existing = set(model._base_manager.using(target).filter(pk__in=[obj.pk for obj in objs]).values_list('pk', flat=True))
+    for obj in objs:
+        if obj.pk in existing:
+            mapping[obj.pk] = obj.pk
+            continue
+        twin = model._base_manager.using(target).filter(**match(obj)).values_list('pk', flat=True).first()
+        if twin is None:
+            missing.append(obj)
+            twin = obj.pk
+        mapping[obj.pk] = twin
+    insert_rows(model, missing, target)
+    return mapping
+
+def workspace_rows(project_ids):
+    """Return every sharded model with a queryset of its rows below ``project_ids``, parents first."""
+    tasks = {'column__board__project_id__in': project_ids}
+    return [
+        (Project, Project.objects.filter(pk__in=project_ids)),
+        (Project.members.through, Project.members.through.objects.filter(project_id__in=project_ids)),
+        (Board, Board.objects.filter(project_id__in=project_ids)),
+        (Column, Column.objects.filter(board__project_id__in=project_ids)),
+        (Task, Task.objects.filter(**tasks)),
+        (SubTask, SubTask.objects.filter(**{f"task__{key}": value for key, value in tasks.items()})),
+        (TaskTag, TaskTag.objects.filter(**{f"task__{key}": value for key, value in tasks.items()})),
+        (Comment, Comment.objects.filter(**{f"task__{key}": value for key, value in tasks.items()})),
+        (Attachment, Attachment.objects.filter(**{f"task__{key}": value for key, value in tasks.items()})),
+        (TaskTransition, TaskTransition.objects.filter(board__project_id__in=project_ids)),
+        (ColumnDailyFlow, ColumnDailyFlow.objects.filter(board__project_id__in=project_ids)),
+        (BoardDailyFlow, BoardDailyFlow.objects.filter(board__project_id__in=project_ids)),
+        (Activity, Activity.objects.filter(project_id__in=project_ids)),
+    ]
+
+def copy_workspace(project_ids, source, target, log):
+    """Copy the projects and everything below them from ``source`` to ``target``; return the moved blob references."""
+    rows = workspace_rows(project_ids)
+    querysets = dict(rows)
+
+    # Tags belong to users, not projects, and blobs are shared by content: reuse the
+    # target's own rows where they exist.
+    tags = list(Tag.objects.using(source).filter(pk__in=querysets[TaskTag].using(source).values('tag_id')))
+    for tag in tags:
+        # Counted up below by the links that come along.
+        tag.usage_count = 0
+    tag_ids = map_rows(Tag, tags, target, lambda tag: {'name': tag.name, 'user_id': tag.user_id})
+    usage = querysets[TaskTag].using(source).values('tag_id').annotate(count=models.Count('id'))
+    adjust_usage({tag_ids[row['tag_id']]: row['count'] for row in usage}, using=target)
+
+    references = dict(
+        querysets[Attachment].using(source).exclude(blob=None).values('blob_id')
+        .annotate(count=models.Count('id')).values_list('blob_id', 'count')
+    )
+    blobs = list(Blob.objects.using(source).filter(pk__in=references))
+    existing = set(Blob.objects.using(target).filter(digest__in=[blob.digest for blob in blobs]).values_list('digest', flat=True))
+    for blob in blobs:
+        if blob.digest not in existing:
+            blob.ref_count = 0
+    blob_ids = map_rows(Blob, blobs, target, lambda blob: {'digest': blob.digest})
+    for blob_id, count in references.items():
+        Blob.objects.using(target).filter(pk=blob_ids[blob_id]).update(ref_count=models.F('ref_count') + count)
+
+    def retag(task_tag):
+        task_tag.tag_id = tag_ids[task_tag.tag_id]
+        return task_tag
+
+    def reblob(attachment):
+        if attachment.blob_id:
+            attachment.blob_id = blob_ids[attachment.blob_id]
+        return attachment
+
+    transforms = {TaskTag: retag, Attachment: reblob}
+    for model, queryset in rows:
+        count = copy_model(model, queryset, source, target, transforms.get(model))
+        log(f"Copied {count} {model._meta.verbose_name_plural}.")
+    return references
+
+def delete_workspace_rows(project_ids, source, references):
+    """Delete copied projects from ``source``, leaving the files their attachments share with the copies."""
+    with use_shard(source):
+        # Unlinked from their blobs first, so deleting them releases no files.
+        Attachment.objects.filter(task__column__board__project_id__in=project_ids).update(blob=None, file='')
+        while delete_task_batch(Task.objects.filter(column__board__project_id__in=project_ids)):
+            pass
+        with transaction.atomic(using=source):
+            Activity.objects.filter(project_id__in=project_ids).delete()
+            Project.objects.filter(pk__in=project_ids).delete()
+            for blob_id, count in references.items():
+                Blob.objects.filter(pk=blob_id).update(ref_count=models.F('ref_count') - count)
+            Blob.objects.filter(pk__in=references, ref_count__lte=0).delete()
+
+def move_workspace(workspace, target, grace=0, log=lambda message: None):
+    """
+    Move a workspace's projects and everything below them to the shard ``target``.
+
+    Writes to the workspace are refused for the duration (reads keep being served
+    from the old shard). After ``grace`` seconds for in-flight writes to finish,
+    the rows are copied in one transaction on the target, the workspace is pointed
+    at it, and the originals are deleted.
+    """
+    source = workspace.shard
+    if target not in settings.DATABASE_SHARDS:
+        raise ValueError(f"Unknown shard {target!r}; configured: {', '.join(settings.DATABASE_SHARDS)}.")
+    if target == source:
+        raise ValueError(f"Workspace {workspace.pk} is already on {target}.")
+
+    Workspace.objects.filter(pk=workspace.pk).update(is_moving=True)
+    forget_workspace(workspace.pk)
+    try:
+        time.sleep(grace)
+        project_ids = list(Project.objects.using(source).filter(workspace_id=workspace.pk).values_list('pk', flat=True))
+        with transaction.atomic(using=target):
+            references = copy_workspace(project_ids, source, target, log)
+        Workspace.objects.filter(pk=workspace.pk).update(shard=target, is_moving=False)
+    except BaseException:
+        Workspace.objects.filter(pk=workspace.pk).update(is_moving=False)
+        raise
+    finally:
+        forget_workspace(workspace.pk)
+
+    workspace.shard, workspace.is_moving = target, False
+    delete_workspace_rows(project_ids, source, references)
+    bump_generation('project', 'board', 'column', 'task')
+    log(f"Moved {len(project_ids)} projects from {source} to {target}.")
+    return workspace
@@ -0,0 +1,63 @@
+# core/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from accounts.models import User, ClaimsUser
+from .cache import bump_generation, bump_membership
+from .images import delete_variants, schedule_variants
+from .models import Project, Board, Column, Task, Attachment, Blob
+from .sharding import replicate_user, remove_replicated_user
+
+CACHED_MODELS = {
+    Project: 'project',
+    Board: 'board',
+    Column: 'column',
+    Task: 'task',
+    User: 'user',
+    ClaimsUser: 'user',
+}
+
+@receiver(post_save, sender=Attachment)
+def generate_attachment_previews(sender, instance, **kwargs):
+    """Render preview thumbnails for image attachments."""
+    schedule_variants(instance, 'file', 'variants', 'attachment')
+
+@receiver(post_delete, sender=Attachment)
+def release_attachment_blob(sender, instance, **kwargs):
+    """Drop the attachment's reference to its blob, including cascaded deletes."""
+    if instance.blob_id:
+        Blob.objects.release(instance.blob_id)
+    elif instance.file:
+        # Uploaded before blobs existed, so the file belongs to this attachment alone.
+        storage, name = instance.file.storage, instance.file.name
+        transaction.on_commit(
+            lambda: (storage.delete(name), delete_variants(storage, name, 'attachment')), using=instance._state.db
+        )
+
+def bump_model_generation(sender, **kwargs):
+    """Invalidate cached light lists when a project, board, column, task or user changes."""
+    bump_generation(CACHED_MODELS[sender])
+
+# Connected per model: a catch-all receiver would make Django fetch and delete every
+# cascaded subtask, comment and tag row one batch at a time instead of in one DELETE.
+for model in CACHED_MODELS:
+    post_save.connect(bump_model_generation, sender=model)
+    post_delete.connect(bump_model_generation, sender=model)
+
+@receiver(m2m_changed, sender=Project.members.through)
+def bump_changed_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate cached lists of users who joined or left a project."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    
+    if reverse:
+        bump_membership(instance.pk)
+    elif action == 'post_clear':
+        bump_generation('project')
+    elif pk_set:
+        bump_membership(*pk_set)
+
+# Sharded rows reference users, so every shard keeps a copy of each one.
+for model in (User, ClaimsUser):
+    post_save.connect(replicate_user, sender=model)
+    post_delete.connect(remove_replicated_user, sender=model)
@@ -0,0 +1,25 @@
+# core/storage.py
+import hashlib
+import os
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+def file_digest(content):
+    """Return the SHA-256 hex digest and size of a file, reading it in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(chunk_size=HASH_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+
+    return digest.hexdigest(), size
+
+def blob_path(digest, filename=''):
+    """Build the content-addressed path of a blob, keeping the original extension."""
+    extension = os.path.splitext(filename)[1].lower()[:10]
+    return f"blobs/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
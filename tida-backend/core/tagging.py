@@ -0,0 +1,76 @@
+# core/tagging.py
+"""
+Tagging tasks in bulk, and the per-tag usage counters behind the tag picker.
+
+``Tag.usage_count`` holds how many tasks carry a tag, so the picker can show and
+sort by popularity without counting ``TaskTag`` rows. It changes in the same
+transaction as the rows it counts: in ``add_tags``/``remove_tags``, which lock
+the tags first so concurrent changes to one tag apply one after the other, and
+in ``release_task_tags``, which views and background deletions call before
+deleting tasks. ``manage.py rebuild_tag_usage`` recounts every tag from scratch.
+"""
+from collections import Counter
+
+from django.db import models, router, transaction
+from django.db.models.functions import Coalesce, Greatest
+from .models import Tag, TaskTag
+
+BATCH_SIZE = 1000
+# Most tasks and tags one bulk request may name.
+MAX_BULK_TASKS = 500
+MAX_BULK_TAGS = 20
+
+def adjust_usage(deltas, using=None):
+    """Add ``deltas`` (tag id -> change) to the usage counters in a single UPDATE."""
+    deltas = {tag_id: delta for tag_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    Tag.objects.db_manager(using).filter(pk__in=deltas).update(usage_count=Greatest(
+        models.Case(
+            *(models.When(pk=tag_id, then=models.F('usage_count') + delta) for tag_id, delta in deltas.items()),
+            default=models.F('usage_count'),
+            output_field=models.IntegerField()
+        ),
+        0
+    ))
+
+def lock_tags(tag_ids):
+    """Lock the rows of ``tag_ids``, in id order so two requests never wait on each other."""
+    list(Tag.objects.select_for_update().filter(pk__in=tag_ids).order_by('pk').values_list('pk', flat=True))
+
+def add_tags(task_ids, tag_ids):
+    """Tag every task of ``task_ids`` with every tag of ``tag_ids``; return how many links were added."""
+    with transaction.atomic(using=router.db_for_write(TaskTag)):
+        lock_tags(tag_ids)
+        existing = set(
+            TaskTag.objects.filter(task_id__in=task_ids, tag_id__in=tag_ids).values_list('task_id', 'tag_id')
+        )
+        rows = [
+            TaskTag(task_id=task_id, tag_id=tag_id)
+            for task_id in task_ids for tag_id in tag_ids if (task_id, tag_id) not in existing
+        ]
+        TaskTag.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        adjust_usage(Counter(row.tag_id for row in rows))
+    return len(rows)
+
+def remove_tags(task_ids, tag_ids):
+    """Remove every tag of ``tag_ids`` from every task of ``task_ids``; return how many links were removed."""
+    with transaction.atomic(using=router.db_for_write(TaskTag)):
+        lock_tags(tag_ids)
+        links = TaskTag.objects.filter(task_id__in=task_ids, tag_id__in=tag_ids)
+        usage = dict(links.values('tag_id').annotate(count=models.Count('id')).values_list('tag_id', 'count'))
+        links.delete()
+        adjust_usage({tag_id: -count for tag_id, count in usage.items()})
+    return sum(usage.values())
+
+def release_task_tags(tasks):
+    """Take ``tasks``, which are about to be deleted, out of the usage counters of their tags."""
+    usage = TaskTag.objects.filter(task__in=tasks).values('tag_id').annotate(count=models.Count('id'))
+    adjust_usage({row['tag_id']: -row['count'] for row in usage})
+
+def rebuild_usage(tags):
+    """Recount the usage counters of ``tags`` from their ``TaskTag`` rows."""
+    tags.update(usage_count=Coalesce(models.Subquery(
+        TaskTag.objects.filter(tag_id=models.OuterRef('pk')).order_by().values('tag_id')
+        .annotate(count=models.Count('id')).values('count')
+    ), 0))
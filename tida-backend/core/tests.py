@@ -1,3 +1,2020 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from itertools import cycle
+from types import ModuleType, SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+from urllib.parse import urlencode
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+import msgpack
+from PIL import Image
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, models, router, transaction
+from django.http import JsonResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, include, path, resolve, reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from tida_backend.db_router import ReadReplicaMiddleware
+from tida_backend.metrics import PROCESSES_KEY, PROCESSES_LOCK_KEY, collect, registry, request_metrics, timing
+from tida_backend.profiling import make_token
+from tida_backend.renderers import ORJSONRenderer
+from tida_backend import urls as root_urls
+from tida_backend.throttling import concurrency_slot
+from accounts import urls as accounts_urls
+from accounts.authentication import forget_user
+from accounts.models import User
+from . import urls as core_urls
+from .activity import collect_activity, record
+from .cache import generation_key, membership_key
+from .deletion import delete_task_batch
+from .jobs import BACKOFF_BASE_SECONDS, LEASE_SECONDS, claim, enqueue, execute, job
+from .flow import rebuild
+from .identity import IdentityMap
+from .models import (
+    Workspace, Project, Board, Column, Task, SubTask, Tag, TaskTag, Comment, Attachment, Blob, Job, Activity,
+    TaskTransition, ColumnDailyFlow, BoardDailyFlow, VersionConflict
+)
+from .seeding import seed
+from .serializers import LATEST_COMMENTS
+from .sharding import copy_users, forget_workspace
+
+# Multiplies the seeded volume; raise it to check plans against bigger tables.
+QUERY_PLAN_SCALE = int(os.environ.get('QUERY_PLAN_SCALE', '1'))
+
+# Planners rightly scan tiny tables, so only tables at least this big are checked.
+MIN_CHECKED_ROWS = 1000
+
+SORT_NODES = ('Sort', 'Incremental Sort')
+
+# Django limits sliced prefetches with a window function in a derived table of this
+# name and sorts its rows again outside it. That sort only sees the rows kept per
+# parent, which the inner query already read in index order, so it is allowed.
+SLICED_PREFETCH_ALIAS = 'qualify'
+
+def fingerprint(sql):
+    """Collapse literals and IN lists so repeated queries share one fingerprint."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'"s\d+_x\d+"', '?', sql)
+    sql = re.sub(r'\b\d+(\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(\s*,\s*\?)*\s*\)', '(?)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+def explain(sql):
+    """Return the plan of ``sql`` as a list of (node, detail) pairs."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            nodes = []
+            stack = [plan[0]['Plan']]
+            while stack:
+                node = stack.pop()
+                detail = node.get('Relation Name', '')
+                if node['Node Type'] in SORT_NODES:
+                    detail = ' '.join(child.get('Alias', '') for child in node.get('Plans', []))
+                nodes.append((node['Node Type'], detail))
+                stack.extend(node.get('Plans', []))
+            return nodes
+
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [('', row[-1]) for row in cursor.fetchall()]
+
+def plan_problems(nodes, checked_tables, allow_sort):
+    """Return the full scans of checked tables and, unless allowed, the sorts in a plan."""
+    problems = []
+    previous = ''
+    for node, detail in nodes:
+        if connection.vendor == 'postgresql':
+            if node == 'Seq Scan' and detail in checked_tables:
+                problems.append(f"Seq Scan on {detail}")
+            elif node in SORT_NODES and not allow_sort and detail != SLICED_PREFETCH_ALIAS:
+                problems.append(node)
+            continue
+
+        match = re.match(r'SCAN (\w+)', detail)
+        if match and match.group(1) in checked_tables:
+            problems.append(detail)
+        elif detail.startswith('USE TEMP B-TREE') and not allow_sort and previous != f"SCAN {SLICED_PREFETCH_ALIAS}":
+            problems.append(detail)
+        previous = detail
+    return problems
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class QueryPlanTests(TestCase):
+    """
+    Seed realistic volumes, run the hot read endpoints and EXPLAIN every query they issue.
+
+    A query fails the suite if its plan fully scans a large table, or sorts when the
+    endpoint is expected to read rows straight from an index in order. Endpoints that
+    order a user's whole list across many parents are allowed to sort.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(
+            prefix='plan', users=40, projects=150 * QUERY_PLAN_SCALE, boards=2, columns=4,
+            tasks=12000 * QUERY_PLAN_SCALE, subtasks=1.5, tags=10, comments=2, attachments=0
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        cls.user = User.objects.annotate(
+            project_count=models.Count('member_projects')
+        ).order_by('-project_count').first()
+        project = cls.user.member_projects.filter(is_archived=False).order_by('id').first()
+        cls.board = project.boards.order_by('id').first()
+        cls.column = cls.board.columns.order_by('position').first()
+        cls.task = Task.objects.filter(column__board=cls.board).order_by('id').first()
+        cls.tag = TaskTag.objects.filter(
+            task__column__board__project__members=cls.user
+        ).values_list('tag_id', flat=True).first()
+
+        cls.checked_tables = set()
+        for model in (Project, Project.members.through, Board, Column, Task, SubTask, TaskTag, Comment):
+            if model.objects.count() >= MIN_CHECKED_ROWS:
+                cls.checked_tables.add(model._meta.db_table)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertIndexedPlans(self, url, allow_sort=False, allow_scans=()):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        seen = set()
+        failures = []
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT') or fingerprint(sql) in seen:
+                continue
+            seen.add(fingerprint(sql))
+
+            nodes = explain(sql)
+            problems = plan_problems(nodes, self.checked_tables - set(allow_scans), allow_sort)
+            if problems:
+                failures.append("\n".join([
+                    sql, *(f"    {node} {detail}".rstrip() for node, detail in nodes),
+                    f"  -> {', '.join(problems)}"
+                ]))
+
+        self.assertFalse(failures, f"Unindexed query plans for {url}:\n\n" + "\n\n".join(failures))
+
+    def test_board_detail(self):
+        self.assertIndexedPlans(f"/api/boards/{self.board.pk}/")
+
+    def test_project_boards(self):
+        self.assertIndexedPlans(f"/api/boards/project_boards/?project_id={self.board.project_id}")
+
+    def test_board_columns(self):
+        self.assertIndexedPlans(f"/api/columns/board_columns/?board_id={self.board.pk}")
+
+    def test_column_tasks(self):
+        self.assertIndexedPlans(f"/api/tasks/column_tasks/?column_id={self.column.pk}")
+
+    def test_task_detail(self):
+        self.assertIndexedPlans(f"/api/tasks/{self.task.pk}/")
+
+    def test_task_comments(self):
+        self.assertIndexedPlans(f"/api/comments/task_comments/?task_id={self.task.pk}")
+
+    def test_task_subtasks(self):
+        self.assertIndexedPlans(f"/api/subtasks/task_subtasks/?task_id={self.task.pk}")
+
+    def test_my_tasks_buckets(self):
+        self.assertIndexedPlans("/api/tasks/my_tasks/?mode=buckets", allow_sort=True)
+        self.assertIndexedPlans("/api/tasks/my_tasks/?mode=buckets&bucket=today", allow_sort=True)
+
+    def test_projects(self):
+        # The busiest user's full project list prefetches the subtasks of most tasks,
+        # where one pass over the table beats an index probe per task.
+        self.assertIndexedPlans("/api/projects/", allow_scans=['core_subtask'])
+
+    def test_light_lists(self):
+        self.assertIndexedPlans("/api/projects/light/")
+        self.assertIndexedPlans("/api/boards/light/")
+        self.assertIndexedPlans("/api/columns/light/", allow_sort=True)
+        self.assertIndexedPlans("/api/tasks/light/", allow_sort=True)
+
+    def test_activity_feeds(self):
+        self.assertIndexedPlans(f"/api/projects/{self.board.project_id}/activity/")
+        self.assertIndexedPlans(f"/api/tasks/{self.task.pk}/activity/")
+    
+    def test_flow_analytics(self):
+        # Grouping the rollups before the window by column sorts one row per column and day.
+        self.assertIndexedPlans(f"/api/boards/{self.board.pk}/cumulative_flow/", allow_sort=True)
+        self.assertIndexedPlans(f"/api/boards/{self.board.pk}/flow_metrics/")
+    
+    def test_filter_by_tags(self):
+        self.assertIndexedPlans(f"/api/tasks/filter_by_tags/?tag_ids={self.tag}", allow_sort=True)
+
+# Most SQL queries each route may issue, however many rows sit behind it. Raise a
+# budget only together with the change that needs it. Column and task deletes cascade
+# synchronously and release one blob reference per attachment they remove, so they
+# are marked None and only checked for coverage; projects and boards are deleted in
+# the background (core.deletion).
+QUERY_BUDGETS = {
+    ('api-root', 'GET'): 0,
+    ('workspace-list', 'GET'): 1,
+    ('workspace-list', 'POST'): 2,
+    ('workspace-detail', 'GET'): 1,
+    ('project-list', 'GET'): 10,
+    ('project-list', 'POST'): 11,
+    ('project-create-from-template', 'POST'): 19,
+    ('project-light', 'GET'): 1,
+    ('project-detail', 'GET'): 9,
+    ('project-detail', 'PUT'): 11,
+    ('project-detail', 'PATCH'): 11,
+    ('project-detail', 'DELETE'): 5,
+    ('project-add-member', 'POST'): 4,
+    ('project-remove-member', 'POST'): 3,
+    ('project-archive', 'POST'): 2,
+    ('project-activity', 'GET'): 2,
+    ('project-unarchive', 'POST'): 2,
+    ('project-create-board-from-template', 'POST'): 17,
+    ('board-list', 'GET'): 7,
+    ('board-list', 'POST'): 3,
+    ('board-light', 'GET'): 1,
+    ('board-project-boards', 'GET'): 8,
+    ('board-detail', 'GET'): 8,
+    ('board-detail', 'PUT'): 10,
+    ('board-detail', 'PATCH'): 9,
+    ('board-detail', 'DELETE'): 5,
+    ('board-cumulative-flow', 'GET'): 4,
+    ('board-flow-metrics', 'GET'): 2,
+    ('column-list', 'GET'): 6,
+    ('column-list', 'POST'): 7,
+    ('column-light', 'GET'): 1,
+    ('column-board-columns', 'GET'): 7,
+    ('column-reorder', 'POST'): 6,
+    ('column-detail', 'GET'): 6,
+    ('column-detail', 'PUT'): 12,
+    ('column-detail', 'PATCH'): 8,
+    ('column-detail', 'DELETE'): None,
+    ('task-list', 'GET'): 5,
+    ('task-list', 'POST'): 10,
+    ('task-light', 'GET'): 1,
+    ('task-column-tasks', 'GET'): 6,
+    ('task-date-filter', 'GET'): 5,
+    ('task-filter-by-tags', 'GET'): 5,
+    ('task-my-tasks', 'GET'): 5,
+    ('task-reorder', 'POST'): 10,
+    ('task-detail', 'GET'): 5,
+    ('task-detail', 'PUT'): 8,
+    ('task-detail', 'PATCH'): 7,
+    ('task-detail', 'DELETE'): None,
+    ('task-assign', 'POST'): 4,
+    ('task-activity', 'GET'): 2,
+    ('subtask-list', 'GET'): 1,
+    ('subtask-list', 'POST'): 3,
+    ('subtask-task-subtasks', 'GET'): 2,
+    ('subtask-detail', 'GET'): 1,
+    ('subtask-detail', 'PUT'): 3,
+    ('subtask-detail', 'PATCH'): 2,
+    ('subtask-detail', 'DELETE'): 2,
+    ('tag-list', 'GET'): 1,
+    ('tag-list', 'POST'): 1,
+    ('tag-detail', 'GET'): 1,
+    ('tag-detail', 'PUT'): 2,
+    ('tag-detail', 'PATCH'): 2,
+    ('tag-detail', 'DELETE'): 3,
+    # Tagging locks the tags to keep their usage counters exact (core.tagging).
+    ('tag-add-to-task', 'POST'): 8,
+    ('tag-remove-from-task', 'POST'): 8,
+    ('tag-bulk-add', 'POST'): 8,
+    ('tag-bulk-remove', 'POST'): 8,
+    ('comment-list', 'GET'): 1,
+    ('comment-list', 'POST'): 3,
+    ('comment-task-comments', 'GET'): 2,
+    ('comment-detail', 'GET'): 1,
+    ('comment-detail', 'PUT'): 4,
+    ('comment-detail', 'PATCH'): 3,
+    ('comment-detail', 'DELETE'): 3,
+    ('attachment-list', 'GET'): 1,
+    ('attachment-list', 'POST'): 11,
+    ('attachment-task-attachments', 'GET'): 2,
+    ('attachment-detail', 'GET'): 1,
+    ('attachment-detail', 'PUT'): 15,
+    ('attachment-detail', 'PATCH'): 2,
+    ('attachment-detail', 'DELETE'): 6,
+    ('user-list', 'GET'): 1,
+    ('user-list', 'POST'): 1,
+    ('user-me', 'GET'): 0,
+    ('user-detail', 'GET'): 1,
+    ('user-detail', 'PUT'): 2,
+    ('user-detail', 'PATCH'): 2,
+    ('user-detail', 'DELETE'): 14,
+    ('register', 'POST'): 2,
+}
+
+def routes(*urlconfs):
+    """Return the (url name, HTTP method) pairs served by the given URL modules."""
+    found = set()
+    
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns)
+                continue
+            callback = pattern.callback
+            if getattr(callback, 'actions', None):
+                methods = callback.actions
+            elif hasattr(callback, 'view_class'):
+                methods = [method for method in callback.view_class.http_method_names if hasattr(callback.view_class, method)]
+            else:
+                methods = ['get']
+            # DRF adds HEAD to viewset actions once a GET was served; both are answered like GET.
+            found.update(
+                (pattern.name, method.upper()) for method in methods if method not in ('head', 'options')
+            )
+    
+    for urlconf in urlconfs:
+        walk(urlconf.urlpatterns)
+    return found
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    MEDIA_ROOT=tempfile.mkdtemp(prefix='tida-test-media-')
+)
+class QueryBudgetTests(TestCase):
+    """
+    Call every route of ``core/urls.py`` and ``accounts/urls.py`` against two data sizes.
+    
+    A route fails if it issues more queries on the bigger dataset (an N+1 somewhere
+    in its serializers or loops) or more than its entry in ``QUERY_BUDGETS``. Writes
+    are rolled back so every request sees the same data.
+    """
+    SIZES = (2, 4)
+    
+    def build(self, size):
+        """Create ``size`` projects, each with ``size`` boards, columns per board, tasks per column and so on."""
+        now = timezone.now()
+        owner = User.objects.create(username='owner', email='owner@example.com')
+        member = User.objects.create(username='member', email='member@example.com')
+        outsider = User.objects.create(username='outsider', email='outsider@example.com')
+        users = User.objects.bulk_create([
+            User(username=f"user-{index}", email=f"user-{index}@example.com") for index in range(size)
+        ])
+        workspace = Workspace.objects.create(name="Workspace", created_by=owner)
+        
+        projects = Project.objects.bulk_create([
+            Project(name=f"Project {index}", created_by=owner) for index in range(size)
+        ])
+        Project.members.through.objects.bulk_create([
+            Project.members.through(project=project, user=user)
+            for project in projects for user in [member, *users]
+        ])
+        boards = Board.objects.bulk_create([
+            Board(project=project, name=f"Board {index}")
+            for project in projects for index in range(size)
+        ])
+        columns = Column.objects.bulk_create([
+            Column(board=board, name=f"Column {index}", position=index)
+            for board in boards for index in range(size)
+        ])
+        # Cycle through the My Tasks buckets so every size fills each of them.
+        due_dates = cycle([None, now - timedelta(days=2), now, now + timedelta(days=3)])
+        tasks = Task.objects.bulk_create([
+            Task(
+                column=column, title=f"Task {index}", position=index, created_by=users[index % size],
+                assigned_to=owner, due_date=next(due_dates)
+            )
+            for column in columns for index in range(size)
+        ])
+        SubTask.objects.bulk_create([
+            SubTask(task=task, title=f"Subtask {index}") for task in tasks for index in range(size)
+        ])
+        tags = Tag.objects.bulk_create([Tag(user=owner, name=f"tag-{index}") for index in range(size + 1)])
+        TaskTag.objects.bulk_create([TaskTag(task=task, tag=tag) for task in tasks for tag in tags[:size]])
+        Comment.objects.bulk_create([
+            Comment(task=task, user=users[index % size], content=f"Comment {index}")
+            for task in tasks for index in range(size)
+        ])
+        blob = Blob.objects.create(digest='0' * 64, file='blobs/shared.txt', size=1, ref_count=len(tasks) * size)
+        Attachment.objects.bulk_create([
+            Attachment(task=task, blob=blob, file=blob.file.name, name=f"file-{index}.txt", uploaded_by=users[index % size])
+            for task in tasks for index in range(size)
+        ])
+        
+        task = tasks[0]
+        return SimpleNamespace(
+            owner=owner, member=member, outsider=outsider, workspace=workspace, project=projects[0], board=boards[0],
+            column=columns[0], columns=[column for column in columns if column.board_id == boards[0].pk],
+            task=task, column_tasks=[item for item in tasks if item.column_id == columns[0].pk],
+            subtask=task.subtasks.first(), tag=tags[0], spare_tag=tags[-1], comment=task.comments.first(),
+            attachment=task.attachments.first()
+        )
+    
+    def requests(self, data):
+        """Return one (url name, method, url, payload) request per route."""
+        def url(name, query=None, **kwargs):
+            return reverse(name, kwargs=kwargs) + (f"?{urlencode(query)}" if query else '')
+        
+        def upload():
+            return SimpleUploadedFile('notes.txt', b'budget test upload', content_type='text/plain')
+        
+        project, board, column, task = data.project, data.board, data.column, data.task
+        return [
+            ('api-root', 'GET', url('api-root'), None),
+            ('workspace-list', 'GET', url('workspace-list'), None),
+            ('workspace-list', 'POST', url('workspace-list'), {'name': "New workspace"}),
+            ('workspace-detail', 'GET', url('workspace-detail', pk=data.workspace.pk), None),
+            ('project-list', 'GET', url('project-list'), None),
+            ('project-list', 'POST', url('project-list'), {'name': "New project"}),
+            ('project-create-from-template', 'POST', url('project-create-from-template'), {
+                'template_type': 'software_development', 'name': "Templated"
+            }),
+            ('project-light', 'GET', url('project-light'), None),
+            ('project-detail', 'GET', url('project-detail', pk=project.pk), None),
+            ('project-detail', 'PUT', url('project-detail', pk=project.pk), {'name': "Renamed", 'description': ''}),
+            ('project-detail', 'PATCH', url('project-detail', pk=project.pk), {'name': "Renamed"}),
+            ('project-detail', 'DELETE', url('project-detail', pk=project.pk), None),
+            ('project-add-member', 'POST', url('project-add-member', pk=project.pk), {'user_id': data.outsider.pk}),
+            ('project-remove-member', 'POST', url('project-remove-member', pk=project.pk), {'user_id': data.member.pk}),
+            ('project-archive', 'POST', url('project-archive', pk=project.pk), None),
+            ('project-activity', 'GET', url('project-activity', pk=project.pk), None),
+            ('project-unarchive', 'POST', url('project-unarchive', pk=project.pk), None),
+            ('project-create-board-from-template', 'POST', url('project-create-board-from-template', pk=project.pk), {
+                'template_type': 'design', 'name': "Templated board"
+            }),
+            ('board-list', 'GET', url('board-list'), None),
+            ('board-list', 'POST', url('board-list'), {'project': project.pk, 'name': "New board"}),
+            ('board-light', 'GET', url('board-light'), None),
+            ('board-project-boards', 'GET', url('board-project-boards', {'project_id': project.pk}), None),
+            ('board-detail', 'GET', url('board-detail', pk=board.pk), None),
+            ('board-detail', 'PUT', url('board-detail', pk=board.pk), {'project': project.pk, 'name': "Renamed"}),
+            ('board-detail', 'PATCH', url('board-detail', pk=board.pk), {'name': "Renamed"}),
+            ('board-detail', 'DELETE', url('board-detail', pk=board.pk), None),
+            ('board-cumulative-flow', 'GET', url('board-cumulative-flow', pk=board.pk), None),
+            ('board-flow-metrics', 'GET', url('board-flow-metrics', pk=board.pk), None),
+            ('column-list', 'GET', url('column-list'), None),
+            ('column-list', 'POST', url('column-list'), {'board': board.pk, 'name': "New column", 'position': 0}),
+            ('column-light', 'GET', url('column-light'), None),
+            ('column-board-columns', 'GET', url('column-board-columns', {'board_id': board.pk}), None),
+            ('column-reorder', 'POST', url('column-reorder'), {
+                'board_id': board.pk, 'column_order': [item.pk for item in reversed(data.columns)]
+            }),
+            ('column-detail', 'GET', url('column-detail', pk=column.pk), None),
+            ('column-detail', 'PUT', url('column-detail', pk=column.pk), {
+                'board': board.pk, 'name': "Renamed", 'position': 0
+            }),
+            ('column-detail', 'PATCH', url('column-detail', pk=column.pk), {'name': "Renamed"}),
+            ('column-detail', 'DELETE', url('column-detail', pk=column.pk), None),
+            ('task-list', 'GET', url('task-list'), None),
+            ('task-list', 'POST', url('task-list'), {'column': column.pk, 'title': "New task", 'position': 0}),
+            ('task-light', 'GET', url('task-light'), None),
+            ('task-column-tasks', 'GET', url('task-column-tasks', {'column_id': column.pk}), None),
+            ('task-date-filter', 'GET', url('task-date-filter', {
+                'start_date': (timezone.now() - timedelta(days=30)).isoformat()
+            }), None),
+            ('task-filter-by-tags', 'GET', url('task-filter-by-tags', {'tag_ids': data.tag.pk}), None),
+            ('task-my-tasks', 'GET', url('task-my-tasks'), None),
+            ('task-my-tasks', 'GET', url('task-my-tasks', {'mode': 'buckets'}), None),
+            ('task-my-tasks', 'GET', url('task-my-tasks', {'mode': 'buckets', 'bucket': 'upcoming'}), None),
+            ('task-reorder', 'POST', url('task-reorder'), {
+                'source_column_id': column.pk, 'destination_column_id': data.columns[-1].pk,
+                'task_order': [item.pk for item in reversed(data.column_tasks)]
+            }),
+            ('task-detail', 'GET', url('task-detail', pk=task.pk), None),
+            ('task-detail', 'PUT', url('task-detail', pk=task.pk), {'column': column.pk, 'title': "Renamed", 'position': 0}),
+            ('task-detail', 'PATCH', url('task-detail', pk=task.pk), {'title': "Renamed"}),
+            ('task-detail', 'DELETE', url('task-detail', pk=task.pk), None),
+            ('task-assign', 'POST', url('task-assign', pk=task.pk), {'user_id': data.member.pk}),
+            ('task-activity', 'GET', url('task-activity', pk=task.pk), None),
+            ('subtask-list', 'GET', url('subtask-list'), None),
+            ('subtask-list', 'POST', url('subtask-list'), {'task': task.pk, 'title': "New subtask"}),
+            ('subtask-task-subtasks', 'GET', url('subtask-task-subtasks', {'task_id': task.pk}), None),
+            ('subtask-detail', 'GET', url('subtask-detail', pk=data.subtask.pk), None),
+            ('subtask-detail', 'PUT', url('subtask-detail', pk=data.subtask.pk), {'task': task.pk, 'title': "Renamed"}),
+            ('subtask-detail', 'PATCH', url('subtask-detail', pk=data.subtask.pk), {'is_completed': True}),
+            ('subtask-detail', 'DELETE', url('subtask-detail', pk=data.subtask.pk), None),
+            ('tag-list', 'GET', url('tag-list'), None),
+            ('tag-list', 'POST', url('tag-list'), {'name': "new-tag"}),
+            ('tag-detail', 'GET', url('tag-detail', pk=data.tag.pk), None),
+            ('tag-detail', 'PUT', url('tag-detail', pk=data.tag.pk), {'name': "renamed", 'color': '#000000'}),
+            ('tag-detail', 'PATCH', url('tag-detail', pk=data.tag.pk), {'name': "renamed"}),
+            ('tag-detail', 'DELETE', url('tag-detail', pk=data.tag.pk), None),
+            ('tag-add-to-task', 'POST', url('tag-add-to-task', pk=data.spare_tag.pk), {'task_id': task.pk}),
+            ('tag-remove-from-task', 'POST', url('tag-remove-from-task', pk=data.tag.pk), {'task_id': task.pk}),
+            ('tag-bulk-add', 'POST', url('tag-bulk-add'), {
+                'task_ids': [item.pk for item in data.column_tasks], 'tag_ids': [data.tag.pk, data.spare_tag.pk]
+            }),
+            ('tag-bulk-remove', 'POST', url('tag-bulk-remove'), {
+                'task_ids': [item.pk for item in data.column_tasks], 'tag_ids': [data.tag.pk, data.spare_tag.pk]
+            }),
+            ('comment-list', 'GET', url('comment-list'), None),
+            ('comment-list', 'POST', url('comment-list'), {'task': task.pk, 'content': "New comment"}),
+            ('comment-task-comments', 'GET', url('comment-task-comments', {'task_id': task.pk}), None),
+            ('comment-detail', 'GET', url('comment-detail', pk=data.comment.pk), None),
+            ('comment-detail', 'PUT', url('comment-detail', pk=data.comment.pk), {'task': task.pk, 'content': "Edited"}),
+            ('comment-detail', 'PATCH', url('comment-detail', pk=data.comment.pk), {'content': "Edited"}),
+            ('comment-detail', 'DELETE', url('comment-detail', pk=data.comment.pk), None),
+            ('attachment-list', 'GET', url('attachment-list'), None),
+            ('attachment-list', 'POST', url('attachment-list'), {'task': task.pk, 'name': "notes.txt", 'file': upload()}),
+            ('attachment-task-attachments', 'GET', url('attachment-task-attachments', {'task_id': task.pk}), None),
+            ('attachment-detail', 'GET', url('attachment-detail', pk=data.attachment.pk), None),
+            ('attachment-detail', 'PUT', url('attachment-detail', pk=data.attachment.pk), {
+                'task': task.pk, 'name': "notes.txt", 'file': upload()
+            }),
+            ('attachment-detail', 'PATCH', url('attachment-detail', pk=data.attachment.pk), {'name': "renamed.txt"}),
+            ('attachment-detail', 'DELETE', url('attachment-detail', pk=data.attachment.pk), None),
+            ('user-list', 'GET', url('user-list'), None),
+            ('user-list', 'POST', url('user-list'), {
+                'username': 'created', 'email': 'created@example.com', 'password': 'Budget-test-1'
+            }),
+            ('user-me', 'GET', url('user-me'), None),
+            ('user-detail', 'GET', url('user-detail', pk=data.owner.pk), None),
+            ('user-detail', 'PUT', url('user-detail', pk=data.owner.pk), {
+                'email': 'owner@example.com', 'first_name': "Owner", 'last_name': '', 'bio': ''
+            }),
+            ('user-detail', 'PATCH', url('user-detail', pk=data.owner.pk), {'bio': "Edited"}),
+            ('user-detail', 'DELETE', url('user-detail', pk=data.outsider.pk), None),
+            ('register', 'POST', url('register'), {
+                'username': 'registered', 'email': 'registered@example.com',
+                'password': 'Budget-test-1', 'password_confirm': 'Budget-test-1'
+            }),
+        ]
+    
+    def measure(self, size):
+        """Run every request against a dataset of ``size`` and return (request, status, SQL) per request."""
+        results = []
+        with transaction.atomic():
+            data = self.build(size)
+            client = APIClient()
+            client.force_authenticate(data.owner)
+            
+            for route, method, url, payload in self.requests(data):
+                multipart = payload is not None and any(hasattr(value, 'read') for value in payload.values())
+                cache.clear()
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as captured:
+                        response = getattr(client, method.lower())(
+                            url, payload, format='multipart' if multipart else 'json'
+                        )
+                    transaction.set_rollback(True)
+                results.append((
+                    route, method, url, response.status_code,
+                    [query['sql'] for query in captured.captured_queries]
+                ))
+            transaction.set_rollback(True)
+        return results
+    
+    def test_every_route_has_a_budget(self):
+        served = routes(core_urls, accounts_urls)
+        self.assertEqual(
+            sorted(served - set(QUERY_BUDGETS)), [], "Routes without an entry in QUERY_BUDGETS"
+        )
+        self.assertEqual(
+            sorted(set(QUERY_BUDGETS) - served), [], "QUERY_BUDGETS entries for routes that no longer exist"
+        )
+        requested = {(route, method) for route, method, url, payload in self.requests(self.build(1))}
+        self.assertEqual(sorted(set(QUERY_BUDGETS) - requested), [], "Budgeted routes the test never calls")
+    
+    def test_query_counts_stay_within_budget(self):
+        small, large = (self.measure(size) for size in self.SIZES)
+        
+        failures = []
+        for (route, method, url, status, queries), (*_, large_status, large_queries) in zip(small, large):
+            budget = QUERY_BUDGETS[(route, method)]
+            label = f"{method} {url} ({route})"
+            if status >= 400 or large_status >= 400:
+                failures.append(f"{label}: answered {status}/{large_status}, so its queries were not measured")
+                continue
+            if budget is None:
+                continue
+            
+            problems = []
+            if len(large_queries) > len(queries):
+                problems.append(f"{len(queries)} -> {len(large_queries)} queries as the data grew")
+            if len(large_queries) > budget:
+                problems.append(f"{len(large_queries)} queries, budget {budget}")
+            if problems:
+                grown = Counter(map(fingerprint, large_queries)) - Counter(map(fingerprint, queries))
+                failures.append("\n".join([
+                    f"{label}: {'; '.join(problems)}",
+                    *(f"    +{count} {sql}" for sql, count in grown.most_common())
+                ]))
+        
+        if failures:
+            self.fail("Query budget exceeded:\n\n" + "\n\n".join(failures))
+
+@override_settings(PROFILES_DIR=tempfile.mkdtemp(prefix='tida-test-profiles-'), PROFILE_SAMPLE_INTERVAL=0.0005)
+class ProfilingTests(TestCase):
+    """Requests carrying a staff profile token are profiled and listed in the admin."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create(username='staff', email='staff@example.com', is_staff=True)
+        cls.user = User.objects.create(username='regular', email='regular@example.com')
+        seed(prefix='profile', users=3, projects=2, tasks=40, attachments=0)
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+    
+    def test_profiles_request_with_staff_token(self):
+        response = self.client.get('/api/projects/', HTTP_X_PROFILE=make_token(self.staff))
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        
+        with open(os.path.join(settings.PROFILES_DIR, f"{profile_id}.json")) as source:
+            summary = json.load(source)
+        self.assertEqual(summary['route'], 'project-list')
+        self.assertEqual(summary['query_count'], len(summary['queries']))
+        self.assertGreater(summary['query_count'], 0)
+        self.assertTrue(os.path.exists(os.path.join(settings.PROFILES_DIR, f"{profile_id}.collapsed")))
+        
+        admin_client = Client()
+        admin_client.force_login(self.staff)
+        self.assertContains(admin_client.get(reverse('profiles')), profile_id)
+        download = admin_client.get(reverse('profile-download', args=[profile_id, 'json']))
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('attachment', download['Content-Disposition'])
+    
+    def test_ignores_invalid_and_non_staff_tokens(self):
+        for token in ('not-a-token', make_token(self.user)):
+            response = self.client.get(f"/api/projects/light/?_profile={token}")
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Profile-Id', response)
+    
+    def test_records_the_path_without_the_token(self):
+        response = self.client.get(f"/api/projects/light/?include_archived=1&_profile={make_token(self.staff)}")
+        with open(os.path.join(settings.PROFILES_DIR, f"{response['X-Profile-Id']}.json")) as source:
+            self.assertEqual(json.load(source)['path'], '/api/projects/light/?include_archived=1')
+    
+    def test_tokens_only_profile_their_own_user(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/projects/light/', HTTP_X_PROFILE=make_token(self.staff))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ClaimsAuthenticationTests(TestCase):
+    """Bearer tokens authenticate without reading the user row and are revoked on password or status changes."""
+    # Committed user saves are replicated to every shard.
+    databases = set(settings.DATABASE_SHARDS)
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='claims', email='claims@example.com', password='old-password')
+    
+    def setUp(self):
+        cache.clear()
+        forget_user(self.user.pk)
+        self.client = APIClient()
+        self.tokens = self.obtain('old-password')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+    
+    def obtain(self, password):
+        response = APIClient().post(
+            '/api/auth/token/', {'username': 'claims', 'password': password}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+    
+    def test_authenticates_without_user_queries(self):
+        self.assertEqual(self.client.get('/api/tasks/my_tasks/').status_code, 200)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tasks/my_tasks/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([query['sql'] for query in queries if 'FROM "accounts_user"' in query['sql']], [])
+    
+    def test_loads_unclaimed_fields_on_use(self):
+        response = self.client.get('/api/accounts/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], 'claims@example.com')
+    
+    def test_password_change_revokes_tokens(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('new-password')
+            self.user.save()
+        
+        self.assertEqual(self.client.get('/api/tasks/my_tasks/').status_code, 401)
+        refresh = APIClient().post('/api/auth/token/refresh/', {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(refresh.status_code, 401)
+        
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.obtain('new-password')['access']}")
+        self.assertEqual(self.client.get('/api/tasks/my_tasks/').status_code, 200)
+    
+    def test_deactivation_revokes_tokens(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        
+        self.assertEqual(self.client.get('/api/tasks/my_tasks/').status_code, 401)
+    
+    def test_profile_edits_keep_tokens(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/accounts/users/{self.user.pk}/", {'bio': 'Hello'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        
+        self.assertEqual(self.client.get('/api/tasks/my_tasks/').status_code, 200)
+
+class UserCreationTests(TestCase):
+    """Creating a user through the users endpoint stores the password it is sent hashed."""
+    
+    def create(self, **data):
+        response = APIClient().post(reverse('user-list'), {'email': 'new@example.com', **data}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return User.objects.get(pk=response.data['id'])
+    
+    def test_hashes_the_password(self):
+        user = self.create(password='Sent-in-clear-1')
+        self.assertNotEqual(user.password, 'Sent-in-clear-1')
+        self.assertTrue(user.check_password('Sent-in-clear-1'))
+    
+    def test_without_a_password_the_account_cannot_log_in(self):
+        self.assertFalse(self.create().has_usable_password())
+
+class ArchivedProjectTests(TestCase):
+    """Archived projects drop out of every list unless ``?include_archived=1`` is passed."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='archivist', email='archivist@example.com')
+        cls.tasks = {}
+        for name, archived in (('live', False), ('archived', True)):
+            project = Project.objects.create(name=name, created_by=cls.owner, is_archived=archived)
+            board = Board.objects.create(project=project, name=name)
+            column = Column.objects.create(board=board, name=name, position=0)
+            cls.tasks[name] = Task.objects.create(
+                column=column, title=name, position=0, created_by=cls.owner, assigned_to=cls.owner
+            )
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        rows = response.data['results'] if isinstance(response.data, dict) else response.data
+        return sorted(row.get('name') or row.get('title') for row in rows)
+    
+    def test_lists_skip_archived_projects(self):
+        for url in (
+            '/api/projects/', '/api/projects/light/', '/api/boards/light/', '/api/columns/light/',
+            '/api/tasks/', '/api/tasks/light/', '/api/tasks/my_tasks/', '/api/tasks/?search=archived'
+        ):
+            self.assertNotIn('archived', self.names(url), url)
+            separator = '&' if '?' in url else '?'
+            self.assertIn('archived', self.names(f"{url}{separator}include_archived=1"), url)
+    
+    def test_archived_detail_needs_opt_in(self):
+        task = self.tasks['archived']
+        self.assertEqual(self.client.get(f"/api/tasks/{task.pk}/").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/tasks/{task.pk}/?include_archived=1").status_code, 200)
+    
+    def test_unarchive_reaches_archived_project(self):
+        project = self.tasks['archived'].column.board.project
+        response = self.client.post(f"/api/projects/{project.pk}/unarchive/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('archived', self.names('/api/tasks/light/'))
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    MEDIA_ROOT=tempfile.mkdtemp(prefix='tida-test-media-')
+)
+class BackgroundDeletionTests(TestCase):
+    """Deleting a project or board hides it at once and a job removes its contents in batches."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='deleter', email='deleter@example.com')
+        cls.project = Project.objects.create(name='Doomed', created_by=cls.owner)
+        cls.boards = Board.objects.bulk_create([Board(project=cls.project, name=f"Board {index}") for index in range(2)])
+        columns = Column.objects.bulk_create([Column(board=board, name='Column', position=0) for board in cls.boards])
+        tasks = Task.objects.bulk_create([
+            Task(column=column, title=f"Task {index}", position=index, created_by=cls.owner, assigned_to=cls.owner)
+            for column in columns for index in range(5)
+        ])
+        SubTask.objects.bulk_create([SubTask(task=task, title='Subtask') for task in tasks])
+        Comment.objects.bulk_create([Comment(task=task, user=cls.owner, content='Comment') for task in tasks])
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def run_jobs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            while (job := claim()) is not None:
+                self.assertEqual(execute(job).status, Job.DONE, job.last_error)
+    
+    def test_board_delete_is_hidden_then_purged(self):
+        board = self.boards[0]
+        attachment = Attachment(
+            task=Task.objects.filter(column__board=board).first(), name='notes.txt', uploaded_by=self.owner,
+            file=SimpleUploadedFile('notes.txt', b'only here')
+        )
+        attachment.save()
+        path = attachment.blob.file.path
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f"/api/boards/{board.pk}/").status_code, 204)
+        self.assertTrue(Board.objects.filter(pk=board.pk).exists())
+        self.assertEqual(self.client.get(f"/api/boards/{board.pk}/").status_code, 404)
+        self.assertEqual([row['id'] for row in self.client.get('/api/boards/light/').data], [self.boards[1].pk])
+        self.assertEqual(len(self.client.get('/api/tasks/my_tasks/').data), 5)
+        
+        with patch('core.deletion.BATCH_SIZE', 2):
+            self.run_jobs()
+        self.assertFalse(Board.objects.filter(pk=board.pk).exists())
+        self.assertFalse(Task.objects.filter(column__board=board).exists())
+        self.assertEqual(SubTask.objects.count(), 5)
+        self.assertFalse(os.path.exists(path))
+    
+    def test_project_delete_is_hidden_then_purged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f"/api/projects/{self.project.pk}/").status_code, 204)
+        self.assertEqual(self.client.get('/api/projects/').data, [])
+        self.assertEqual(self.client.get('/api/tasks/light/').data, [])
+        
+        self.run_jobs()
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+        self.assertEqual((Board.objects.count(), Task.objects.count(), Comment.objects.count()), (0, 0, 0))
+    
+    def test_batches_invalidate_the_cache_once(self):
+        with patch('core.cache.cache.set_many') as set_many, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(delete_task_batch(Task.objects.filter(column__board=self.boards[0])), 5)
+        set_many.assert_called_once()
+        self.assertEqual(list(set_many.call_args.args[0]), [generation_key('task')])
+
+class TagUsageTests(TestCase):
+    """Bulk tagging checks access per project and keeps every tag's usage counter exact."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='tagger', email='tagger@example.com')
+        cls.stranger = User.objects.create(username='stranger', email='stranger@example.com')
+        project = Project.objects.create(name='tagging', created_by=cls.owner)
+        board = Board.objects.create(project=project, name='tagging')
+        cls.column = Column.objects.create(board=board, name='tagging', position=0)
+        cls.tasks = Task.objects.bulk_create([
+            Task(column=cls.column, title=f"Task {index}", position=index, created_by=cls.owner) for index in range(4)
+        ])
+        cls.hot, cls.cold = Tag.objects.bulk_create([Tag(user=cls.owner, name='hot'), Tag(user=cls.owner, name='cold')])
+        foreign = Project.objects.create(name='foreign', created_by=cls.stranger)
+        cls.foreign_task = Task.objects.create(
+            column=Column.objects.create(board=Board.objects.create(project=foreign, name='foreign'), name='x', position=0),
+            title='Foreign', position=0, created_by=cls.stranger
+        )
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def bulk(self, verb, tasks, tags):
+        return self.client.post(f'/api/tags/bulk_{verb}/', {
+            'task_ids': [task.pk for task in tasks], 'tag_ids': [tag.pk for tag in tags]
+        }, format='json')
+    
+    def usage(self):
+        return {tag['name']: tag['usage_count'] for tag in self.client.get('/api/tags/').data}
+    
+    def test_bulk_tagging_maintains_usage(self):
+        self.assertEqual(self.bulk('add', self.tasks, [self.hot]).data, {'added': 4})
+        self.assertEqual(self.bulk('add', self.tasks[:2], [self.hot, self.cold]).data, {'added': 2})
+        self.assertEqual(list(self.usage().items()), [('hot', 4), ('cold', 2)])
+        
+        self.assertEqual(self.bulk('remove', self.tasks[:3], [self.hot]).data, {'removed': 3})
+        self.client.delete(f'/api/tasks/{self.tasks[0].pk}/')
+        self.client.delete(f'/api/columns/{self.column.pk}/')
+        self.assertEqual(self.usage(), {'hot': 0, 'cold': 0})
+        self.assertFalse(TaskTag.objects.exists())
+    
+    def test_bulk_tagging_needs_access_to_every_task(self):
+        response = self.bulk('add', [*self.tasks, self.foreign_task], [self.hot])
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(TaskTag.objects.exists())
+        self.assertEqual(self.bulk('add', self.tasks, []).status_code, 400)
+
+class ConcurrencyTests(TestCase):
+    """Writes based on a stale version of a task or column get a 409 instead of overwriting newer data."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='racer', email='racer@example.com')
+        project = Project.objects.create(name='race', created_by=cls.owner)
+        board = Board.objects.create(project=project, name='race')
+        cls.todo = Column.objects.create(board=board, name='To Do', position=0)
+        cls.done = Column.objects.create(board=board, name='Done', position=1)
+        cls.task = Task.objects.create(column=cls.todo, title='Contended', position=0, created_by=cls.owner)
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def test_if_match_guards_updates(self):
+        url = f'/api/tasks/{self.task.pk}/'
+        self.assertEqual(self.client.get(url)['ETag'], '"1"')
+        
+        response = self.client.patch(url, {'title': 'Mine'}, HTTP_IF_MATCH='"1"')
+        self.assertEqual((response.status_code, response['ETag']), (200, '"2"'))
+        response = self.client.patch(url, {'title': 'Theirs'}, HTTP_IF_MATCH='"1"')
+        self.assertEqual((response.status_code, response.data['version']), (409, 2))
+        response = self.client.post(f'{url}assign/', {'user_id': self.owner.pk}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Task.objects.get(pk=self.task.pk).title, 'Mine')
+    
+    def test_saving_a_stale_instance_conflicts(self):
+        stale = Task.objects.get(pk=self.task.pk)
+        self.client.post(f'/api/tasks/{self.task.pk}/assign/', {'user_id': self.owner.pk})
+        stale.title = 'Overwrite'
+        with self.assertRaises(VersionConflict), transaction.atomic():
+            stale.save()
+        self.assertEqual(Task.objects.get(pk=self.task.pk).assigned_to_id, self.owner.pk)
+    
+    def test_moves_check_versions(self):
+        def move(**versions):
+            return self.client.post('/api/tasks/reorder/', {
+                'source_column_id': self.todo.pk, 'destination_column_id': self.done.pk,
+                'task_order': [self.task.pk], 'versions': versions
+            }, format='json')
+        
+        self.assertEqual(move(**{str(self.task.pk): 0}).status_code, 409)
+        
+        # Another write lands between reading the tasks and updating them.
+        def interleave(request, objs):
+            Task.objects.filter(pk=self.task.pk).update(version=models.F('version') + 1)
+        with patch('core.views.check_versions', interleave):
+            self.assertEqual(move().status_code, 409)
+        self.assertEqual(Task.objects.get(pk=self.task.pk).column_id, self.todo.pk)
+        
+        response = move(**{str(self.task.pk): 2})
+        self.assertEqual((response.status_code, response.data['versions']), (200, {self.task.pk: 3}))
+    
+    def test_repeated_ids_are_written_once(self):
+        response = self.client.post('/api/tasks/reorder/', {
+            'source_column_id': self.todo.pk, 'destination_column_id': self.todo.pk,
+            'task_order': [self.task.pk, self.task.pk]
+        }, format='json')
+        self.assertEqual((response.status_code, response.data['versions']), (200, {self.task.pk: 2}))
+        self.assertEqual(Task.objects.get(pk=self.task.pk).version, 2)
+    
+    def test_bulk_reorders_write_nothing_on_conflict(self):
+        other = Task.objects.create(column=self.todo, title='Bystander', position=1, created_by=self.owner)
+        
+        # One of the rows changes between reading and updating them.
+        def interleave(request, objs):
+            type(objs[-1]).objects.filter(pk=objs[-1].pk).update(version=models.F('version') + 1)
+        with patch('core.views.check_versions', interleave):
+            response = self.client.post('/api/tasks/reorder/', {
+                'source_column_id': self.todo.pk, 'destination_column_id': self.done.pk,
+                'task_order': [self.task.pk, other.pk]
+            }, format='json')
+            self.assertEqual(response.status_code, 409)
+            response = self.client.post('/api/columns/reorder/', {
+                'board_id': self.todo.board_id, 'column_order': [self.done.pk, self.todo.pk]
+            }, format='json')
+            self.assertEqual(response.status_code, 409)
+        
+        self.assertEqual(
+            list(Task.objects.filter(pk__in=[self.task.pk, other.pk]).order_by('pk').values_list('column_id', 'position')),
+            [(self.todo.pk, 0), (self.todo.pk, 1)]
+        )
+        self.assertEqual(list(Column.objects.order_by('pk').values_list('position', flat=True)), [0, 1])
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    THROTTLE_BUCKETS={'user': (30, 0.01), 'expensive': (10, 0.01)},
+    CONCURRENCY_SLOT_DIR=tempfile.mkdtemp(prefix='tida-test-slots-'),
+    MAX_CONCURRENT_REQUESTS=1
+)
+class ThrottlingTests(TestCase):
+    """Expensive requests drain a user's token buckets faster, and a saturated backend sheds requests with a 503."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='throttled', email='throttled@example.com', password='password')
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        response = self.client.post('/api/auth/token/', {'username': 'throttled', 'password': 'password'}, format='json')
+        self.token = response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+    
+    def test_expensive_requests_are_throttled_first(self):
+        # Task lists cost 5 tokens of the 10 in the expensive bucket.
+        self.assertEqual([self.client.get('/api/tasks/').status_code for _ in range(2)], [200, 200])
+        response = self.client.get('/api/tasks/')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self.client.get('/api/tasks/my_tasks/').status_code, 429)
+        # Cheap requests still have the user bucket to draw on.
+        self.assertEqual(self.client.get('/api/tags/').status_code, 200)
+    
+    async def test_async_routes_charge_the_same_buckets(self):
+        headers = {'Authorization': f"Bearer {self.token}"}
+        with self.settings(ASYNC_READ_VIEWS=True, ROOT_URLCONF=ASYNC_URLCONF):
+            # Drained by the DRF task list, then refused by the async view.
+            for _ in range(2):
+                self.assertEqual((await self.async_client.get('/api/tasks/', headers=headers)).status_code, 200)
+            response = await self.async_client.get('/api/tasks/my_tasks/', headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+    
+    def test_sheds_load_when_all_slots_are_taken(self):
+        with concurrency_slot() as acquired:
+            self.assertTrue(acquired)
+            response = self.client.get('/api/tags/')
+        self.assertEqual((response.status_code, response['Retry-After']), (503, str(settings.LOAD_SHEDDING_RETRY_AFTER)))
+        self.assertEqual(self.client.get('/api/tags/').status_code, 200)
+    
+    def test_sheds_requests_that_queued_too_long(self):
+        started = time.time() - settings.MAX_QUEUE_WAIT_MS / 1000 - 1
+        response = self.client.get('/api/tags/', HTTP_X_REQUEST_START=f"t={started:.3f}")
+        self.assertEqual(response.status_code, 503)
+        response = self.client.get('/api/tags/', HTTP_X_REQUEST_START=f"t={time.time():.3f}")
+        self.assertEqual(response.status_code, 200)
+
+class CommentThreadTests(TestCase):
+    """Tasks carry a comment count and the latest comments; full threads are cursor-paginated."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='commenter', email='commenter@example.com')
+        project = Project.objects.create(name='thread', created_by=cls.owner)
+        board = Board.objects.create(project=project, name='thread')
+        column = Column.objects.create(board=board, name='thread', position=0)
+        cls.task = Task.objects.create(column=column, title='thread', position=0, created_by=cls.owner)
+        cls.comments = [
+            Comment.objects.create(task=cls.task, user=cls.owner, content=f"comment {number}")
+            for number in range(7)
+        ]
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def test_task_embeds_count_and_latest_comments(self):
+        newest = [comment.pk for comment in reversed(self.comments)][:LATEST_COMMENTS]
+        for url in (f"/api/tasks/{self.task.pk}/", f"/api/boards/{self.task.column.board_id}/"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            task = response.data if 'comment_count' in response.data else response.data['columns'][0]['tasks'][0]
+            self.assertEqual(task['comment_count'], len(self.comments), url)
+            self.assertEqual([comment['id'] for comment in task['latest_comments']], newest, url)
+            self.assertNotIn('comments', task, url)
+    
+    def test_task_comments_pages_newest_first(self):
+        url = f"/api/comments/task_comments/?task_id={self.task.pk}&page_size=3"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend(comment['id'] for comment in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [comment.pk for comment in reversed(self.comments)])
+
+class ActivityLogTests(TestCase):
+    """Writes are logged once they commit and served newest first per project and task."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='historian', email='historian@example.com')
+        cls.member = User.objects.create(username='helper', email='helper@example.com')
+        cls.outsider = User.objects.create(username='stranger', email='stranger@example.com')
+        cls.project = Project.objects.create(name='history', created_by=cls.owner)
+        cls.project.members.add(cls.member)
+        board = Board.objects.create(project=cls.project, name='history')
+        cls.todo = Column.objects.create(board=board, name='To Do', position=0)
+        cls.done = Column.objects.create(board=board, name='Done', position=1)
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def feed(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response.data['results']
+    
+    def test_writes_are_logged_newest_first(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task_id = self.client.post('/api/tasks/', {'column': self.todo.pk, 'title': "Write", 'position': 0}).data['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/tasks/reorder/', {
+                'source_column_id': self.todo.pk, 'destination_column_id': self.done.pk, 'task_order': [task_id]
+            }, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/tasks/{task_id}/assign/', {'user_id': self.member.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/projects/{self.project.pk}/add_member/', {'user_id': self.outsider.pk})
+        
+        entries = self.feed(f'/api/projects/{self.project.pk}/activity/')
+        self.assertEqual(
+            [entry['verb'] for entry in entries],
+            ['project.member_added', 'task.assigned', 'task.moved', 'task.created']
+        )
+        self.assertEqual(entries[2]['data'], {'name': "Write", 'from_column': 'To Do', 'to_column': 'Done'})
+        self.assertEqual(entries[1]['actor']['username'], 'historian')
+        self.assertEqual(
+            [entry['verb'] for entry in self.feed(f'/api/tasks/{task_id}/activity/')],
+            ['task.assigned', 'task.moved', 'task.created']
+        )
+    
+    def test_rolled_back_writes_are_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                record(self.owner, 'project.archived', self.project, self.project)
+                transaction.set_rollback(True)
+        self.assertFalse(Activity.objects.exists())
+    
+    def test_request_entries_are_written_in_one_insert(self):
+        with self.assertNumQueries(1):
+            with collect_activity() as buffer:
+                with self.captureOnCommitCallbacks(execute=True):
+                    for column in (self.todo, self.done, self.todo):
+                        record(self.owner, 'column.updated', column, self.project)
+                self.assertEqual(len(buffer), 3)
+        self.assertEqual(Activity.objects.filter(project=self.project).count(), 3)
+    
+    def test_feed_needs_membership(self):
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.pk}/activity/').status_code, 404)
+
+class FlowAnalyticsTests(TestCase):
+    """Column moves feed daily rollups, and the board analytics read nothing else."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='flowkeeper', email='flowkeeper@example.com')
+        cls.project = Project.objects.create(name='flow', created_by=cls.owner)
+        cls.board = Board.objects.create(project=cls.project, name='flow')
+        cls.todo = Column.objects.create(board=cls.board, name='To Do', position=0)
+        cls.doing = Column.objects.create(board=cls.board, name='Doing', position=1)
+        cls.done = Column.objects.create(board=cls.board, name='Done', position=2)
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def create(self, title):
+        response = self.client.post('/api/tasks/', {'column': self.todo.pk, 'title': title, 'position': 0})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+    
+    def move(self, source, destination, *task_ids):
+        response = self.client.post('/api/tasks/reorder/', {
+            'source_column_id': source.pk, 'destination_column_id': destination.pk, 'task_order': list(task_ids)
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+    
+    def analytics(self, name):
+        response = self.client.get(f'/api/boards/{self.board.pk}/{name}/', {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+    
+    def today_counts(self):
+        return {column['name']: column['counts'][-1] for column in self.analytics('cumulative_flow')['columns']}
+    
+    def test_moves_feed_cumulative_flow(self):
+        first, second, third = self.create("One"), self.create("Two"), self.create("Three")
+        self.move(self.todo, self.doing, first, second)
+        self.client.patch(f'/api/tasks/{first}/', {'column': self.done.pk})
+        self.client.delete(f'/api/tasks/{third}/')
+        
+        self.assertEqual(self.today_counts(), {'To Do': 0, 'Doing': 1, 'Done': 1})
+        self.assertEqual(
+            list(TaskTransition.objects.filter(task_id=first).order_by('id').values_list('to_column__name', flat=True)),
+            ['Doing', 'Done']
+        )
+        self.assertIsNotNone(Task.objects.get(pk=second).started_at)
+        # Reordering within a column is not a transition.
+        self.move(self.doing, self.doing, second)
+        self.assertEqual(TaskTransition.objects.count(), 3)
+    
+    def test_completions_feed_throughput_and_times(self):
+        task_id = self.create("Ship")
+        Task.objects.filter(pk=task_id).update(created_at=timezone.now() - timedelta(hours=10))
+        self.move(self.todo, self.doing, task_id)
+        Task.objects.filter(pk=task_id).update(started_at=timezone.now() - timedelta(hours=4))
+        self.move(self.doing, self.done, task_id)
+        
+        metrics = self.analytics('flow_metrics')
+        self.assertEqual(metrics['throughput'], [0] * 6 + [1])
+        self.assertEqual(metrics['completed'], 1)
+        self.assertAlmostEqual(metrics['average_lead_time_hours'], 10, delta=0.1)
+        self.assertAlmostEqual(metrics['average_cycle_time_hours'], 4, delta=0.1)
+    
+    def test_analytics_read_only_rollups(self):
+        for index in range(5):
+            self.move(self.todo, self.doing, self.create(f"Task {index}"))
+        with CaptureQueriesContext(connection) as captured:
+            self.analytics('cumulative_flow')
+            self.analytics('flow_metrics')
+        tables = {table for query in captured.captured_queries for table in re.findall(r'FROM "(\w+)"', query['sql'])}
+        self.assertFalse(tables & {Task._meta.db_table, TaskTransition._meta.db_table})
+    
+    def test_rebuild_matches_incremental_rollups(self):
+        first = self.create("One")
+        self.create("Two")
+        self.move(self.todo, self.doing, first)
+        self.move(self.doing, self.done, first)
+        incremental = (self.today_counts(), self.analytics('flow_metrics')['throughput'])
+        self.assertEqual(incremental[0], {'To Do': 1, 'Doing': 0, 'Done': 1})
+        
+        ColumnDailyFlow.objects.all().delete()
+        BoardDailyFlow.objects.all().delete()
+        rebuild(self.board)
+        self.assertEqual((self.today_counts(), self.analytics('flow_metrics')['throughput']), incremental)
+
+class AdminTests(TestCase):
+    """Admin pages of the big tables cost the same however many rows sit behind them."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(
+            username='superintendent', email='superintendent@example.com', is_staff=True, is_superuser=True
+        )
+        project = Project.objects.create(name='admin', created_by=cls.admin)
+        board = Board.objects.create(project=project, name='admin')
+        cls.column = Column.objects.create(board=board, name='Backlog', position=0)
+        cls.task = Task.objects.create(column=cls.column, title='Busy', created_by=cls.admin, position=0)
+    
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+    
+    def add_rows(self, count):
+        Task.objects.bulk_create([
+            Task(column=self.column, title=f"Task {index}", created_by=self.admin, assigned_to=self.admin, position=index)
+            for index in range(count)
+        ])
+        Comment.objects.bulk_create([
+            Comment(task=task, user=self.admin, content="Noted")
+            for task in Task.objects.all() for _ in range(count)
+        ])
+    
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(captured.captured_queries)
+    
+    def test_query_counts_do_not_grow_with_rows(self):
+        urls = [
+            reverse('admin:core_task_changelist'),
+            reverse('admin:core_comment_changelist'),
+            reverse('admin:core_column_change', args=[self.column.pk]),
+            reverse('admin:core_task_change', args=[self.task.pk]),
+        ]
+        self.add_rows(3)
+        # The first visits also fill process-wide caches, such as content types.
+        for url in urls:
+            self.queries(url)
+        few = [self.queries(url) for url in urls]
+        self.add_rows(25)
+        self.assertEqual([self.queries(url) for url in urls], few)
+    
+    def test_inlines_show_newest_rows(self):
+        self.add_rows(25)
+        response = self.client.get(reverse('admin:core_task_change', args=[self.task.pk]))
+        self.assertEqual(response.context['inline_admin_formsets'][1].formset.get_queryset().count(), 20)
+        self.assertContains(response, f"{reverse('admin:core_comment_changelist')}?task__id__exact={self.task.pk}")
+
+@skipUnless(len(settings.DATABASE_SHARDS) > 1, "needs a second shard in DATABASE_SHARDS")
+class ShardingTests(TestCase):
+    """Workspaces keep their projects on their own shard and can be moved to another one."""
+    databases = set(settings.DATABASE_SHARDS)
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.shard = settings.DATABASE_SHARDS[1]
+        cls.owner = User.objects.create(username='shardowner', email='shardowner@example.com')
+        # Replicated once the save commits, which never happens inside a test.
+        copy_users(User.objects.filter(pk=cls.owner.pk), [cls.shard])
+        cls.workspace = Workspace.objects.create(name='Sharded', shard=cls.shard, created_by=cls.owner)
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.client.credentials(HTTP_X_WORKSPACE=str(self.workspace.pk))
+    
+    def create_task(self):
+        project = self.client.post('/api/projects/', {'name': 'Sharded'}).data
+        column = Column.objects.using(self.shard).filter(board__project_id=project['id']).first()
+        response = self.client.post('/api/tasks/', {'column': column.pk, 'title': 'Far away', 'position': 0})
+        self.assertEqual(response.status_code, 201)
+        return Task.objects.using(self.shard).get(pk=response.data['id'])
+    
+    def test_workspace_rows_live_on_its_shard(self):
+        task = self.create_task()
+        self.assertGreaterEqual(task.pk, settings.SHARD_ID_SPACING)
+        self.assertFalse(Task.objects.using('default').filter(pk=task.pk).exists())
+        self.assertEqual(self.client.get(f'/api/tasks/{task.pk}/').status_code, 200)
+        
+        self.client.credentials()
+        self.assertEqual(self.client.get(f'/api/tasks/{task.pk}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/projects/').data, [])
+    
+    def test_objects_on_different_shards_cannot_be_related(self):
+        task = self.create_task()
+        column = Column.objects.using('default').create(
+            board=Board.objects.using('default').create(
+                project=Project.objects.using('default').create(name='Local', created_by=self.owner), name='Local'
+            ),
+            name='Local', position=0
+        )
+        with self.assertRaises(ValueError):
+            task.column = column
+    
+    def test_writes_are_refused_while_moving(self):
+        Workspace.objects.filter(pk=self.workspace.pk).update(is_moving=True)
+        forget_workspace(self.workspace.pk)
+        response = self.client.post('/api/projects/', {'name': 'Blocked'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(self.client.get('/api/projects/').status_code, 200)
+    
+    def test_move_workspace(self):
+        task = self.create_task()
+        self.client.post('/api/comments/', {'task': task.pk, 'content': 'Still here'})
+        
+        call_command('move_workspace', self.workspace.pk, 'default', grace=0, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Workspace.objects.get(pk=self.workspace.pk).shard, 'default')
+        self.assertFalse(Task.objects.using(self.shard).filter(pk=task.pk).exists())
+        self.assertEqual(Comment.objects.using('default').filter(task_id=task.pk).count(), 1)
+        response = self.client.get(f'/api/tasks/{task.pk}/')
+        self.assertEqual((response.status_code, response.data['title']), (200, 'Far away'))
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='tida-test-media-'))
+class BlobStorageTests(TestCase):
+    """Attachments with the same content share one blob, whose file goes with its last reference."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='uploader', email='uploader@example.com')
+        project = Project.objects.create(name='blobs', created_by=cls.owner)
+        column = Column.objects.create(board=Board.objects.create(project=project, name='blobs'), name='blobs', position=0)
+        cls.task = Task.objects.create(column=column, title='Files', position=0, created_by=cls.owner)
+    
+    def attach(self, name, content):
+        attachment = Attachment(
+            task=self.task, name=name, uploaded_by=self.owner, file=SimpleUploadedFile(name, content)
+        )
+        attachment.save()
+        return attachment
+    
+    def test_same_content_shares_one_blob(self):
+        first = self.attach('report.txt', b'quarterly numbers')
+        second = self.attach('copy.txt', b'quarterly numbers')
+        other = self.attach('other.txt', b'something else')
+        
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertNotEqual(first.blob_id, other.blob_id)
+        self.assertEqual(Blob.objects.get(pk=first.blob_id).ref_count, 2)
+        self.assertEqual(Blob.objects.count(), 2)
+    
+    def test_last_reference_deletes_the_file(self):
+        first = self.attach('report.txt', b'quarterly numbers')
+        second = self.attach('copy.txt', b'quarterly numbers')
+        path = first.blob.file.path
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(Blob.objects.get(pk=second.blob_id).ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+    
+    def test_replacing_the_file_releases_the_old_blob(self):
+        attachment = self.attach('draft.txt', b'first draft')
+        path = attachment.blob.file.path
+        
+        attachment.file = SimpleUploadedFile('draft.txt', b'second draft')
+        with self.captureOnCommitCallbacks(execute=True):
+            attachment.save()
+        self.assertEqual(list(Blob.objects.values_list('ref_count', flat=True)), [1])
+        self.assertFalse(os.path.exists(path))
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='tida-test-media-'))
+class AvatarVariantTests(TestCase):
+    """Avatars are resized in the background, and the sizes of a replaced avatar are deleted with it."""
+    # Saving a user copies it to the other shards on commit.
+    databases = set(settings.DATABASE_SHARDS)
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='portrait', email='portrait@example.com')
+    
+    def image(self, name, color):
+        buffer = BytesIO()
+        Image.new('RGB', (64, 64), color).save(buffer, format='PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+    
+    def upload(self, avatar):
+        user = User.objects.get(pk=self.user.pk)
+        user.avatar = avatar
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        while (job := claim()) is not None:
+            self.assertEqual(execute(job).status, Job.DONE, job.last_error)
+        return User.objects.get(pk=self.user.pk)
+    
+    def paths(self, user):
+        return [os.path.join(settings.MEDIA_ROOT, path) for name, path in user.avatar_variants.items() if name != 'source']
+    
+    def test_replaced_and_cleared_avatars_lose_their_variants(self):
+        first = self.upload(self.image('red.png', 'red'))
+        old = self.paths(first)
+        self.assertEqual(len(old), 3)
+        self.assertTrue(all(map(os.path.exists, old)))
+        
+        second = self.upload(self.image('blue.png', 'blue'))
+        self.assertEqual(second.avatar_variants['source'], second.avatar.name)
+        self.assertFalse(any(map(os.path.exists, old)))
+        current = self.paths(second)
+        self.assertTrue(all(map(os.path.exists, current)))
+        
+        cleared = self.upload(None)
+        self.assertEqual(cleared.avatar_variants, {})
+        self.assertFalse(any(map(os.path.exists, current)))
+
+@job
+def succeeding_job():
+    pass
+
+@job
+def failing_job():
+    raise RuntimeError("Simulated failure")
+
+class JobQueueTests(TestCase):
+    """Claimed jobs are leased, failures retried with backoff, and jobs out of attempts left failed."""
+    
+    def run_failing(self, claimed):
+        with self.assertLogs('core.jobs', 'ERROR'):
+            return execute(claimed)
+    
+    def make_due(self, job_id):
+        Job.objects.filter(pk=job_id).update(run_after=timezone.now() - timedelta(seconds=1))
+    
+    def test_claim_leases_the_job(self):
+        queued = enqueue(succeeding_job)
+        claimed = claim()
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (queued.pk, Job.RUNNING, 1))
+        self.assertAlmostEqual(
+            (claimed.locked_until - timezone.now()).total_seconds(), LEASE_SECONDS, delta=5
+        )
+        self.assertIsNone(claim())
+        
+        self.assertEqual(execute(claimed).status, Job.DONE)
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, Job.DONE)
+    
+    def test_failures_are_retried_with_backoff(self):
+        queued = enqueue(failing_job)
+        self.run_failing(claim())
+        
+        failed = Job.objects.get(pk=queued.pk)
+        self.assertEqual((failed.status, failed.attempts), (Job.PENDING, 1))
+        self.assertIn("Simulated failure", failed.last_error)
+        delay = (failed.run_after - failed.finished_at).total_seconds()
+        self.assertGreaterEqual(delay, BACKOFF_BASE_SECONDS * 0.8)
+        self.assertLessEqual(delay, BACKOFF_BASE_SECONDS * 1.2)
+        self.assertIsNone(claim())
+        
+        self.make_due(queued.pk)
+        self.assertEqual(claim().attempts, 2)
+    
+    def test_expired_lease_is_reclaimed(self):
+        queued = enqueue(succeeding_job)
+        stale = claim()
+        Job.objects.filter(pk=queued.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        
+        reclaimed = claim()
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (queued.pk, 2))
+        # The worker that lost its lease cannot record over the newer run.
+        execute(stale)
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, Job.RUNNING)
+        execute(reclaimed)
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, Job.DONE)
+    
+    def test_jobs_out_of_attempts_are_dead_lettered(self):
+        queued = enqueue(failing_job, max_attempts=2)
+        self.run_failing(claim())
+        self.make_due(queued.pk)
+        self.assertEqual(self.run_failing(claim()).status, Job.FAILED)
+        
+        failed = Job.objects.get(pk=queued.pk)
+        self.assertEqual((failed.status, failed.attempts), (Job.FAILED, 2))
+        self.assertIn("Simulated failure", failed.last_error)
+        self.make_due(queued.pk)
+        self.assertIsNone(claim())
+    
+    def test_jobs_that_keep_losing_their_lease_fail(self):
+        queued = enqueue(succeeding_job, max_attempts=2)
+        for attempt in (1, 2):
+            self.assertEqual(claim().attempts, attempt)
+            Job.objects.filter(pk=queued.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertIsNone(claim())
+        failed = Job.objects.get(pk=queued.pk)
+        self.assertEqual((failed.status, failed.attempts, failed.locked_until), (Job.FAILED, 2, None))
+        self.assertIn("lease expired", failed.last_error)
+
+class MyTaskBucketTests(TestCase):
+    """``my_tasks?mode=buckets`` splits open assigned tasks by due date around the user's day."""
+    ZONE = 'Pacific/Auckland'
+    # 11:00 on 11 March in Auckland (UTC+13), and still 10 March in UTC.
+    NOW = datetime(2026, 3, 10, 22, 0, tzinfo=dt_timezone.utc)
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='planner', email='planner@example.com', timezone=cls.ZONE)
+        other = User.objects.create(username='bystander', email='bystander@example.com')
+        project = Project.objects.create(name='planning', created_by=cls.owner)
+        cls.board = Board.objects.create(project=project, name='planning')
+        cls.doing = column = Column.objects.create(board=cls.board, name='Doing', position=0)
+        cls.done = Column.objects.create(board=cls.board, name='Done', position=1)
+        
+        today = timezone.localtime(cls.NOW, ZoneInfo(cls.ZONE)).replace(hour=0, minute=0, second=0, microsecond=0)
+        tomorrow = today + timedelta(days=1)
+        due = {
+            'late': today - timedelta(minutes=1),
+            'morning': today,
+            'evening': tomorrow - timedelta(minutes=1),
+            'tomorrow': tomorrow,
+            'someday': None,
+        }
+        for index, (title, due_date) in enumerate(due.items()):
+            Task.objects.create(
+                column=column, title=title, position=index, due_date=due_date, created_by=cls.owner, assigned_to=cls.owner
+            )
+        Task.objects.create(
+            column=cls.done, title='finished', position=9, due_date=due['late'], is_completed=True,
+            created_by=cls.owner, assigned_to=cls.owner
+        )
+        Task.objects.create(
+            column=column, title='theirs', position=9, due_date=due['late'], created_by=cls.owner, assigned_to=other
+        )
+    
+    def setUp(self):
+        clock = patch('django.utils.timezone.now', return_value=self.NOW)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def buckets(self, **params):
+        response = self.client.get('/api/tasks/my_tasks/', {'mode': 'buckets', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+    
+    def test_tasks_land_in_their_buckets(self):
+        data = self.buckets()
+        self.assertEqual(data['timezone'], self.ZONE)
+        self.assertEqual(data['counts'], {'overdue': 1, 'today': 2, 'upcoming': 1, 'no_date': 1})
+        self.assertEqual(
+            {name: [task['title'] for task in tasks] for name, tasks in data['buckets'].items()},
+            {'overdue': ['late'], 'today': ['morning', 'evening'], 'upcoming': ['tomorrow'], 'no_date': ['someday']}
+        )
+    
+    def test_single_bucket_pages(self):
+        data = self.buckets(bucket='today', page_size=1)
+        self.assertEqual((data['count'], [task['title'] for task in data['results']]), (2, ['morning']))
+        self.assertIsNotNone(data['next'])
+        self.assertEqual(self.client.get('/api/tasks/my_tasks/', {'mode': 'buckets', 'bucket': 'later'}).status_code, 400)
+    
+    def test_timezone_override_moves_the_day(self):
+        # Auckland's late and morning tasks fall on the UTC day in progress, its evening one on the next.
+        self.assertEqual(self.buckets(tz='UTC')['counts'], {'overdue': 0, 'today': 2, 'upcoming': 2, 'no_date': 1})
+        self.assertEqual(self.client.get('/api/tasks/my_tasks/', {'mode': 'buckets', 'tz': 'Mars/Olympus'}).status_code, 400)
+    
+    def test_tasks_in_the_last_column_are_done(self):
+        late = Task.objects.get(title='late')
+        response = self.client.post('/api/tasks/reorder/', {
+            'source_column_id': self.doing.pk, 'destination_column_id': self.done.pk, 'task_order': [late.pk]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.buckets()['counts']['overdue'], 0)
+        
+        # A column added after Done reopens its tasks; moving it in front completes them again.
+        response = self.client.post('/api/columns/', {'board': self.board.pk, 'name': 'Archived', 'position': 2}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.buckets()['counts']['overdue'], 2)
+        self.client.post('/api/columns/reorder/', {
+            'board_id': self.board.pk, 'column_order': [self.doing.pk, response.data['id'], self.done.pk]
+        }, format='json')
+        self.assertEqual(self.buckets()['counts']['overdue'], 0)
+        
+        self.client.patch(f'/api/tasks/{late.pk}/', {'column': self.doing.pk}, format='json')
+        self.assertEqual(self.buckets()['counts']['overdue'], 1)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LightCacheTests(TestCase):
+    """Light lists are served from the cache until a committed write bumps a version they were built from."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='cacher', email='cacher@example.com')
+        cls.member = User.objects.create(username='joiner', email='joiner@example.com')
+        cls.project = Project.objects.create(name='cached', created_by=cls.owner)
+        column = Column.objects.create(board=Board.objects.create(project=cls.project, name='cached'), name='x', position=0)
+        cls.task = Task.objects.create(column=column, title='Before', position=0, created_by=cls.owner)
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def titles(self):
+        return [task['title'] for task in self.client.get('/api/tasks/light/').data]
+    
+    def test_hits_skip_the_database(self):
+        self.assertEqual(self.titles(), ['Before'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles(), ['Before'])
+    
+    def test_writes_bump_the_generation(self):
+        self.assertEqual(self.titles(), ['Before'])
+        generation = cache.get(generation_key('task'))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/tasks/{self.task.pk}/', {'title': 'After'})
+        self.assertNotEqual(cache.get(generation_key('task')), generation)
+        self.assertEqual(self.titles(), ['After'])
+    
+    def test_rolled_back_writes_keep_the_generation(self):
+        self.assertEqual(self.titles(), ['Before'])
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.task.title = 'Never'
+                self.task.save()
+                transaction.set_rollback(True)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles(), ['Before'])
+    
+    def test_membership_changes_bump_only_that_user(self):
+        self.client.get('/api/projects/light/')
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.client.get('/api/projects/light/').data, [])
+        owner_version = cache.get(membership_key(self.owner.pk))
+        self.assertIsNotNone(owner_version)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.members.add(self.member)
+        self.assertEqual([row['name'] for row in self.client.get('/api/projects/light/').data], ['cached'])
+        self.assertEqual(cache.get(membership_key(self.owner.pk)), owner_version)
+
+class IdentityMapTests(TestCase):
+    """Each project, board and column a request touches is loaded once, however often it is resolved."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='mapper', email='mapper@example.com')
+        cls.member = User.objects.create(username='walker', email='walker@example.com')
+        cls.project = Project.objects.create(name='mapped', created_by=cls.owner)
+        cls.project.members.add(cls.member)
+        board = Board.objects.create(project=cls.project, name='mapped')
+        cls.todo = Column.objects.create(board=board, name='To Do', position=0)
+        cls.done = Column.objects.create(board=board, name='Done', position=1)
+        cls.tasks = Task.objects.bulk_create([
+            Task(column=cls.todo, title=f"Task {index}", position=index, created_by=cls.owner) for index in range(5)
+        ])
+    
+    def test_ancestors_resolve_to_one_instance(self):
+        identity = IdentityMap()
+        with self.assertNumQueries(1):
+            todo = identity.column(self.todo.pk)
+        with self.assertNumQueries(0):
+            self.assertIs(identity.column(self.todo.pk), todo)
+            self.assertIs(identity.project_for(todo), identity.project(self.project.pk))
+        with self.assertNumQueries(1):
+            done = identity.column(self.done.pk)
+        self.assertIs(done.board, todo.board)
+        
+        with self.assertNumQueries(1):
+            tasks = identity.get_many(Task, [task.pk for task in self.tasks])
+        self.assertTrue(all(task.column is todo for task in tasks))
+        with self.assertNumQueries(1):
+            self.assertTrue(all(identity.can_access(self.member, obj) for obj in [todo, done, *tasks]))
+    
+    def test_reorder_loads_each_ancestor_once(self):
+        client = APIClient()
+        client.force_authenticate(self.member)
+        # The column (named as source and destination), the membership and the tasks,
+        # then the update in its savepoint; every task walks to the same board and project.
+        with self.assertNumQueries(6):
+            response = client.post('/api/tasks/reorder/', {
+                'source_column_id': self.todo.pk, 'destination_column_id': self.todo.pk,
+                'task_order': [task.pk for task in reversed(self.tasks)]
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RenderingTests(TestCase):
+    """Responses render like DRF's JSON, as MessagePack on request, and are gzipped once large enough."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='renderer', email='renderer@example.com')
+        project = Project.objects.create(name='rendered', created_by=cls.owner)
+        cls.column = Column.objects.create(board=Board.objects.create(project=project, name='rendered'), name='x', position=0)
+        Task.objects.bulk_create([
+            Task(column=cls.column, title=f"Task {index}", position=index, created_by=cls.owner) for index in range(20)
+        ])
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def test_orjson_matches_the_json_renderer(self):
+        data = {
+            'utc': datetime(2026, 3, 10, 22, 0, 0, 123456, tzinfo=dt_timezone.utc),
+            'offset': datetime(2026, 3, 10, 22, 0, tzinfo=ZoneInfo('Pacific/Auckland')),
+            'naive': datetime(2026, 3, 10, 22, 0),
+            'day': date(2026, 3, 10),
+            'amount': Decimal('12.50'),
+            'amounts': [Decimal('0.1'), Decimal('-3')],
+            'id': uuid.UUID(int=7),
+            1: 'integer key',
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+    
+    def test_msgpack_round_trip(self):
+        response = self.client.get('/api/tasks/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), json.loads(self.client.get('/api/tasks/').content))
+        
+        response = self.client.post(
+            '/api/tasks/', msgpack.packb({'column': self.column.pk, 'title': 'Packed', 'position': 0}),
+            content_type='application/msgpack', HTTP_ACCEPT='application/msgpack'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(msgpack.unpackb(response.content)['title'], 'Packed')
+        
+        response = self.client.post('/api/tasks/', b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_only_large_responses_are_gzipped(self):
+        small = self.client.get('/api/tags/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertLess(len(small.content), settings.COMPRESSION_MIN_SIZE)
+        self.assertFalse(small.has_header('Content-Encoding'))
+        
+        large = self.client.get('/api/tasks/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(large['Content-Encoding'], 'gzip')
+    
+    @override_settings(COMPRESSION_MIN_SIZE=1, COMPRESSION_MIN_SIZE_BINARY=1024 * 1024)
+    def test_msgpack_has_its_own_threshold(self):
+        packed = self.client.get('/api/tasks/', HTTP_ACCEPT='application/msgpack', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(packed.has_header('Content-Encoding'))
+        self.assertEqual(self.client.get('/api/tasks/', HTTP_ACCEPT_ENCODING='gzip')['Content-Encoding'], 'gzip')
+
+@skipUnless(settings.READ_REPLICAS, "needs a test mirror of default in READ_REPLICAS")
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReadReplicaTests(TransactionTestCase):
+    """Safe API reads go to a replica, except after the client's own writes and inside transactions."""
+    # Committed, so the replica connections see the rows too; saved users are copied to the shards.
+    databases = {'default', *settings.READ_REPLICAS, *settings.DATABASE_SHARDS}
+    
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(username='reader', email='reader@example.com')
+        Tag.objects.create(user=self.owner, name='replicated')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def aliases(self, method, url, data=None):
+        """Make a request and return its response and the aliases it queried."""
+        with ExitStack() as stack:
+            captured = {
+                alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in self.databases
+            }
+            response = getattr(self.client, method)(url, data, format='json')
+        return response, {alias for alias, queries in captured.items() if len(queries)}
+    
+    def test_reads_go_to_a_replica(self):
+        response, aliases = self.aliases('get', '/api/tags/')
+        self.assertEqual([tag['name'] for tag in response.data], ['replicated'])
+        self.assertEqual(len(aliases), 1)
+        self.assertIn(aliases.pop(), settings.READ_REPLICAS)
+    
+    def test_writes_pin_later_reads_to_the_primary(self):
+        response, aliases = self.aliases('post', '/api/tags/', {'name': 'written'})
+        self.assertEqual((response.status_code, aliases), (201, {'default'}))
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        
+        response, aliases = self.aliases('get', '/api/tags/')
+        self.assertEqual(aliases, {'default'})
+        self.assertEqual(len(response.data), 2)
+        
+        del self.client.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertTrue(self.aliases('get', '/api/tags/')[1] <= set(settings.READ_REPLICAS))
+    
+    def test_reads_inside_transactions_use_the_primary(self):
+        def routed_reads(request):
+            outside = router.db_for_read(Tag)
+            with transaction.atomic():
+                inside = router.db_for_read(Tag)
+            return JsonResponse({'outside': outside, 'inside': inside})
+        
+        middleware = ReadReplicaMiddleware(
+            lambda request: middleware.process_view(request, routed_reads, (), {}) or routed_reads(request)
+        )
+        routed = json.loads(middleware(RequestFactory().get('/api/tags/')).content)
+        self.assertIn(routed['outside'], settings.READ_REPLICAS)
+        self.assertEqual(routed['inside'], 'default')
+        # Outside a request, reads always use the primary.
+        self.assertEqual(router.db_for_read(Tag), 'default')
+
+# The root URLconf as it is with ASYNC_READ_VIEWS on; core.urls picks its patterns at import.
+ASYNC_URLCONF = ModuleType('async_urlconf')
+ASYNC_URLCONF.urlpatterns = [path('api/', include(core_urls.async_urlpatterns)), *root_urls.urlpatterns]
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    ASYNC_READ_VIEWS=True, ROOT_URLCONF=ASYNC_URLCONF
+)
+class AsyncReadViewTests(TestCase):
+    """The async read views authenticate bearer tokens and only show members what they may see."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='awaiter', email='awaiter@example.com', password='password')
+        User.objects.create_user(username='outsider', email='outsider@example.com', password='password')
+        cls.project = Project.objects.create(name='async', created_by=cls.owner)
+        cls.board = Board.objects.create(project=cls.project, name='async')
+        column = Column.objects.create(board=cls.board, name='Doing', position=0)
+        cls.task = Task.objects.create(
+            column=column, title='Awaited', position=0, created_by=cls.owner, assigned_to=cls.owner,
+            due_date=timezone.now() - timedelta(days=1)
+        )
+        Comment.objects.create(task=cls.task, user=cls.owner, content='Async comment')
+    
+    def setUp(self):
+        cache.clear()
+        self.tokens = {
+            username: APIClient().post(
+                '/api/auth/token/', {'username': username, 'password': 'password'}, format='json'
+            ).data['access']
+            for username in ('awaiter', 'outsider')
+        }
+    
+    async def get(self, url, username='awaiter'):
+        headers = {'Authorization': f"Bearer {self.tokens[username]}"} if username else {}
+        return await self.async_client.get(url, headers=headers)
+    
+    async def test_requires_a_bearer_token(self):
+        response = await self.get(f'/api/boards/{self.board.pk}/', username=None)
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(response.has_header('WWW-Authenticate'))
+        self.assertEqual((await self.async_client.get(
+            '/api/tasks/light/', headers={'Authorization': 'Bearer not-a-token'}
+        )).status_code, 401)
+    
+    async def test_members_read_their_data(self):
+        self.assertTrue(iscoroutinefunction(resolve(f'/api/boards/{self.board.pk}/').func))
+        board = await self.get(f'/api/boards/{self.board.pk}/')
+        self.assertEqual(board.status_code, 200)
+        self.assertEqual(board.json()['columns'][0]['tasks'][0]['title'], 'Awaited')
+        for url, name in (('/api/projects/light/', 'async'), ('/api/boards/light/', 'async'), ('/api/tasks/light/', 'Awaited')):
+            rows = (await self.get(url)).json()
+            self.assertEqual([row.get('name') or row.get('title') for row in rows], [name], url)
+        
+        buckets = (await self.get('/api/tasks/my_tasks/?mode=buckets')).json()
+        self.assertEqual(buckets['counts']['overdue'], 1)
+        comments = (await self.get(f'/api/comments/task_comments/?task_id={self.task.pk}')).json()
+        self.assertEqual([comment['content'] for comment in comments['results']], ['Async comment'])
+    
+    async def test_outsiders_see_nothing(self):
+        self.assertEqual((await self.get(f'/api/boards/{self.board.pk}/', 'outsider')).status_code, 404)
+        for url in ('/api/projects/light/', '/api/boards/light/', '/api/columns/light/', '/api/tasks/light/', '/api/tasks/my_tasks/'):
+            self.assertEqual((await self.get(url, 'outsider')).json(), [], url)
+        response = await self.get(f'/api/comments/task_comments/?task_id={self.task.pk}', 'outsider')
+        self.assertEqual(response.status_code, 403)
+    
+    def test_writes_fall_through_to_the_sync_views(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['awaiter']}")
+        response = client.patch(f'/api/boards/{self.board.pk}/', {'name': 'Renamed'}, format='json')
+        self.assertEqual((response.status_code, response.data['name']), (200, 'Renamed'))
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, METRICS_TOKEN='scraper'
+)
+class RequestMetricsTests(TestCase):
+    """Every request feeds the /metrics histograms, and staff see its timings in Server-Timing."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='measured', email='measured@example.com')
+        cls.staff = User.objects.create(username='operator', email='operator@example.com', is_staff=True)
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def scrape(self):
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scraper')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+    
+    def test_prometheus_exposition(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer guess').status_code, 403)
+        before = self.scrape()
+        for _ in range(2):
+            self.client.get('/api/tags/')
+        after = self.scrape()
+        
+        def grown(name):
+            return after[name] - before.get(name, 0)
+        
+        labels = 'route="tag-list",method="GET"'
+        self.assertEqual(grown(f'tida_requests_total{{{labels},status="2xx"}}'), 2)
+        for metric in ('duration_seconds', 'db_seconds', 'serialize_seconds', 'render_seconds', 'queries'):
+            self.assertEqual(grown(f'tida_request_{metric}_count{{{labels}}}'), 2, metric)
+            self.assertEqual(grown(f'tida_request_{metric}_bucket{{{labels},le="+Inf"}}'), 2, metric)
+        self.assertEqual(grown(f'tida_request_queries_bucket{{{labels},le="1000.0"}}'), 2)
+    
+    def test_scraping_without_a_token_needs_staff(self):
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+            self.client.force_login(self.user)
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.client.force_login(self.staff)
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+    
+    def test_process_registry(self):
+        # A process whose snapshot expired is dropped; the scraping one registers itself.
+        cache.set(PROCESSES_KEY, {1}, timeout=None)
+        collect()
+        self.assertEqual(cache.get(PROCESSES_KEY), {os.getpid()})
+        
+        # While another worker holds the lock, registering waits for a later flush.
+        cache.delete(PROCESSES_KEY)
+        cache.add(PROCESSES_LOCK_KEY, 'other worker')
+        with patch('tida_backend.metrics.LOCK_ATTEMPTS', 1):
+            registry.flush(force=True)
+        self.assertIsNone(cache.get(PROCESSES_KEY))
+        cache.delete(PROCESSES_LOCK_KEY)
+        registry.flush(force=True)
+        self.assertEqual(cache.get(PROCESSES_KEY), {os.getpid()})
+    
+    def test_server_timing_for_staff(self):
+        self.assertFalse(self.client.get('/api/tags/').has_header('Server-Timing'))
+        
+        self.client.force_authenticate(self.staff)
+        header = self.client.get('/api/tags/')['Server-Timing']
+        phases = dict(re.match(r'(\w+);dur=([\d.]+)', entry.strip()).groups() for entry in header.split(','))
+        self.assertEqual(list(phases), ['db', 'serialize', 'render', 'total'])
+        self.assertIn('desc="1 queries"', header)
+        self.assertGreaterEqual(float(phases['total']), float(phases['render']))
+        
+        with self.settings(SERVER_TIMING=True):
+            self.client.force_authenticate(self.user)
+            self.assertTrue(self.client.get('/api/tags/').has_header('Server-Timing'))
+    
+    def test_nested_phases_are_timed_separately(self):
+        with request_metrics() as metrics:
+            with timing('render'):
+                with timing('serialize'):
+                    with timing('serialize'):
+                        time.sleep(0.02)
+        self.assertGreaterEqual(metrics.serialize, 0.02)
+        # The inner serialize block is not counted twice.
+        self.assertLess(metrics.serialize, 0.04)
+        self.assertGreaterEqual(metrics.render, metrics.serialize)
@@ -1,12 +1,15 @@
 # core/urls.py
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
-    ProjectViewSet, BoardViewSet, ColumnViewSet, TaskViewSet, 
+    WorkspaceViewSet, ProjectViewSet, BoardViewSet, ColumnViewSet, TaskViewSet, 
     SubTaskViewSet, TagViewSet, CommentViewSet, AttachmentViewSet
 )
 
 router = DefaultRouter()
+router.register(r'workspaces', WorkspaceViewSet, basename='workspace')
 router.register(r'projects', ProjectViewSet, basename='project')
 router.register(r'boards', BoardViewSet, basename='board')
 router.register(r'columns', ColumnViewSet, basename='column')
@@ -18,4 +21,37 @@ router.register(r'attachments', AttachmentViewSet, basename='attachment')
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
+
+# Served ahead of the router when ASYNC_READ_VIEWS is on, so the same URLs are answered
+# by the async views under ASGI.
+async_urlpatterns = [
+    path('boards/<int:pk>/', async_views.async_reads(
+        async_views.board_detail,
+        BoardViewSet.as_view({
+            'get': 'retrieve', 'put': 'update', 
+            'patch': 'partial_update', 'delete': 'destroy'
+        })
+    ), name='board-detail'),
+    path('projects/light/', async_views.async_reads(
+        async_views.project_light, ProjectViewSet.as_view({'get': 'light'})
+    ), name='project-light'),
+    path('boards/light/', async_views.async_reads(
+        async_views.board_light, BoardViewSet.as_view({'get': 'light'})
+    ), name='board-light'),
+    path('columns/light/', async_views.async_reads(
+        async_views.column_light, ColumnViewSet.as_view({'get': 'light'})
+    ), name='column-light'),
+    path('tasks/light/', async_views.async_reads(
+        async_views.task_light, TaskViewSet.as_view({'get': 'light'})
+    ), name='task-light'),
+    path('tasks/my_tasks/', async_views.async_reads(
+        async_views.my_tasks, TaskViewSet.as_view({'get': 'my_tasks'})
+    ), name='task-my-tasks'),
+    path('comments/task_comments/', async_views.async_reads(
+        async_views.task_comments, CommentViewSet.as_view({'get': 'task_comments'})
+    ), name='comment-task-comments'),
+]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = async_urlpatterns + urlpatterns
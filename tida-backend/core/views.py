@@ -1,20 +1,159 @@
 # core/views.py
-from rest_framework import viewsets, permissions, status, filters
+from rest_framework import viewsets, mixins, permissions, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
+from datetime import timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.conf import settings
 from django.db import transaction, models
-from django.shortcuts import get_object_or_404
-from accounts.models import User
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.utils import timezone
+from tida_backend.db_router import current_shard, current_workspace
 from .models import (
-    Project, Board, Column, Task, SubTask, 
-    Tag, TaskTag, Comment, Attachment
+    Workspace, Project, Board, Column, Task, SubTask, 
+    Tag, TaskTag, Comment, Attachment, Activity, VersionConflict
 )
 from .serializers import (
     ProjectSerializer, ProjectLightSerializer, BoardSerializer, 
     BoardLightSerializer, ColumnSerializer, ColumnLightSerializer,
     TaskSerializer, TaskLightSerializer, SubTaskSerializer,
-    TagSerializer, CommentSerializer, AttachmentSerializer
+    TagUsageSerializer, CommentSerializer, AttachmentSerializer, MyTaskSerializer, ActivitySerializer,
+    WorkspaceSerializer, latest_comments
 )
+from .activity import record
+from .cache import bump_generation, cached_user_data
+from .concurrency import Conflict, bulk_update_versioned, check_if_match, check_versions
+from .deletion import schedule_deletion
+from . import flow
+from .identity import identity_map
+from .pagination import ActivityCursorPagination, BucketPagination, CommentCursorPagination
+from .sharding import is_workspace_member, member_workspace_ids, shard_for_new_workspace
+from .tagging import MAX_BULK_TAGS, MAX_BULK_TASKS, add_tags, release_task_tags, remove_tags
+
+def include_archived(request):
+    """Return True if the request opts into archived projects with ``?include_archived=1``."""
+    return request.GET.get('include_archived') in ('1', 'true')
+
+def accessible_project_ids(user, include_archived=False):
+    """
+    Return a subquery of the ids of projects the user created or is a member of.
+    
+    Filtering with ``__in`` on this avoids joining the members table, so list
+    queries need no DISTINCT and can walk the project/board/column indexes.
+    Projects pending deletion are always left out, archived ones unless
+    ``include_archived`` is set, and so are projects outside the request's
+    workspace (without one, those in no workspace).
+    """
+    if include_archived:
+        owned = Project.objects.filter(deleted_at__isnull=True)
+        joined = Project.members.through.objects.filter(project__deleted_at__isnull=True)
+    else:
+        owned = Project.live.all()
+        joined = Project.members.through.objects.filter(
+            project__is_archived=False, project__deleted_at__isnull=True
+        )
+    workspace_id = current_workspace()
+    owned = owned.filter(workspace_id=workspace_id) if workspace_id else owned.filter(workspace__isnull=True)
+    joined = (
+        joined.filter(project__workspace_id=workspace_id) if workspace_id
+        else joined.filter(project__workspace__isnull=True)
+    )
+    return owned.filter(created_by_id=user.pk).values('id').union(
+        joined.filter(user_id=user.pk).values('project_id')
+    )
+
+def board_scope(user, path='', include_archived=False):
+    """
+    Return a filter for rows reached through the board at ``path`` that the user may see.
+    
+    The board has to belong to one of the user's projects and must not be pending deletion.
+    """
+    prefix = f"{path}__" if path else ''
+    return models.Q(**{
+        f"{prefix}project__in": accessible_project_ids(user, include_archived),
+        f"{prefix}deleted_at__isnull": True,
+    })
+
+def task_snapshot_queryset():
+    """Tasks with everything ``TaskSerializer`` reads, so serializing them issues no further queries."""
+    return Task.objects.select_related(
+        'created_by', 'assigned_to', 'column__board__project'
+    ).annotate(
+        # A correlated count stays right when callers add joins that repeat task rows.
+        comment_count=Coalesce(
+            models.Subquery(
+                Comment.objects.filter(task=models.OuterRef('pk')).order_by().values('task').annotate(
+                    count=models.Count('*')
+                ).values('count')
+            ),
+            0
+        )
+    ).prefetch_related(
+        'subtasks',
+        models.Prefetch('task_tags', queryset=TaskTag.objects.select_related('tag')),
+        # Only the newest comments of each task; the window query walks the (task, -created_at) index.
+        models.Prefetch('comments', queryset=latest_comments(Comment.objects.all()), to_attr='latest_comments'),
+        models.Prefetch('attachments', queryset=Attachment.objects.select_related('uploaded_by')),
+    )
+
+def column_snapshot_queryset():
+    """Columns with their tasks prefetched for ``ColumnSerializer``."""
+    return Column.objects.prefetch_related(
+        models.Prefetch('tasks', queryset=task_snapshot_queryset().order_by('column_id', 'position'))
+    )
+
+def board_snapshot_queryset():
+    """Boards with their columns and tasks prefetched for ``BoardSerializer``."""
+    return Board.objects.select_related('project').prefetch_related(
+        models.Prefetch('columns', queryset=column_snapshot_queryset().order_by('board_id', 'position'))
+    )
+
+def project_snapshot_queryset():
+    """Projects with members, boards, columns and tasks prefetched for ``ProjectSerializer``."""
+    return Project.objects.select_related('created_by').prefetch_related(
+        'members',
+        models.Prefetch('boards', queryset=board_snapshot_queryset().filter(deleted_at__isnull=True))
+    )
+
+def my_tasks_condition(request):
+    """
+    Tasks assigned to the requesting user, outside boards and projects pending deletion
+    and outside archived projects unless it opted in.
+    """
+    condition = models.Q(
+        assigned_to=request.user,
+        column__board__deleted_at__isnull=True,
+        column__board__project__deleted_at__isnull=True
+    )
+    if not include_archived(request):
+        condition &= models.Q(column__board__project__is_archived=False)
+    return condition
+
+def my_task_bucket_filters(zone):
+    """Return the overdue/today/upcoming/no_date conditions for days in ``zone``."""
+    today_start = timezone.localtime(timezone.now(), zone).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    tomorrow_start = today_start + timedelta(days=1)
+    return {
+        'overdue': models.Q(due_date__lt=today_start),
+        'today': models.Q(due_date__gte=today_start, due_date__lt=tomorrow_start),
+        'upcoming': models.Q(due_date__gte=tomorrow_start),
+        'no_date': models.Q(due_date__isnull=True),
+    }
+
+def my_task_bucket_rows(tasks, condition):
+    """Return the rows of one My Tasks bucket with the annotations ``MyTaskSerializer`` expects."""
+    return tasks.filter(condition).select_related(
+        'column__board'
+    ).annotate(
+        subtask_count=models.Count('subtasks'),
+        completed_subtask_count=models.Count(
+            'subtasks', filter=models.Q(subtasks__is_completed=True)
+        )
+    ).order_by('due_date', 'position', 'id')
 
 class IsProjectMemberOrReadOnly(permissions.BasePermission):
     """
@@ -24,23 +163,164 @@ class IsProjectMemberOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         
-        return request.user == obj.created_by or request.user in obj.members.all()
+        return identity_map(request).can_access(request.user, obj)
+
+class IdentityMapMixin:
+    """Resolve objects and project membership through the request's identity map."""
+    
+    @property
+    def identity(self):
+        return identity_map(self.request)
+    
+    def get_object(self):
+        return self.identity.register(super().get_object())
+
+class VersionedMixin:
+    """
+    Optimistic concurrency for tasks and columns (see ``core.concurrency``).
+    
+    Writes to one object are refused with a 409 when their ``If-Match`` names a
+    stale version, or when another write lands between reading and saving it.
+    Detail responses carry the object's version as their ``ETag``.
+    """
+    
+    def get_object(self):
+        obj = super().get_object()
+        if self.request.method not in permissions.SAFE_METHODS:
+            check_if_match(self.request, obj)
+        return obj
+    
+    def handle_exception(self, exc):
+        if isinstance(exc, VersionConflict):
+            exc = Conflict()
+        response = super().handle_exception(exc)
+        if isinstance(exc, Conflict):
+            response.data.update(exc.current)
+        return response
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        data = getattr(response, 'data', None)
+        if self.detail and response.status_code < 300 and isinstance(data, dict) and 'version' in data:
+            response['ETag'] = f'"{data["version"]}"'
+        return response
+
+class ProjectScopeMixin:
+    """
+    Scope querysets to the requesting user's projects.
+    
+    Archived projects are left out unless the request passes ``?include_archived=1``
+    or the action is listed in ``archived_actions``.
+    """
+    archived_actions = ()
+    
+    def wants_archived(self):
+        return self.action in self.archived_actions or include_archived(self.request)
+    
+    def project_ids(self):
+        return accessible_project_ids(self.request.user, self.wants_archived())
+    
+    def board_scope(self, path=''):
+        return board_scope(self.request.user, path, self.wants_archived())
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ActivityMixin:
+    """
+    Record writes to the viewset's objects in the activity log (see ``core.activity``).
+    
+    Updates and deletes going through the stock handlers are logged here; creates
+    and custom actions call ``log_activity`` next to their writes.
+    """
+    
+    def log_activity(self, verb, obj, task=None, **data):
+        """Log ``<model>.<verb>`` for ``obj``, labelled with its title or name."""
+        if isinstance(obj, Task):
+            task = obj
+        elif task is None and isinstance(obj, Comment):
+            task = self.identity.task(obj.task_id)
+        label = getattr(obj, 'title', None) or getattr(obj, 'name', None)
+        if label:
+            data = {'name': label, **data}
+        project = self.identity.project_for(task or obj)
+        record(self.request.user, f"{obj._meta.model_name}.{verb}", obj, project, task, **data)
+    
+    def activity_feed(self, **filters):
+        """Return a cursor-paginated page of the activity matching ``filters``, newest first."""
+        entries = Activity.objects.filter(**filters).select_related('actor')
+        page = self.paginate_queryset(entries)
+        return self.get_paginated_response(ActivitySerializer(page, many=True).data)
+    
+    def perform_update(self, serializer):
+        # Logged from the instance get_object() loaded, whose ancestors are already in the identity map.
+        instance = serializer.instance
+        super().perform_update(serializer)
+        self.log_activity('updated', instance, fields=sorted(serializer.validated_data))
+    
+    def perform_destroy(self, instance):
+        self.log_activity('deleted', instance)
+        super().perform_destroy(instance)
+
+class SnapshotMixin:
+    """
+    Serialize nested objects in a fixed number of queries, however many rows they hold.
+    
+    Actions listed in ``snapshot_actions`` read from ``snapshot_queryset()``, and updated
+    objects are reloaded from it because DRF drops their prefetched relations on save.
+    """
+    snapshot_actions = ('list', 'retrieve')
+    
+    def snapshot_queryset(self):
+        raise NotImplementedError
+    
+    def scoped_queryset(self):
+        """Start ``get_queryset`` from the snapshot queryset for actions that serialize nested data."""
+        if self.action in self.snapshot_actions:
+            return self.snapshot_queryset()
+        return self.snapshot_queryset().model.objects.all()
+    
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        serializer.instance = self.snapshot_queryset().get(pk=serializer.instance.pk)
+
+class WorkspaceViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                       viewsets.GenericViewSet):
+    """
+    Workspaces the user belongs to. Requests work inside one by sending its id in
+    the ``X-Workspace`` header (see ``core.sharding``).
+    """
+    serializer_class = WorkspaceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return Workspace.objects.filter(pk__in=member_workspace_ids(self.request.user)).order_by('name', 'id')
+    
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user, shard=shard_for_new_workspace())
+
+class ProjectViewSet(IdentityMapMixin, ProjectScopeMixin, ActivityMixin, SnapshotMixin, viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at', 'updated_at']
+    archived_actions = ('unarchive',)
+    # Token costs (see tida_backend.throttling); the list serializes every project's full tree.
+    throttle_costs = {'list': 10, 'retrieve': 5}
     
     def get_queryset(self):
-        user = self.request.user
-        return Project.objects.filter(
-            models.Q(created_by=user) | models.Q(members=user)
-        ).distinct()
+        return self.scoped_queryset().filter(id__in=self.project_ids())
+    
+    def snapshot_queryset(self):
+        return project_snapshot_queryset()
+    
+    def new_project_workspace(self):
+        """Return the id of the workspace new projects go into, if the user may create them there."""
+        workspace_id = current_workspace()
+        if workspace_id and not is_workspace_member(self.request.user, workspace_id):
+            raise PermissionDenied("You do not have permission to create projects in this workspace.")
+        return workspace_id
     
     def perform_create(self, serializer):
-        project = serializer.save(created_by=self.request.user)
+        project = serializer.save(created_by=self.request.user, workspace_id=self.new_project_workspace())
         
         board = Board.objects.create(
             project=project,
@@ -60,12 +340,18 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 position=column_data["position"],
                 color=column_data["color"]
             )
+        self.log_activity('created', project)
+    
+    def perform_destroy(self, instance):
+        """Hide the project now and remove its contents in the background (see ``core.deletion``)."""
+        self.log_activity('deleted', instance)
+        schedule_deletion(instance)
     
     @action(detail=True, methods=['post'])
     def add_member(self, request, pk=None):
         project = self.get_object()
         
-        if not (request.user == project.created_by or request.user in project.members.all()):
+        if not self.identity.can_access(request.user, project):
             return Response(
                 {"detail": "You do not have permission to add members to this project."},
                 status=status.HTTP_403_FORBIDDEN
@@ -78,24 +364,26 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        try:
-            user = User.objects.get(id=user_id)
-            project.members.add(user)
-            return Response(
-                {"detail": f"User {user.username} added to project."},
-                status=status.HTTP_200_OK
-            )
-        except User.DoesNotExist:
+        user = self.identity.user(user_id)
+        if user is None:
             return Response(
                 {"detail": "User not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
+            
+        project.members.add(user)
+        self.identity.forget_members(project)
+        self.log_activity('member_added', project, user_id=user.pk, username=user.username)
+        return Response(
+            {"detail": f"User {user.username} added to project."},
+            status=status.HTTP_200_OK
+        )
     
     @action(detail=True, methods=['post'])
     def remove_member(self, request, pk=None):
         project = self.get_object()
         
-        if request.user != project.created_by:
+        if request.user.pk != project.created_by_id:
             return Response(
                 {"detail": "Only the project creator can remove members."},
                 status=status.HTTP_403_FORBIDDEN
@@ -108,31 +396,37 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        try:
-            user = User.objects.get(id=user_id)
-            
-            if user == project.created_by:
-                return Response(
-                    {"detail": "Cannot remove the project creator."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-                
-            project.members.remove(user)
-            return Response(
-                {"detail": f"User {user.username} removed from project."},
-                status=status.HTTP_200_OK
-            )
-        except User.DoesNotExist:
+        user = self.identity.user(user_id)
+        if user is None:
             return Response(
                 {"detail": "User not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
+            
+        if user.pk == project.created_by_id:
+            return Response(
+                {"detail": "Cannot remove the project creator."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+            
+        project.members.remove(user)
+        self.identity.forget_members(project)
+        self.log_activity('member_removed', project, user_id=user.pk, username=user.username)
+        return Response(
+            {"detail": f"User {user.username} removed from project."},
+            status=status.HTTP_200_OK
+        )
+    
+    @action(detail=True, methods=['get'], pagination_class=ActivityCursorPagination)
+    def activity(self, request, pk=None):
+        """Get the project's activity, newest first, a cursor-paginated page at a time."""
+        return self.activity_feed(project=self.get_object())
     
     @action(detail=True, methods=['post'])
     def archive(self, request, pk=None):
         project = self.get_object()
         
-        if request.user != project.created_by:
+        if request.user.pk != project.created_by_id:
             return Response(
                 {"detail": "Only the project creator can archive the project."},
                 status=status.HTTP_403_FORBIDDEN
@@ -140,6 +434,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
             
         project.is_archived = True
         project.save()
+        self.log_activity('archived', project)
         return Response(
             {"detail": "Project archived successfully."},
             status=status.HTTP_200_OK
@@ -149,7 +444,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def unarchive(self, request, pk=None):
         project = self.get_object()
         
-        if request.user != project.created_by:
+        if request.user.pk != project.created_by_id:
             return Response(
                 {"detail": "Only the project creator can unarchive the project."},
                 status=status.HTTP_403_FORBIDDEN
@@ -157,6 +452,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
             
         project.is_archived = False
         project.save()
+        self.log_activity('unarchived', project)
         return Response(
             {"detail": "Project unarchived successfully."},
             status=status.HTTP_200_OK
@@ -164,9 +460,11 @@ class ProjectViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def light(self, request):
-        queryset = self.get_queryset()
-        serializer = ProjectLightSerializer(queryset, many=True)
-        return Response(serializer.data)
+        data = cached_user_data(
+            request, 'projects', ('project',),
+            lambda: ProjectLightSerializer(self.get_queryset(), many=True).data
+        )
+        return Response(data)
 
     @action(detail=False, methods=['post'])
     def create_from_template(self, request):
@@ -183,7 +481,8 @@ class ProjectViewSet(viewsets.ModelViewSet):
         project = Project.objects.create(
             name=name,
             description=description,
-            created_by=request.user
+            created_by=request.user,
+            workspace_id=self.new_project_workspace()
         )
         
         board = Board.objects.create(
@@ -280,6 +579,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 color=column_data["color"]
             )
             
+        self.log_activity('created', project)
         serializer = self.get_serializer(project)
         return Response(serializer.data)
         
@@ -295,7 +595,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        if not (request.user == project.created_by or request.user in project.members.all()):
+        if not self.identity.can_access(request.user, project):
             return Response(
                 {"detail": "You do not have permission to create boards in this project."},
                 status=status.HTTP_403_FORBIDDEN
@@ -395,27 +695,33 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 color=column_data["color"]
             )
             
+        self.log_activity('created', board)
         serializer = BoardSerializer(board)
         return Response(serializer.data)
 
-class BoardViewSet(viewsets.ModelViewSet):
+class BoardViewSet(IdentityMapMixin, ProjectScopeMixin, ActivityMixin, SnapshotMixin, viewsets.ModelViewSet):
     serializer_class = BoardSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_costs = {'list': 5, 'retrieve': 3, 'cumulative_flow': 5, 'flow_metrics': 3}
     
     def get_queryset(self):
-        user = self.request.user
-        return Board.objects.filter(
-            models.Q(project__created_by=user) | models.Q(project__members=user)
-        ).distinct()
+        return self.scoped_queryset().filter(self.board_scope()).select_related('project')
+    
+    def snapshot_queryset(self):
+        return board_snapshot_queryset()
     
     def perform_create(self, serializer):
-        project_id = serializer.validated_data.get('project').id
-        project = get_object_or_404(Project, id=project_id)
+        project = self.identity.register(serializer.validated_data.get('project'))
         
-        if not (self.request.user == project.created_by or self.request.user in project.members.all()):
+        if not self.identity.can_access(self.request.user, project):
             raise permissions.PermissionDenied("You do not have permission to create boards in this project.")
             
-        serializer.save()
+        self.log_activity('created', serializer.save())
+    
+    def perform_destroy(self, instance):
+        """Hide the board now and remove its contents in the background (see ``core.deletion``)."""
+        self.log_activity('deleted', instance)
+        schedule_deletion(instance)
     
     @action(detail=False, methods=['get'])
     def project_boards(self, request):
@@ -426,42 +732,81 @@ class BoardViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        project = get_object_or_404(Project, id=project_id)
+        project = self.identity.project(project_id)
         
-        if not (request.user == project.created_by or request.user in project.members.all()):
+        if not self.identity.can_access(request.user, project):
             return Response(
                 {"detail": "You do not have permission to view boards in this project."},
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        boards = Board.objects.filter(project=project)
+        boards = board_snapshot_queryset().filter(project=project)
         serializer = self.get_serializer(boards, many=True)
         return Response(serializer.data)
     
+    def flow_days(self):
+        try:
+            days = int(self.request.query_params.get('days', flow.DEFAULT_DAYS))
+        except ValueError:
+            days = flow.DEFAULT_DAYS
+        return min(max(days, 1), flow.MAX_DAYS)
+    
+    @action(detail=True, methods=['get'])
+    def cumulative_flow(self, request, pk=None):
+        """Get the number of tasks in each column at the end of each of the last ``days`` days."""
+        return Response(flow.cumulative_flow(self.get_object(), self.flow_days()))
+    
+    @action(detail=True, methods=['get'])
+    def flow_metrics(self, request, pk=None):
+        """Get the board's daily throughput and its lead and cycle times over the last ``days`` days."""
+        return Response(flow.flow_metrics(self.get_object(), self.flow_days()))
+    
     @action(detail=False, methods=['get'])
     def light(self, request):
-        queryset = self.get_queryset()
-        serializer = BoardLightSerializer(queryset, many=True)
-        return Response(serializer.data)
+        data = cached_user_data(
+            request, 'boards', ('project', 'board'),
+            lambda: BoardLightSerializer(self.get_queryset(), many=True).data
+        )
+        return Response(data)
 
-class ColumnViewSet(viewsets.ModelViewSet):
+class ColumnViewSet(VersionedMixin, IdentityMapMixin, ProjectScopeMixin, ActivityMixin, SnapshotMixin, viewsets.ModelViewSet):
     """API endpoint for columns."""
     serializer_class = ColumnSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_costs = {'list': 3}
     
     def get_queryset(self):
         """Return columns from boards in projects the user is a member of."""
-        user = self.request.user
-        return Column.objects.filter(
-            models.Q(board__project__created_by=user) | models.Q(board__project__members=user)
-        ).distinct()
+        return self.scoped_queryset().filter(
+            self.board_scope('board')
+        ).select_related('board__project')
+    
+    def snapshot_queryset(self):
+        return column_snapshot_queryset()
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic(using=current_shard()):
+            release_task_tags(Task.objects.filter(column=instance))
+            super().perform_destroy(instance)
+            flow.sync_completion(instance.board_id)
+    
+    def perform_update(self, serializer):
+        """Update a column; moving it can change which tasks its board counts as completed (see ``core.flow``)."""
+        if not {'position', 'board'} & set(serializer.validated_data):
+            super().perform_update(serializer)
+            return
+        
+        previous = serializer.instance.board_id
+        with transaction.atomic(using=current_shard()):
+            super().perform_update(serializer)
+            for board_id in {previous, serializer.instance.board_id}:
+                flow.sync_completion(board_id)
     
     def perform_create(self, serializer):
         """Create a new column and check permissions."""
-        board_id = serializer.validated_data.get('board').id
-        board = get_object_or_404(Board, id=board_id)
+        board = self.identity.register(serializer.validated_data.get('board'))
         
-        if not (self.request.user == board.project.created_by or self.request.user in board.project.members.all()):
+        if not self.identity.can_access(self.request.user, board):
             raise permissions.PermissionDenied("You do not have permission to create columns in this board.")
         
         position = serializer.validated_data.get('position')
@@ -470,7 +815,10 @@ class ColumnViewSet(viewsets.ModelViewSet):
             position = (last_position.position + 1) if last_position else 0
             serializer.validated_data['position'] = position
             
-        serializer.save()
+        with transaction.atomic(using=current_shard()):
+            column = serializer.save()
+            flow.sync_completion(board.pk)
+        self.log_activity('created', column)
     
     @action(detail=False, methods=['get'])
     def board_columns(self, request):
@@ -482,15 +830,15 @@ class ColumnViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        board = get_object_or_404(Board, id=board_id)
+        board = self.identity.board(board_id)
         
-        if not (request.user == board.project.created_by or request.user in board.project.members.all()):
+        if not self.identity.can_access(request.user, board):
             return Response(
                 {"detail": "You do not have permission to view columns in this board."},
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        columns = Column.objects.filter(board=board).order_by('position')
+        columns = column_snapshot_queryset().filter(board=board).order_by('position')
         serializer = self.get_serializer(columns, many=True)
         return Response(serializer.data)
     
@@ -506,54 +854,70 @@ class ColumnViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        board = get_object_or_404(Board, id=board_id)
+        board = self.identity.board(board_id)
         
-        if not (request.user == board.project.created_by or request.user in board.project.members.all()):
+        if not self.identity.can_access(request.user, board):
             return Response(
                 {"detail": "You do not have permission to reorder columns in this board."},
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        with transaction.atomic():
-            for index, column_id in enumerate(column_order):
-                column = get_object_or_404(Column, id=column_id, board=board)
-                column.position = index
-                column.save()
+        columns = self.identity.get_many(Column, column_order)
+        if any(column.board_id != board.id for column in columns):
+            raise Http404("No Column matches the given query.")
+        check_versions(request, columns)
+            
+        for index, column in enumerate(columns):
+            column.position = index
+            
+        # One UPDATE for the whole board; bulk_update sends no post_save, so invalidate here.
+        with transaction.atomic(using=current_shard()):
+            bulk_update_versioned(columns, ['position'])
+            bump_generation('column')
+            flow.sync_completion(board.pk)
+            self.log_activity('columns_reordered', board, order=[column.pk for column in columns])
                 
         return Response(
-            {"detail": "Columns reordered successfully."},
+            {
+                "detail": "Columns reordered successfully.",
+                "versions": {column.pk: column.version for column in columns}
+            },
             status=status.HTTP_200_OK
         )
     
     @action(detail=False, methods=['get'])
     def light(self, request):
         """Get a lightweight list of columns."""
-        queryset = self.get_queryset()
-        serializer = ColumnLightSerializer(queryset, many=True)
-        return Response(serializer.data)
+        data = cached_user_data(
+            request, 'columns', ('project', 'board', 'column'),
+            lambda: ColumnLightSerializer(self.get_queryset(), many=True).data
+        )
+        return Response(data)
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(VersionedMixin, IdentityMapMixin, ProjectScopeMixin, ActivityMixin, SnapshotMixin, viewsets.ModelViewSet):
     """API endpoint for tasks."""
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'description']
     ordering_fields = ['position', 'created_at', 'due_date', 'priority']
+    snapshot_actions = ('list', 'retrieve', 'date_filter', 'filter_by_tags')
+    throttle_costs = {'list': 5, 'filter_by_tags': 5, 'date_filter': 3, 'my_tasks': 2}
     
     def get_queryset(self):
         """Return tasks from columns in boards in projects the user is a member of."""
-        user = self.request.user
-        return Task.objects.filter(
-            models.Q(column__board__project__created_by=user) | models.Q(column__board__project__members=user)
-        ).distinct()
+        return self.scoped_queryset().filter(
+            self.board_scope('column__board')
+        ).select_related('column__board__project')
+    
+    def snapshot_queryset(self):
+        return task_snapshot_queryset()
     
     def perform_create(self, serializer):
         """Create a new task and check permissions."""
-        column_id = serializer.validated_data.get('column').id
-        column = get_object_or_404(Column, id=column_id)
+        column = self.identity.register(serializer.validated_data.get('column'))
         
-        if not (self.request.user == column.board.project.created_by or 
-                self.request.user in column.board.project.members.all()):
+        if not self.identity.can_access(self.request.user, column):
             raise permissions.PermissionDenied("You do not have permission to create tasks in this column.")
         
         position = serializer.validated_data.get('position')
@@ -562,7 +926,35 @@ class TaskViewSet(viewsets.ModelViewSet):
             position = (last_position.position + 1) if last_position else 0
             serializer.validated_data['position'] = position
             
-        serializer.save(created_by=self.request.user)
+        with transaction.atomic(using=current_shard()):
+            task = serializer.save(created_by=self.request.user, is_completed=flow.is_last_column(column))
+            flow.record_entry(task, column)
+        self.log_activity('created', task, column=column.name)
+        # A new task has no comments; spare the response two queries finding that out.
+        task.comment_count = 0
+        task.latest_comments = []
+    
+    def perform_update(self, serializer):
+        """Update a task, recording a column change for the flow analytics (see ``core.flow``)."""
+        task = serializer.instance
+        previous = task.column
+        column = serializer.validated_data.get('column', previous)
+        if column.pk == previous.pk:
+            super().perform_update(serializer)
+            return
+        
+        now = timezone.now()
+        flow.start(task, now)
+        flow.complete([task], column)
+        with transaction.atomic(using=current_shard()):
+            super().perform_update(serializer)
+            flow.record_moves([task], previous, column, now)
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic(using=current_shard()):
+            flow.record_exit(instance, instance.column)
+            release_task_tags([instance.pk])
+            super().perform_destroy(instance)
     
     @action(detail=False, methods=['get'])
     def column_tasks(self, request):
@@ -574,16 +966,15 @@ class TaskViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        column = get_object_or_404(Column, id=column_id)
+        column = self.identity.column(column_id)
         
-        if not (request.user == column.board.project.created_by or 
-                request.user in column.board.project.members.all()):
+        if not self.identity.can_access(request.user, column):
             return Response(
                 {"detail": "You do not have permission to view tasks in this column."},
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        tasks = Task.objects.filter(column=column).order_by('position')
+        tasks = task_snapshot_queryset().filter(column=column).order_by('position')
         serializer = self.get_serializer(tasks, many=True)
         return Response(serializer.data)
     
@@ -600,33 +991,57 @@ class TaskViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        source_column = get_object_or_404(Column, id=source_column_id)
-        destination_column = get_object_or_404(Column, id=destination_column_id)
+        source_column = self.identity.column(source_column_id)
+        destination_column = self.identity.column(destination_column_id)
         
-        if source_column.board.id != destination_column.board.id:
+        if source_column.board_id != destination_column.board_id:
             return Response(
                 {"detail": "Cannot move tasks between different boards."},
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        if not (request.user == source_column.board.project.created_by or 
-                request.user in source_column.board.project.members.all()):
+        if not self.identity.can_access(request.user, source_column):
             return Response(
                 {"detail": "You do not have permission to reorder tasks in this board."},
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        with transaction.atomic():
-            for index, task_id in enumerate(task_order):
-                task = get_object_or_404(Task, id=task_id)
+        tasks = self.identity.get_many(Task, task_order)
+        check_versions(request, tasks)
+        
+        now = timezone.now()
+        moved = []
+        for index, task in enumerate(tasks):
+            if task.column_id == source_column.id:
+                task.column = destination_column
+                task.position = index
+                task.updated_at = now
+                moved.append(task)
+        
+        fields = ['column', 'position', 'updated_at']
+        if source_column.id != destination_column.id:
+            fields += ['started_at', 'is_completed']
+            for task in moved:
+                flow.start(task, now)
+            flow.complete(moved, destination_column)
                 
-                if task.column.id == int(source_column_id):
-                    task.column = destination_column
-                    task.position = index
-                    task.save()
+        with transaction.atomic(using=current_shard()):
+            bulk_update_versioned(moved, fields)
+            bump_generation('task')
+            if source_column.id == destination_column.id:
+                self.log_activity('tasks_reordered', source_column, count=len(moved))
+            else:
+                flow.record_moves(moved, source_column, destination_column, now)
+                for task in moved:
+                    self.log_activity(
+                        'moved', task, from_column=source_column.name, to_column=destination_column.name
+                    )
                     
         return Response(
-            {"detail": "Tasks reordered successfully."},
+            {
+                "detail": "Tasks reordered successfully.",
+                "versions": {task.pk: task.version for task in moved}
+            },
             status=status.HTTP_200_OK
         )
     
@@ -635,8 +1050,7 @@ class TaskViewSet(viewsets.ModelViewSet):
         """Assign a task to a user."""
         task = self.get_object()
         
-        if not (request.user == task.column.board.project.created_by or 
-                request.user in task.column.board.project.members.all()):
+        if not self.identity.can_access(request.user, task):
             return Response(
                 {"detail": "You do not have permission to assign tasks in this project."},
                 status=status.HTTP_403_FORBIDDEN
@@ -646,47 +1060,106 @@ class TaskViewSet(viewsets.ModelViewSet):
         
         if user_id is None:
             task.assigned_to = None
-            task.save()
+            task.save(update_fields=['assigned_to', 'updated_at'])
+            self.log_activity('unassigned', task)
             return Response(
-                {"detail": "Task unassigned successfully."},
+                {"detail": "Task unassigned successfully.", "version": task.version},
                 status=status.HTTP_200_OK
             )
             
-        try:
-            user = User.objects.get(id=user_id)
-            
-            if not (user == task.column.board.project.created_by or 
-                    user in task.column.board.project.members.all()):
-                return Response(
-                    {"detail": "Cannot assign task to a user who is not a member of the project."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-                
-            task.assigned_to = user
-            task.save()
-            return Response(
-                {"detail": f"Task assigned to {user.username} successfully."},
-                status=status.HTTP_200_OK
-            )
-        except User.DoesNotExist:
+        user = self.identity.user(user_id)
+        if user is None:
             return Response(
                 {"detail": "User not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
+            
+        if not self.identity.can_access(user, task):
+            return Response(
+                {"detail": "Cannot assign task to a user who is not a member of the project."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+            
+        task.assigned_to = user
+        task.save(update_fields=['assigned_to', 'updated_at'])
+        self.log_activity('assigned', task, user_id=user.pk, username=user.username)
+        return Response(
+            {"detail": f"Task assigned to {user.username} successfully.", "version": task.version},
+            status=status.HTTP_200_OK
+        )
+    
+    @action(detail=True, methods=['get'], pagination_class=ActivityCursorPagination)
+    def activity(self, request, pk=None):
+        """Get the task's activity, newest first, a cursor-paginated page at a time."""
+        return self.activity_feed(task=self.get_object())
+    
+    MY_TASK_BUCKETS = ('overdue', 'today', 'upcoming', 'no_date')
     
     @action(detail=False, methods=['get'])
     def my_tasks(self, request):
-        """Get tasks assigned to the current user."""
-        tasks = Task.objects.filter(assigned_to=request.user)
-        serializer = self.get_serializer(tasks, many=True)
-        return Response(serializer.data)
+        """
+        Get tasks assigned to the current user.
+        
+        With ``?mode=buckets`` open tasks are split into overdue/today/upcoming/no_date
+        relative to the user's timezone (``?tz=`` overrides it). Pass ``?bucket=`` to
+        page through a single bucket.
+        """
+        if request.query_params.get('mode') != 'buckets':
+            tasks = task_snapshot_queryset().filter(my_tasks_condition(request))
+            serializer = self.get_serializer(tasks, many=True)
+            return Response(serializer.data)
+        
+        tz_name = request.query_params.get('tz') or request.user.timezone or settings.TIME_ZONE
+        try:
+            zone = ZoneInfo(tz_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            return Response(
+                {"detail": "Unknown timezone."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        bucket = request.query_params.get('bucket')
+        if bucket is not None and bucket not in self.MY_TASK_BUCKETS:
+            return Response(
+                {"detail": f"Bucket must be one of: {', '.join(self.MY_TASK_BUCKETS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        bucket_filters = my_task_bucket_filters(zone)
+        open_tasks = Task.objects.filter(my_tasks_condition(request), is_completed=False)
+        
+        def bucket_rows(name):
+            return my_task_bucket_rows(open_tasks, bucket_filters[name])
+        
+        paginator = BucketPagination()
+        if bucket is not None:
+            page = paginator.paginate_queryset(bucket_rows(bucket), request, view=self)
+            return paginator.get_paginated_response(MyTaskSerializer(page, many=True).data)
+        
+        counts = open_tasks.aggregate(**{
+            name: models.Count('id', filter=condition)
+            for name, condition in bucket_filters.items()
+        })
+        page_size = paginator.get_page_size(request)
+        return Response({
+            'timezone': tz_name,
+            'counts': counts,
+            'buckets': {
+                name: MyTaskSerializer(bucket_rows(name)[:page_size], many=True).data
+                for name in self.MY_TASK_BUCKETS
+            }
+        })
     
     @action(detail=False, methods=['get'])
     def light(self, request):
         """Get a lightweight list of tasks."""
-        queryset = self.get_queryset()
-        serializer = TaskLightSerializer(queryset, many=True)
-        return Response(serializer.data)
+        data = cached_user_data(
+            request, 'tasks', ('project', 'board', 'column', 'task', 'user'),
+            lambda: TaskLightSerializer(
+                self.get_queryset().select_related('assigned_to'), many=True
+            ).data
+        )
+        return Response(data)
 
     @action(detail=False, methods=['get'])
     def date_filter(self, request):
@@ -724,26 +1197,22 @@ class TaskViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
-class SubTaskViewSet(viewsets.ModelViewSet):
+class SubTaskViewSet(IdentityMapMixin, ProjectScopeMixin, viewsets.ModelViewSet):
     """API endpoint for subtasks."""
     serializer_class = SubTaskSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         """Return subtasks of tasks the user has access to."""
-        user = self.request.user
         return SubTask.objects.filter(
-            models.Q(task__column__board__project__created_by=user) | 
-            models.Q(task__column__board__project__members=user)
-        ).distinct()
+            self.board_scope('task__column__board')
+        )
     
     def perform_create(self, serializer):
         """Create a new subtask and check permissions."""
-        task_id = serializer.validated_data.get('task').id
-        task = get_object_or_404(Task, id=task_id)
+        task = self.identity.register(serializer.validated_data.get('task'))
         
-        if not (self.request.user == task.column.board.project.created_by or 
-                self.request.user in task.column.board.project.members.all()):
+        if not self.identity.can_access(self.request.user, task):
             raise permissions.PermissionDenied("You do not have permission to create subtasks for this task.")
             
         serializer.save()
@@ -758,10 +1227,9 @@ class SubTaskViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        task = get_object_or_404(Task, id=task_id)
+        task = self.identity.task(task_id)
         
-        if not (request.user == task.column.board.project.created_by or 
-                request.user in task.column.board.project.members.all()):
+        if not self.identity.can_access(request.user, task):
             return Response(
                 {"detail": "You do not have permission to view subtasks for this task."},
                 status=status.HTTP_403_FORBIDDEN
@@ -771,19 +1239,67 @@ class SubTaskViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(subtasks, many=True)
         return Response(serializer.data)
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(IdentityMapMixin, viewsets.ModelViewSet):
     """API endpoint for tags."""
-    serializer_class = TagSerializer
+    serializer_class = TagUsageSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        """Return tags created by the current user."""
-        return Tag.objects.filter(user=self.request.user)
+        """Return tags created by the current user, most used first."""
+        return Tag.objects.filter(user=self.request.user).order_by('-usage_count', 'name')
     
     def perform_create(self, serializer):
         """Set the tag creator to the current user."""
         serializer.save(user=self.request.user)
     
+    def bulk_ids(self, name, limit):
+        """Return the distinct ids listed in ``request.data[name]``, or None if they are missing or invalid."""
+        values = self.request.data.get(name)
+        if not isinstance(values, list) or not values or len(values) > limit:
+            return None
+        try:
+            return list(dict.fromkeys(int(value) for value in values))
+        except (TypeError, ValueError):
+            return None
+    
+    def bulk_targets(self, denied):
+        """
+        Return the ``(task_ids, tag_ids)`` of a bulk request, or the error response to send instead.
+        
+        Tasks are loaded in one query with their ancestors, so access is checked
+        once per project they belong to.
+        """
+        task_ids = self.bulk_ids('task_ids', MAX_BULK_TASKS)
+        tag_ids = self.bulk_ids('tag_ids', MAX_BULK_TAGS)
+        if task_ids is None or tag_ids is None:
+            return Response(
+                {"detail": f"task_ids (up to {MAX_BULK_TASKS}) and tag_ids (up to {MAX_BULK_TAGS}) are required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if self.get_queryset().filter(pk__in=tag_ids).count() != len(tag_ids):
+            raise Http404("No Tag matches the given query.")
+        for task in self.identity.get_many(Task, task_ids):
+            if not self.identity.can_access(self.request.user, task):
+                return Response({"detail": denied}, status=status.HTTP_403_FORBIDDEN)
+        return task_ids, tag_ids
+    
+    @action(detail=False, methods=['post'])
+    def bulk_add(self, request):
+        """Add every tag of ``tag_ids`` to every task of ``task_ids``."""
+        targets = self.bulk_targets("You do not have permission to add tags to these tasks.")
+        if isinstance(targets, Response):
+            return targets
+        return Response({"added": add_tags(*targets)}, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_remove(self, request):
+        """Remove every tag of ``tag_ids`` from every task of ``task_ids``."""
+        targets = self.bulk_targets("You do not have permission to remove tags from these tasks.")
+        if isinstance(targets, Response):
+            return targets
+        return Response({"removed": remove_tags(*targets)}, status=status.HTTP_200_OK)
+    
     @action(detail=True, methods=['post'])
     def add_to_task(self, request, pk=None):
         """Add the tag to a task."""
@@ -796,22 +1312,20 @@ class TagViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        task = get_object_or_404(Task, id=task_id)
+        task = self.identity.task(task_id)
         
-        if not (request.user == task.column.board.project.created_by or 
-                request.user in task.column.board.project.members.all()):
+        if not self.identity.can_access(request.user, task):
             return Response(
                 {"detail": "You do not have permission to add tags to this task."},
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        if TaskTag.objects.filter(task=task, tag=tag).exists():
+        if not add_tags([task.pk], [tag.pk]):
             return Response(
                 {"detail": "Tag is already added to this task."},
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        TaskTag.objects.create(task=task, tag=tag)
         return Response(
             {"detail": "Tag added to task successfully."},
             status=status.HTTP_200_OK
@@ -829,55 +1343,47 @@ class TagViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        task = get_object_or_404(Task, id=task_id)
+        task = self.identity.task(task_id)
         
-        if not (request.user == task.column.board.project.created_by or 
-                request.user in task.column.board.project.members.all()):
+        if not self.identity.can_access(request.user, task):
             return Response(
                 {"detail": "You do not have permission to remove tags from this task."},
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        try:
-            task_tag = TaskTag.objects.get(task=task, tag=tag)
-            task_tag.delete()
-            return Response(
-                {"detail": "Tag removed from task successfully."},
-                status=status.HTTP_200_OK
-            )
-        except TaskTag.DoesNotExist:
+        if not remove_tags([task.pk], [tag.pk]):
             return Response(
                 {"detail": "Tag is not added to this task."},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        return Response(
+            {"detail": "Tag removed from task successfully."},
+            status=status.HTTP_200_OK
+        )
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(IdentityMapMixin, ProjectScopeMixin, ActivityMixin, viewsets.ModelViewSet):
     """API endpoint for comments."""
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         """Return comments on tasks the user has access to."""
-        user = self.request.user
         return Comment.objects.filter(
-            models.Q(task__column__board__project__created_by=user) | 
-            models.Q(task__column__board__project__members=user)
-        ).distinct()
+            self.board_scope('task__column__board')
+        ).select_related('user')
     
     def perform_create(self, serializer):
         """Create a new comment and check permissions."""
-        task_id = serializer.validated_data.get('task').id
-        task = get_object_or_404(Task, id=task_id)
+        task = self.identity.register(serializer.validated_data.get('task'))
         
-        if not (self.request.user == task.column.board.project.created_by or 
-                self.request.user in task.column.board.project.members.all()):
+        if not self.identity.can_access(self.request.user, task):
             raise permissions.PermissionDenied("You do not have permission to comment on this task.")
             
-        serializer.save(user=self.request.user)
+        self.log_activity('created', serializer.save(user=self.request.user), task=task)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=CommentCursorPagination)
     def task_comments(self, request):
-        """Get all comments for a specific task."""
+        """Get the comments of a task, newest first, a cursor-paginated page at a time."""
         task_id = request.query_params.get('task_id')
         if not task_id:
             return Response(
@@ -885,39 +1391,34 @@ class CommentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        task = get_object_or_404(Task, id=task_id)
+        task = self.identity.task(task_id)
         
-        if not (request.user == task.column.board.project.created_by or 
-                request.user in task.column.board.project.members.all()):
+        if not self.identity.can_access(request.user, task):
             return Response(
                 {"detail": "You do not have permission to view comments for this task."},
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        comments = Comment.objects.filter(task=task).order_by('-created_at')
-        serializer = self.get_serializer(comments, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(Comment.objects.filter(task=task).select_related('user'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class AttachmentViewSet(viewsets.ModelViewSet):
+class AttachmentViewSet(IdentityMapMixin, ProjectScopeMixin, viewsets.ModelViewSet):
     """API endpoint for attachments."""
     serializer_class = AttachmentSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         """Return attachments on tasks the user has access to."""
-        user = self.request.user
         return Attachment.objects.filter(
-            models.Q(task__column__board__project__created_by=user) | 
-            models.Q(task__column__board__project__members=user)
-        ).distinct()
+            self.board_scope('task__column__board')
+        ).select_related('uploaded_by')
     
     def perform_create(self, serializer):
         """Create a new attachment and check permissions."""
-        task_id = serializer.validated_data.get('task').id
-        task = get_object_or_404(Task, id=task_id)
+        task = self.identity.register(serializer.validated_data.get('task'))
         
-        if not (self.request.user == task.column.board.project.created_by or 
-                self.request.user in task.column.board.project.members.all()):
+        if not self.identity.can_access(self.request.user, task):
             raise permissions.PermissionDenied("You do not have permission to add attachments to this task.")
             
         serializer.save(uploaded_by=self.request.user)
@@ -932,15 +1433,14 @@ class AttachmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        task = get_object_or_404(Task, id=task_id)
+        task = self.identity.task(task_id)
         
-        if not (request.user == task.column.board.project.created_by or 
-                request.user in task.column.board.project.members.all()):
+        if not self.identity.can_access(request.user, task):
             return Response(
                 {"detail": "You do not have permission to view attachments for this task."},
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        attachments = Attachment.objects.filter(task=task)
+        attachments = Attachment.objects.filter(task=task).select_related('uploaded_by')
         serializer = self.get_serializer(attachments, many=True)
         return Response(serializer.data)
\ No newline at end of file
@@ -12,6 +12,12 @@ then
     echo "PostgreSQL başladı"
 fi
 
+# Komut verilmişse (ör. arka plan işçileri) onu çalıştır
+if [ "$#" -gt 0 ]
+then
+    exec "$@"
+fi
+
 # Migration'ları çalıştır
 python manage.py migrate
 
@@ -19,5 +25,10 @@ python manage.py migrate
 echo "Statik dosyalar toplanıyor..."
 python manage.py collectstatic --noinput --clear
 
-# Gunicorn WSGI sunucusunu başlat
-exec gunicorn tida_backend.wsgi:application --bind 0.0.0.0:8000 --workers 3 --timeout 120
\ No newline at end of file
+# SERVER_MODE=asgi ise Uvicorn ASGI işçileriyle, aksi halde Gunicorn WSGI ile başlat
+if [ "$SERVER_MODE" = "asgi" ]
+then
+    exec uvicorn tida_backend.asgi:application --host 0.0.0.0 --port 8000 --workers ${WEB_WORKERS:-2}
+fi
+
+exec gunicorn tida_backend.wsgi:application --bind 0.0.0.0:8000 --workers ${WEB_WORKERS:-3} --timeout 120
\ No newline at end of file
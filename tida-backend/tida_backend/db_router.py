@@ -0,0 +1,201 @@
+# tida_backend/db_router.py
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+_routing = ContextVar('db_routing', default=None)
+_shard = ContextVar('db_shard', default=None)
+_workspace = ContextVar('workspace', default=None)
+_replica_health = {}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+def replica_is_healthy(alias):
+    """Return whether a replica accepts connections, re-checking at most every few seconds."""
+    healthy, checked_at = _replica_health.get(alias, (True, 0.0))
+    now = time.monotonic()
+    if now - checked_at < settings.REPLICA_HEALTH_CHECK_INTERVAL:
+        return healthy
+
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        healthy = connection.is_usable()
+    except Exception:
+        healthy = False
+        connection.close()
+
+    _replica_health[alias] = (healthy, now)
+    return healthy
+
+def choose_replica():
+    """Pick a healthy replica at random, falling back to the primary."""
+    replicas = [alias for alias in settings.READ_REPLICAS if replica_is_healthy(alias)]
+    return random.choice(replicas) if replicas else 'default'
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, e.g. when the result is cached under a fresh version."""
+    token = _routing.set(None)
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+def current_shard():
+    """Return the alias of the shard sharded models are read from and written to."""
+    return _shard.get() or 'default'
+
+@contextmanager
+def use_shard(alias):
+    """Route sharded models to ``alias`` inside the block."""
+    token = _shard.set(alias)
+    try:
+        yield
+    finally:
+        _shard.reset(token)
+
+def current_workspace():
+    """Return the id of the workspace the current request works in, or None."""
+    return _workspace.get()
+
+@contextmanager
+def use_workspace(workspace_id, shard):
+    """Work inside a workspace stored on ``shard`` for the duration of the block."""
+    token = _workspace.set(workspace_id)
+    try:
+        with use_shard(shard):
+            yield
+    finally:
+        _workspace.reset(token)
+
+def is_sharded(model):
+    """Return True if rows of ``model`` live on the shard of their workspace rather than on ``default``."""
+    return (
+        model._meta.app_label in settings.SHARDED_APPS
+        and model._meta.label_lower not in settings.GLOBAL_MODELS
+    )
+
+def shard_of(alias):
+    """Return the shard a database alias belongs to; replicas belong to ``default``."""
+    return 'default' if alias in settings.READ_REPLICAS else alias
+
+class ShardRouter:
+    """
+    Send sharded models to the current shard (see ``use_shard``) and leave the rest to the next router.
+
+    Related objects follow the instance they are reached from, and objects on two
+    different shards can never be related. Every shard holds the full schema: users
+    are replicated to all of them (``core.sharding``), so sharded rows can join them.
+    """
+    def shard_for(self, model, hints):
+        if not is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and is_sharded(type(instance)) and instance._state.db:
+            alias = instance._state.db
+        else:
+            alias = current_shard()
+        # 'default' is left to the replica router, which may read it from a replica.
+        return None if shard_of(alias) == 'default' else alias
+
+    def db_for_read(self, model, **hints):
+        return self.shard_for(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self.shard_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)) and obj1._state.db and obj2._state.db:
+            if shard_of(obj1._state.db) != shard_of(obj2._state.db):
+                return False
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+class ReadReplicaRouter:
+    """
+    Send reads of safe requests to a read replica and everything else to the primary.
+
+    Reads are only routed when ``ReadReplicaMiddleware`` marked the current request
+    as eligible, so management commands, workers and writes always use ``default``.
+    """
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not state.get('use_replica'):
+            return None
+        if connections['default'].in_atomic_block:
+            return 'default'
+
+        if 'alias' not in state:
+            state['alias'] = choose_replica()
+        return state['alias']
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.READ_REPLICAS
+
+class ReadReplicaMiddleware:
+    """
+    Mark safe requests to the core and accounts APIs as readable from a replica.
+
+    After a write the client gets a short-lived cookie that pins its reads to the
+    primary, so it never reads data older than its own last write.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _routing.set({})
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin_after_write(request, response)
+
+    async def __acall__(self, request):
+        token = _routing.set({})
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin_after_write(request, response)
+
+    def pin_after_write(self, request, response):
+        """Pin the client's reads to the primary for a while after a successful write."""
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.READ_REPLICAS or request.method not in SAFE_METHODS:
+            return None
+        if request.COOKIES.get(settings.REPLICA_PIN_COOKIE):
+            return None
+
+        view_module = getattr(getattr(view_func, 'cls', view_func), '__module__', '')
+        if view_module.split('.')[0] in settings.REPLICA_READ_APPS:
+            _routing.get()['use_replica'] = True
+        return None
@@ -0,0 +1,249 @@
+# tida_backend/metrics.py
+import hmac
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseForbidden
+
+_current = ContextVar('request_metrics', default=None)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+HISTOGRAMS = {
+    'tida_request_duration_seconds': ("Time to answer a request.", SECONDS_BUCKETS),
+    'tida_request_db_seconds': ("Time spent in SQL queries per request.", SECONDS_BUCKETS),
+    'tida_request_serialize_seconds': ("Time spent in serializers per request (including the queries they trigger).", SECONDS_BUCKETS),
+    'tida_request_render_seconds': ("Time spent rendering response bodies per request.", SECONDS_BUCKETS),
+    'tida_request_queries': ("SQL queries issued per request.", QUERY_BUCKETS),
+}
+
+PROCESSES_KEY = 'metrics:processes'
+PROCESSES_LOCK_KEY = 'metrics:processes:lock'
+LOCK_SECONDS = 5
+LOCK_ATTEMPTS = 50
+
+class RequestMetrics:
+    """
+    Counters and timings collected while a single request is processed.
+
+    ``timeline`` stays None unless the request is profiled; then every query is
+    appended to it as (start, duration, alias, sql).
+    """
+    __slots__ = ('queries', 'db', 'serialize', 'render', 'active', 'timeline')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        # Phases with a ``timing`` block open.
+        self.active = set()
+        self.timeline = None
+
+def current_metrics():
+    """Return the metrics of the request being processed, or None outside a request."""
+    return _current.get()
+
+@contextmanager
+def request_metrics():
+    """Collect metrics for the request processed inside the block."""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def timing(name):
+    """
+    Add the time spent in the block to the current request's ``name`` timing.
+
+    Blocks nested in one of the same phase are only counted once, so serializers may
+    time themselves recursively; blocks of another phase, such as a serializer run
+    while rendering, are still counted in theirs.
+    """
+    metrics = _current.get()
+    if metrics is None or name in metrics.active:
+        yield
+        return
+
+    metrics.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.active.discard(name)
+        setattr(metrics, name, getattr(metrics, name) + time.perf_counter() - started)
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting queries and their time for the current request."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db += elapsed
+        if metrics.timeline is not None:
+            metrics.timeline.append((started, elapsed, context['connection'].alias, sql))
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver adding ``record_query`` to every database connection once."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+def update_processes(change):
+    """
+    Replace the set of reporting processes with ``change(processes)`` under a cache lock,
+    so workers registering at the same time do not drop each other. Return False if the
+    lock stayed taken; the caller tries again on its next flush or scrape.
+    """
+    for _ in range(LOCK_ATTEMPTS):
+        if cache.add(PROCESSES_LOCK_KEY, os.getpid(), timeout=LOCK_SECONDS):
+            try:
+                cache.set(PROCESSES_KEY, change(cache.get(PROCESSES_KEY) or set()), timeout=None)
+            finally:
+                cache.delete(PROCESSES_LOCK_KEY)
+            return True
+        time.sleep(0.01)
+    return False
+
+class Registry:
+    """
+    Per-process histograms keyed by metric, route and method.
+
+    Every process periodically stores a snapshot in the shared cache; ``/metrics``
+    adds up the snapshots of all workers.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._requests = {}
+        self._flushed_at = 0.0
+
+    def observe(self, route, method, status, metrics, duration):
+        values = {
+            'tida_request_duration_seconds': duration,
+            'tida_request_db_seconds': metrics.db,
+            'tida_request_serialize_seconds': metrics.serialize,
+            'tida_request_render_seconds': metrics.render,
+            'tida_request_queries': metrics.queries,
+        }
+        status_class = f"{status // 100}xx"
+
+        with self._lock:
+            for name, value in values.items():
+                key = (name, route, method)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    # Bucket counts, then the +Inf bucket, then the sum.
+                    histogram = self._histograms[key] = [0] * (len(HISTOGRAMS[name][1]) + 1) + [0.0]
+                buckets = HISTOGRAMS[name][1]
+                for index, bound in enumerate(buckets):
+                    if value <= bound:
+                        histogram[index] += 1
+                histogram[len(buckets)] += 1
+                histogram[-1] += value
+
+            request_key = (route, method, status_class)
+            self._requests[request_key] = self._requests.get(request_key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'histograms': {key: list(values) for key, values in self._histograms.items()},
+                'requests': dict(self._requests),
+            }
+
+    def flush(self, force=False):
+        """Store this process's snapshot in the shared cache, at most every ``METRICS_FLUSH_SECONDS``."""
+        now = time.monotonic()
+        if not force and now - self._flushed_at < settings.METRICS_FLUSH_SECONDS:
+            return
+        self._flushed_at = now
+
+        pid = os.getpid()
+        cache.set(f"metrics:{pid}", self.snapshot(), timeout=settings.METRICS_SNAPSHOT_TIMEOUT)
+        if pid not in (cache.get(PROCESSES_KEY) or set()):
+            update_processes(lambda processes: processes | {pid})
+
+registry = Registry()
+
+def collect():
+    """Add up the snapshots of every process that reported to the shared cache."""
+    registry.flush(force=True)
+    processes = cache.get(PROCESSES_KEY) or set()
+    snapshots = cache.get_many([f"metrics:{pid}" for pid in processes])
+
+    # Processes whose snapshot expired have stopped; those registering meanwhile are kept.
+    gone = processes - {int(key.split(':')[1]) for key in snapshots}
+    if gone:
+        update_processes(lambda current: current - gone)
+
+    histograms = {}
+    requests = {}
+    for snapshot in snapshots.values():
+        for key, values in snapshot['histograms'].items():
+            total = histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(values):
+                total[index] += value
+        for key, count in snapshot['requests'].items():
+            requests[key] = requests.get(key, 0) + count
+    return histograms, requests
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else '+Inf'
+    return str(value)
+
+def exposition():
+    """Return all metrics in the Prometheus text exposition format."""
+    histograms, requests = collect()
+    lines = [
+        '# HELP tida_requests_total Requests answered, by route, method and status class.',
+        '# TYPE tida_requests_total counter',
+    ]
+    for (route, method, status), count in sorted(requests.items()):
+        lines.append(f"tida_requests_total{{{_labels(route=route, method=method, status=status)}}} {count}")
+
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, route, method), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            labels = _labels(route=route, method=method)
+            # Bucket counts are stored cumulatively, as Prometheus expects.
+            for bound, count in zip(buckets, values):
+                lines.append(f'{name}_bucket{{{labels},le="{_number(float(bound))}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {values[len(buckets)]}')
+            lines.append(f"{name}_sum{{{labels}}} {_number(float(values[-1]))}")
+            lines.append(f"{name}_count{{{labels}}} {values[len(buckets)]}")
+    return '\n'.join(lines) + '\n'
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for ``Authorization: Bearer <METRICS_TOKEN>`` or a staff session."""
+    token = settings.METRICS_TOKEN
+    sent = request.headers.get('Authorization', '').encode()
+    scraper = bool(token) and hmac.compare_digest(sent, f"Bearer {token}".encode())
+    if not scraper and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,193 @@
+# tida_backend/middleware.py
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import JsonResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.functional import SimpleLazyObject
+from accounts.models import User
+from .metrics import install_query_recorder, registry, request_metrics
+from .profiling import RequestProfile, request_token, requester_id, token_user_id
+from .throttling import concurrency_slot, queue_wait
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZip responses that are large enough for compression to pay off.
+
+    Small payloads are sent as-is: compressing them costs CPU and barely
+    changes their size. Already-compact formats (MessagePack) are skipped
+    below a separate, higher threshold.
+    """
+    def process_response(self, request, response):
+        if not response.streaming:
+            min_size = settings.COMPRESSION_MIN_SIZE
+            if response.get('Content-Type', '').startswith('application/msgpack'):
+                min_size = settings.COMPRESSION_MIN_SIZE_BINARY
+            if len(response.content) < min_size:
+                return response
+        return super().process_response(request, response)
+
+class LoadSheddingMiddleware:
+    """
+    Answer 503 with ``Retry-After`` before doing any work when the backend is saturated.
+
+    Requests that already waited ``MAX_QUEUE_WAIT_MS`` for a worker (measured from
+    nginx's ``X-Request-Start``) are dropped, since their clients have likely given
+    up, and at most ``MAX_CONCURRENT_REQUESTS`` are served at once across all
+    workers (see ``tida_backend.throttling``). ``/metrics`` is always answered.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if self.exempt(request):
+            return self.get_response(request)
+        if self.queued_too_long(request):
+            return self.shed("The server is overloaded; try again shortly.")
+        with concurrency_slot() as acquired:
+            if not acquired:
+                return self.shed("The server is busy; try again shortly.")
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.exempt(request):
+            return await self.get_response(request)
+        if self.queued_too_long(request):
+            return self.shed("The server is overloaded; try again shortly.")
+        with concurrency_slot() as acquired:
+            if not acquired:
+                return self.shed("The server is busy; try again shortly.")
+            return await self.get_response(request)
+
+    def exempt(self, request):
+        return request.path == '/metrics'
+
+    def queued_too_long(self, request):
+        if not settings.MAX_QUEUE_WAIT_MS:
+            return False
+        waited = queue_wait(request)
+        return waited is not None and waited * 1000 > settings.MAX_QUEUE_WAIT_MS
+
+    def shed(self, detail):
+        response = JsonResponse({'detail': detail}, status=503)
+        response['Retry-After'] = str(settings.LOAD_SHEDDING_RETRY_AFTER)
+        return response
+
+class MetricsMiddleware:
+    """
+    Record query count, DB, serializer and render time for every request.
+
+    The numbers feed the per-route histograms served at ``/metrics`` and, for staff
+    users or when ``SERVER_TIMING`` is on, a ``Server-Timing`` response header.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(None, connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        with request_metrics() as metrics:
+            response = self.get_response(request)
+        return self.finish(request, response, metrics, started, self.is_staff(request))
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with request_metrics() as metrics:
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics, started, await self.ais_staff(request))
+
+    def is_staff(self, request):
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_staff)
+
+    async def ais_staff(self, request):
+        user = getattr(request, 'user', None)
+        if isinstance(user, SimpleLazyObject):
+            # Never loaded by the view; resolving it synchronously is not allowed here.
+            user = await request.auser()
+        return bool(user is not None and user.is_staff)
+
+    def finish(self, request, response, metrics, started, is_staff):
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        registry.observe(route, request.method, response.status_code, metrics, duration)
+        registry.flush()
+
+        if settings.SERVER_TIMING or is_staff:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.db * 1000:.1f};desc="{metrics.queries} queries"',
+                f'serialize;dur={metrics.serialize * 1000:.1f}',
+                f'render;dur={metrics.render * 1000:.1f}',
+                f'total;dur={duration * 1000:.1f}',
+            ])
+        return response
+
+class ProfilingMiddleware:
+    """
+    Profile requests that carry a valid staff profile token; see ``tida_backend.profiling``.
+
+    Requests without a token pay for one header lookup. Whom the request is
+    authenticated as is only known once it has been handled, so the profile is
+    dropped then if that is not the token's user.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        user_id = self.staff_user_id(request)
+        if user_id is None or not User.objects.filter(pk=user_id, is_staff=True, is_active=True).exists():
+            return self.get_response(request)
+
+        profile = RequestProfile(user_id)
+        response = self.get_response(request)
+        if requester_id(request) != user_id:
+            profile.cancel()
+            return response
+        return profile.finish(request, response)
+
+    async def __acall__(self, request):
+        user_id = self.staff_user_id(request)
+        if user_id is None or not await User.objects.filter(pk=user_id, is_staff=True, is_active=True).aexists():
+            return await self.get_response(request)
+
+        profile = RequestProfile(user_id, all_threads=True)
+        response = await self.get_response(request)
+        # A session user is loaded lazily, with a sync query.
+        if await sync_to_async(requester_id)(request) != user_id:
+            profile.cancel()
+            return response
+        return profile.finish(request, response)
+
+    def staff_user_id(self, request):
+        token = request_token(request)
+        return token_user_id(token) if token else None
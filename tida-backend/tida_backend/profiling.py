@@ -0,0 +1,246 @@
+# tida_backend/profiling.py
+"""
+On-demand sampling profiler for single requests.
+
+A staff member copies a token from the admin *Request profiles* page and sends it
+with the slow request, in the ``X-Profile`` header or the ``_profile`` query
+parameter. The token only profiles requests authenticated as the member it was
+issued to, so a leaked one cannot be replayed from another account. While that
+request runs, a background thread samples its stack every
+``PROFILE_SAMPLE_INTERVAL`` seconds. The collapsed stacks (readable by
+flamegraph.pl and speedscope) and the request's SQL timeline are written to
+``PROFILES_DIR`` and listed on the admin page.
+"""
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.contrib import admin
+from django.core import signing
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from .metrics import current_metrics
+
+TOKEN_SALT = 'tida.profile'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = '_profile'
+
+PROFILE_ID = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+DOWNLOADS = {
+    'collapsed': ('.collapsed', 'text/plain'),
+    'json': ('.json', 'application/json'),
+}
+
+# Longer statements are cut in the saved timeline; bulk inserts can run to megabytes.
+MAX_SQL_LENGTH = 4000
+
+def make_token(user):
+    """Return a profile token for ``user``, valid for ``PROFILE_TOKEN_MAX_AGE`` seconds."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(str(user.pk))
+
+def token_user_id(token):
+    """Return the id of the user a token was issued to, or None if it is forged or expired."""
+    try:
+        return int(signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=settings.PROFILE_TOKEN_MAX_AGE
+        ))
+    except (signing.BadSignature, ValueError):
+        return None
+
+def request_token(request):
+    """Return the profile token sent with ``request``, if any."""
+    return request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+
+def requester_id(request):
+    """Return the id of the user a handled request was authenticated as, or None."""
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+def recorded_path(request):
+    """Return the request's path and query string without the profile token."""
+    query = request.GET.copy()
+    query.pop(PROFILE_PARAM, None)
+    return f"{request.path}?{query.urlencode()}" if query else request.path
+
+@functools.lru_cache(maxsize=4096)
+def _frame_label(code):
+    filename = code.co_filename
+    # Longest root first, so library frames read "django/..." rather than "site-packages/django/...".
+    for root in sorted({str(settings.BASE_DIR), *sys.path}, key=len, reverse=True):
+        if root and filename.startswith(root + os.sep):
+            filename = filename[len(root) + 1:]
+            break
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(';', ':')
+
+class Sampler(threading.Thread):
+    """
+    Record the call stack of one thread, or of every other thread, at a fixed interval.
+
+    Stacks are kept collapsed, root first, as ``"outer;inner;leaf" -> sample count``.
+    """
+    def __init__(self, interval, thread_id=None):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._done.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frames = {self.thread_id: frames[self.thread_id]} if self.thread_id in frames else {}
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if self.thread_id is None:
+                    stack.append(f"thread {names.get(ident, ident)}")
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+class RequestProfile:
+    """
+    Profile one request: sample its stack and collect its queries until ``finish``.
+
+    Under ASGI a request hops between the event loop and worker threads, so every
+    thread is sampled and concurrent requests show up in the profile too.
+    """
+    def __init__(self, user_id, all_threads=False):
+        self.user_id = user_id
+        self.sampler = Sampler(
+            settings.PROFILE_SAMPLE_INTERVAL, None if all_threads else threading.get_ident()
+        )
+        self.metrics = current_metrics()
+        if self.metrics is not None:
+            self.metrics.timeline = []
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def cancel(self):
+        """Stop sampling without saving anything."""
+        self.sampler.stop()
+        if self.metrics is not None:
+            self.metrics.timeline = None
+
+    def finish(self, request, response):
+        """Stop sampling, save the profile and point the response at it."""
+        self.sampler.stop()
+        duration = time.perf_counter() - self.started
+        timeline = self.metrics.timeline if self.metrics is not None else []
+
+        profile_id = f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        match = request.resolver_match
+        summary = {
+            'id': profile_id,
+            'created_at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': recorded_path(request),
+            'route': match.view_name if match else None,
+            'status': response.status_code,
+            'user_id': self.user_id,
+            'duration_ms': round(duration * 1000, 2),
+            'interval_ms': settings.PROFILE_SAMPLE_INTERVAL * 1000,
+            'samples': self.sampler.samples,
+            'query_count': len(timeline),
+            'db_ms': round(sum(elapsed for _, elapsed, _, _ in timeline) * 1000, 2),
+            'queries': [
+                {
+                    'start_ms': round((started - self.started) * 1000, 3),
+                    'duration_ms': round(elapsed * 1000, 3),
+                    'database': alias,
+                    'sql': sql[:MAX_SQL_LENGTH],
+                }
+                for started, elapsed, alias, sql in timeline
+            ],
+        }
+
+        os.makedirs(settings.PROFILES_DIR, exist_ok=True)
+        base = os.path.join(settings.PROFILES_DIR, profile_id)
+        with open(base + '.collapsed', 'w') as output:
+            output.writelines(f"{stack} {count}\n" for stack, count in sorted(self.sampler.stacks.items()))
+        with open(base + '.json', 'w') as output:
+            json.dump(summary, output, indent=1)
+        prune_profiles()
+
+        response['X-Profile-Id'] = profile_id
+        return response
+
+def profile_ids():
+    """Return the ids of the saved profiles, newest first."""
+    try:
+        names = os.listdir(settings.PROFILES_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (name[:-len('.json')] for name in names if name.endswith('.json') and PROFILE_ID.match(name[:-len('.json')])),
+        reverse=True
+    )
+
+def prune_profiles():
+    """Delete all but the newest ``PROFILES_KEEP`` profiles."""
+    for profile_id in profile_ids()[settings.PROFILES_KEEP:]:
+        for extension, _ in DOWNLOADS.values():
+            try:
+                os.remove(os.path.join(settings.PROFILES_DIR, profile_id + extension))
+            except FileNotFoundError:
+                pass
+
+def load_summary(profile_id):
+    with open(os.path.join(settings.PROFILES_DIR, profile_id + '.json')) as source:
+        summary = json.load(source)
+    summary.pop('queries', None)
+    return summary
+
+def profiles_view(request):
+    """Admin page listing recent profiles, with a fresh token for the current staff user."""
+    profiles = []
+    for profile_id in profile_ids():
+        try:
+            profiles.append(load_summary(profile_id))
+        except (OSError, ValueError):
+            continue
+
+    context = {
+        **admin.site.each_context(request),
+        'title': "Request profiles",
+        'profiles': profiles,
+        'token': make_token(request.user),
+        'token_minutes': settings.PROFILE_TOKEN_MAX_AGE // 60,
+        'header': PROFILE_HEADER,
+        'param': PROFILE_PARAM,
+    }
+    return TemplateResponse(request, 'admin/profiles.html', context)
+
+def profile_download_view(request, profile_id, kind):
+    """Download the collapsed stacks or the JSON summary and SQL timeline of a profile."""
+    if kind not in DOWNLOADS or not PROFILE_ID.match(profile_id):
+        raise Http404("No such profile.")
+
+    extension, content_type = DOWNLOADS[kind]
+    try:
+        source = open(os.path.join(settings.PROFILES_DIR, profile_id + extension), 'rb')
+    except FileNotFoundError:
+        raise Http404("No such profile.")
+    return FileResponse(
+        source, as_attachment=True, filename=profile_id + extension, content_type=content_type
+    )
@@ -0,0 +1,59 @@
+# tida_backend/renderers.py
+import datetime
+import decimal
+import uuid
+
+import msgpack
+import orjson
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+from .metrics import timing
+
+def encode_default(obj):
+    """Encode the values orjson and msgpack do not handle on their own, as DRF's ``JSONEncoder`` does."""
+    if isinstance(obj, decimal.Decimal):
+        # Serializers' DecimalFields already render strings; bare Decimals become numbers.
+        return float(obj)
+    if isinstance(obj, Promise):
+        return str(obj)
+    if isinstance(obj, datetime.datetime):
+        representation = obj.isoformat()
+        if representation.endswith('+00:00'):
+            representation = representation[:-6] + 'Z'
+        return representation
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+class ORJSONRenderer(BaseRenderer):
+    """JSON renderer backed by orjson, producing the same JSON as DRF's ``JSONRenderer``."""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timing('render'):
+            return orjson.dumps(data, default=encode_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack renderer for API clients that send ``Accept: application/msgpack``."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timing('render'):
+            return msgpack.packb(data, default=encode_default, use_bin_type=True)
@@ -0,0 +1,10 @@
+# tida_backend/serializers.py
+from rest_framework import serializers
+from .metrics import timing
+
+class ModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer whose output time is reported as the request's serializer time."""
+    
+    def to_representation(self, instance):
+        with timing('serialize'):
+            return super().to_representation(instance)
@@ -2,6 +2,8 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
+from corsheaders.defaults import default_headers
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-+t-mdlhxwl^cmy7gk8wtr12i$l#i&tj!h2j(y=*f#-&g+3k27!')
@@ -26,12 +28,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tida_backend.middleware.MetricsMiddleware',
+    'tida_backend.middleware.LoadSheddingMiddleware',
+    'tida_backend.middleware.ProfilingMiddleware',
+    'core.sharding.WorkspaceMiddleware',
+    'core.activity.ActivityMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'tida_backend.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tida_backend.db_router.ReadReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,6 +64,18 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'tida_backend.wsgi.application'
+ASGI_APPLICATION = 'tida_backend.asgi.application'
+
+# 'wsgi' (gunicorn sync workers) or 'asgi' (uvicorn workers); see entrypoint.sh
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+# Workers entrypoint.sh starts, and the requests each serves at once: one per sync
+# gunicorn worker; a uvicorn worker overlaps its async views while they wait on I/O
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', '2' if SERVER_MODE == 'asgi' else '3'))
+WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', '8' if SERVER_MODE == 'asgi' else '1'))
+
+# Serve the hot read endpoints from core/async_views.py; on by default under ASGI
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', str(SERVER_MODE == 'asgi')) == 'True'
 
 DATABASES = {
     'default': {
@@ -64,9 +85,68 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'postgres'),
         'HOST': os.environ.get('POSTGRES_HOST', 'db'),
         'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Databases whose workspaces are stored on them, 'default' first, e.g.
+# POSTGRES_SHARD_HOSTS="shard1=db-shard1:5432 shard2=db-shard2". Only ever append:
+# the position of a shard picks the range its primary keys are allocated from.
+DATABASE_SHARDS = ['default']
+for entry in os.environ.get('POSTGRES_SHARD_HOSTS', '').split():
+    alias, _, address = entry.partition('=')
+    host, _, port = address.partition(':')
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+    }
+    DATABASE_SHARDS.append(alias)
+
+# Apps whose tables are split across DATABASE_SHARDS by workspace, except these global models
+SHARDED_APPS = ('core',)
+GLOBAL_MODELS = ('core.workspace', 'core.workspace_members', 'core.job')
+# The n-th shard allocates primary keys from n * SHARD_ID_SPACING up
+SHARD_ID_SPACING = 2 ** 40
+# Seconds a workspace's shard is cached for; moving a workspace clears it at once
+WORKSPACE_CACHE_SECONDS = int(os.environ.get('WORKSPACE_CACHE_SECONDS', '300'))
+
+# Read replicas, e.g. POSTGRES_REPLICA_HOSTS="replica1:5432 replica2:5432"
+READ_REPLICAS = []
+for index, address in enumerate(os.environ.get('POSTGRES_REPLICA_HOSTS', '').split()):
+    host, _, port = address.partition(':')
+    alias = f'replica{index + 1}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['tida_backend.db_router.ShardRouter', 'tida_backend.db_router.ReadReplicaRouter']
+
+# Apps whose safe (GET/HEAD/OPTIONS) requests may read from a replica
+REPLICA_READ_APPS = ('core', 'accounts')
+# After a write, the client's reads stay on the primary for this many seconds
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '5'))
+REPLICA_PIN_COOKIE = 'tida_pin_primary'
+REPLICA_HEALTH_CHECK_INTERVAL = int(os.environ.get('REPLICA_HEALTH_CHECK_INTERVAL', '10'))
+
+# Shared between gunicorn workers so cache invalidation is seen by every process.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', '/tmp/tida-cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '20000')),
+        },
+    }
+}
+
+LIGHT_CACHE_TIMEOUT = int(os.environ.get('LIGHT_CACHE_TIMEOUT', str(24 * 60 * 60)))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -102,13 +182,74 @@ AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'tida_backend.renderers.ORJSONRenderer',
+        'tida_backend.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'tida_backend.parsers.ORJSONParser',
+        'tida_backend.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'tida_backend.throttling.TokenBucketThrottle',
+    ],
+    # nginx is the only proxy in front of the backend; it sets X-Forwarded-For.
+    'NUM_PROXIES': 1,
 }
 
+# Token buckets per user (or client IP), as (burst, tokens refilled per second); see
+# tida_backend/throttling.py. Every request draws on 'user'; requests to endpoints
+# weighted above 1 token also draw on 'expensive'. Kept in the shared THROTTLE_CACHE.
+THROTTLE_BUCKETS = {
+    'user': (
+        int(os.environ.get('THROTTLE_USER_BURST', '120')),
+        float(os.environ.get('THROTTLE_USER_RATE', '10')),
+    ),
+    'expensive': (
+        int(os.environ.get('THROTTLE_EXPENSIVE_BURST', '100')),
+        float(os.environ.get('THROTTLE_EXPENSIVE_RATE', '5')),
+    ),
+}
+THROTTLE_CACHE = os.environ.get('THROTTLE_CACHE', 'default')
+
+# Load shedding (tida_backend.middleware.LoadSheddingMiddleware): requests served at once
+# across all workers (0 for no cap), and the longest a request may have waited for a
+# worker since nginx received it (0 to never shed on that), before getting a 503.
+# The cap defaults to what the workers can serve at once; sync workers never exceed
+# it, so under WSGI it is the queue wait that sheds a saturated host.
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', WEB_WORKERS * WORKER_CONCURRENCY))
+CONCURRENCY_SLOT_DIR = os.environ.get('CONCURRENCY_SLOT_DIR', '/tmp/tida-slots')
+MAX_QUEUE_WAIT_MS = int(os.environ.get('MAX_QUEUE_WAIT_MS', '5000'))
+LOAD_SHEDDING_RETRY_AFTER = int(os.environ.get('LOAD_SHEDDING_RETRY_AFTER', '2'))
+
+# Responses smaller than this many bytes are not gzipped
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_MIN_SIZE_BINARY = int(os.environ.get('COMPRESSION_MIN_SIZE_BINARY', '4096'))
+
+# Request metrics (see tida_backend/metrics.py): Server-Timing headers for everyone
+# instead of staff only, the bearer token scrapers send to /metrics (without one, only
+# staff sessions may read it), and how often each worker publishes its histograms to
+# the shared cache
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'False') == 'True'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_FLUSH_SECONDS = int(os.environ.get('METRICS_FLUSH_SECONDS', '10'))
+METRICS_SNAPSHOT_TIMEOUT = int(os.environ.get('METRICS_SNAPSHOT_TIMEOUT', str(24 * 60 * 60)))
+
+# On-demand request profiles (see tida_backend/profiling.py): where they are written,
+# how many are kept, how long a staff token is valid and the sampling interval
+PROFILES_DIR = os.environ.get('PROFILES_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILES_KEEP = int(os.environ.get('PROFILES_KEEP', '200'))
+PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', str(60 * 60)))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.002'))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -122,6 +263,28 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.authentication.ClaimsTokenRefreshSerializer',
 }
 
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+# How long each worker trusts its cached copy of a user's token version and fields.
+# A revoked token keeps working on other workers for at most this many seconds.
+AUTH_USER_CACHE_SECONDS = int(os.environ.get('AUTH_USER_CACHE_SECONDS', '30'))
+
+CORS_ALLOW_ALL_ORIGINS = True
+# The frontend picks the workspace to work in with X-Workspace (see core/sharding.py) and
+# guards edits with If-Match against the ETag of tasks and columns (see core/concurrency.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-workspace', 'if-match')
+CORS_EXPOSE_HEADERS = ('etag',)
+
+# Background job queue (see core/jobs.py and `manage.py run_workers`)
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '600'))
+JOB_BACKOFF_BASE_SECONDS = int(os.environ.get('JOB_BACKOFF_BASE_SECONDS', '5'))
+JOB_BACKOFF_MAX_SECONDS = int(os.environ.get('JOB_BACKOFF_MAX_SECONDS', '3600'))
+# Background deletion of projects and boards (see core/deletion.py)
+DELETE_BATCH_SIZE = int(os.environ.get('DELETE_BATCH_SIZE', '500'))
+DELETE_JOB_SECONDS = int(os.environ.get('DELETE_JOB_SECONDS', '60'))
+# Activity log (see core/activity.py); retention 0 keeps every month.
+ACTIVITY_BUFFER_SIZE = int(os.environ.get('ACTIVITY_BUFFER_SIZE', '500'))
+ACTIVITY_PARTITIONS_AHEAD = int(os.environ.get('ACTIVITY_PARTITIONS_AHEAD', '3'))
+ACTIVITY_RETENTION_MONTHS = int(os.environ.get('ACTIVITY_RETENTION_MONTHS', '0'))
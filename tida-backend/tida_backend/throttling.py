@@ -0,0 +1,130 @@
+# tida_backend/throttling.py
+"""
+Rate limits and load shedding shared by every worker process.
+
+``TokenBucketThrottle`` gives each user (or client IP, before login) token
+buckets kept in the shared cache. A bucket holds up to ``burst`` tokens and
+refills ``rate`` of them per second; a request costs the weight its view gives
+its action in ``throttle_costs`` (1 by default), and requests costing more than
+one token also draw on the smaller ``expensive`` bucket, so a script replaying
+the full project tree runs dry long before one clicking through boards does.
+An empty bucket answers 429 with the ``Retry-After`` until it holds enough.
+
+``concurrency_slot`` caps the requests served at once across all workers with
+``MAX_CONCURRENT_REQUESTS`` lock files: the kernel releases a slot as soon as
+its holder closes it or dies, so the count never drifts.
+"""
+import fcntl
+import math
+import os
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+def request_cost(view_class, action):
+    """Return the tokens a request to ``action`` of ``view_class`` costs."""
+    return getattr(view_class, 'throttle_costs', {}).get(action, 1)
+
+def bucket_key(name, ident):
+    return f"throttle:{name}:{ident}"
+
+def take(ident, cost, now=None):
+    """
+    Take ``cost`` tokens from the buckets of ``ident``.
+
+    Return None if they held enough, or else the seconds until they will, taking
+    nothing: a refused request does not drain the buckets further.
+    """
+    buckets = settings.THROTTLE_BUCKETS
+    names = ['user', 'expensive'] if cost > 1 else ['user']
+    names = [name for name in names if name in buckets]
+    if not names:
+        return None
+
+    cache = caches[settings.THROTTLE_CACHE]
+    now = time.time() if now is None else now
+    stored = cache.get_many([bucket_key(name, ident) for name in names])
+    levels, wait = {}, 0.0
+    for name in names:
+        burst, rate = buckets[name]
+        tokens, updated = stored.get(bucket_key(name, ident), (burst, now))
+        tokens = min(burst, tokens + max(now - updated, 0) * rate)
+        # More than a full bucket would never be granted; charge a full one instead.
+        needed = min(cost, burst)
+        if tokens < needed:
+            wait = max(wait, (needed - tokens) / rate)
+        levels[name] = (tokens - needed, now, math.ceil(burst / rate) + 1)
+    if wait:
+        return wait
+
+    # Concurrent requests of one client may overwrite each other's level here and
+    # slip a few tokens through; the concurrency cap bounds what that can cost.
+    for name, (tokens, updated, timeout) in levels.items():
+        cache.set(bucket_key(name, ident), (tokens, updated), timeout=timeout)
+    return None
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle each user, or each client IP before login, with the buckets in ``THROTTLE_BUCKETS``."""
+
+    def get_ident(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        return f"ip:{super().get_ident(request)}"
+
+    def check(self, request, view_class, action):
+        """Return None if the request may proceed, or the seconds to wait before retrying it."""
+        return take(self.get_ident(request), request_cost(view_class, action))
+
+    def allow_request(self, request, view):
+        self.seconds = self.check(request, type(view), getattr(view, 'action', None))
+        return self.seconds is None
+
+    def wait(self):
+        return self.seconds
+
+@contextmanager
+def concurrency_slot():
+    """
+    Hold one of the ``MAX_CONCURRENT_REQUESTS`` slots shared by all workers for the
+    duration of the block, yielding False if every slot is taken (or True if no
+    cap is set).
+    """
+    limit = settings.MAX_CONCURRENT_REQUESTS
+    if not limit:
+        yield True
+        return
+
+    os.makedirs(settings.CONCURRENCY_SLOT_DIR, exist_ok=True)
+    # Start at a random slot so requests don't all contend for the first ones.
+    first = random.randrange(limit)
+    for offset in range(limit):
+        path = os.path.join(settings.CONCURRENCY_SLOT_DIR, f"slot-{(first + offset) % limit}")
+        # Opened per request: flock() locks belong to the open file, so two requests
+        # in one (ASGI) process only exclude each other through separate opens.
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        try:
+            yield True
+        finally:
+            os.close(fd)
+        return
+    yield False
+
+def queue_wait(request, now=None):
+    """Return the seconds the request waited after nginx received it, from ``X-Request-Start``, or None."""
+    value = request.headers.get('X-Request-Start', '')
+    try:
+        started = float(value.removeprefix('t='))
+    except ValueError:
+        return None
+    now = time.time() if now is None else now
+    return max(now - started, 0.0)
@@ -7,9 +7,17 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from .metrics import metrics_view
+from .profiling import profiles_view, profile_download_view
 
 urlpatterns = [
+    path('admin/profiles/', admin.site.admin_view(profiles_view), name='profiles'),
+    path(
+        'admin/profiles/<str:profile_id>.<str:kind>', 
+        admin.site.admin_view(profile_download_view), name='profile-download'
+    ),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/auth/', include('djoser.urls')),
@@ -3,6 +3,9 @@ import axios from 'axios';
 
 const baseURL = process.env.REACT_APP_API_URL || 'http://localhost/api/';
 
+// Request config sending the version an edit is based on; the server answers 409 if it is stale.
+const ifMatch = (version) => (version == null ? {} : { headers: { 'If-Match': `"${version}"` } });
+
 const axiosInstance = axios.create({
   baseURL,
   timeout: 5000,
@@ -20,6 +23,10 @@ axiosInstance.interceptors.request.use(
     if (token) {
       config.headers['Authorization'] = `Bearer ${token}`;
     }
+    const workspaceId = localStorage.getItem('workspace_id');
+    if (workspaceId) {
+      config.headers['X-Workspace'] = workspaceId;
+    }
     return config;
   },
   (error) => {
@@ -102,6 +109,27 @@ const authAPI = {
   },
 };
 
+// Workspaces API
+const workspacesAPI = {
+  getWorkspaces: async () => {
+    try {
+      const response = await axiosInstance.get('workspaces/');
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  createWorkspace: async (workspaceData) => {
+    try {
+      const response = await axiosInstance.post('workspaces/', workspaceData);
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+};
+
 // Projects API
 const projectsAPI = {
   getProjects: async () => {
@@ -268,6 +296,24 @@ const boardsAPI = {
       throw error;
     }
   },
+
+  getCumulativeFlow: async (id, days = 90) => {
+    try {
+      const response = await axiosInstance.get(`boards/${id}/cumulative_flow/?days=${days}`);
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  getFlowMetrics: async (id, days = 90) => {
+    try {
+      const response = await axiosInstance.get(`boards/${id}/flow_metrics/?days=${days}`);
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
 };
 
 // Columns API
@@ -299,9 +345,9 @@ const columnsAPI = {
     }
   },
 
-  updateColumn: async (id, columnData) => {
+  updateColumn: async (id, columnData, version = null) => {
     try {
-      const response = await axiosInstance.put(`columns/${id}/`, columnData);
+      const response = await axiosInstance.put(`columns/${id}/`, columnData, ifMatch(version));
       return response.data;
     } catch (error) {
       throw error;
@@ -317,11 +363,13 @@ const columnsAPI = {
     }
   },
 
-  reorderColumns: async (boardId, columnOrder) => {
+  // versions maps column ids to the versions the new order is based on; resolves to the new versions.
+  reorderColumns: async (boardId, columnOrder, versions = {}) => {
     try {
       const response = await axiosInstance.post('columns/reorder/', {
         board_id: boardId,
-        column_order: columnOrder
+        column_order: columnOrder,
+        versions
       });
       return response.data;
     } catch (error) {
@@ -368,9 +416,9 @@ const tasksAPI = {
     }
   },
 
-  updateTask: async (id, taskData) => {
+  updateTask: async (id, taskData, version = null) => {
     try {
-      const response = await axiosInstance.put(`tasks/${id}/`, taskData);
+      const response = await axiosInstance.put(`tasks/${id}/`, taskData, ifMatch(version));
       return response.data;
     } catch (error) {
       throw error;
@@ -386,12 +434,14 @@ const tasksAPI = {
     }
   },
 
-  reorderTasks: async (sourceColumnId, destinationColumnId, taskOrder) => {
+  // versions maps task ids to the versions the move is based on; resolves to the new versions.
+  reorderTasks: async (sourceColumnId, destinationColumnId, taskOrder, versions = {}) => {
     try {
       const response = await axiosInstance.post('tasks/reorder/', {
         source_column_id: sourceColumnId,
         destination_column_id: destinationColumnId,
-        task_order: taskOrder
+        task_order: taskOrder,
+        versions
       });
       return response.data;
     } catch (error) {
@@ -399,9 +449,9 @@ const tasksAPI = {
     }
   },
 
-  assignTask: async (taskId, userId) => {
+  assignTask: async (taskId, userId, version = null) => {
     try {
-      const response = await axiosInstance.post(`tasks/${taskId}/assign/`, { user_id: userId });
+      const response = await axiosInstance.post(`tasks/${taskId}/assign/`, { user_id: userId }, ifMatch(version));
       return response.data;
     } catch (error) {
       throw error;
@@ -543,13 +593,34 @@ const tagsAPI = {
       throw error;
     }
   },
+
+  // Tags every task of taskIds with every tag of tagIds; resolves to { added }.
+  bulkAddTags: async (tagIds, taskIds) => {
+    try {
+      const response = await axiosInstance.post('tags/bulk_add/', { tag_ids: tagIds, task_ids: taskIds });
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
+
+  // Removes every tag of tagIds from every task of taskIds; resolves to { removed }.
+  bulkRemoveTags: async (tagIds, taskIds) => {
+    try {
+      const response = await axiosInstance.post('tags/bulk_remove/', { tag_ids: tagIds, task_ids: taskIds });
+      return response.data;
+    } catch (error) {
+      throw error;
+    }
+  },
 };
 
 // Comments API
 const commentsAPI = {
-  getTaskComments: async (taskId) => {
+  // Returns a page of comments, newest first; pass the page's `next` URL to load older ones.
+  getTaskComments: async (taskId, next = null) => {
     try {
-      const response = await axiosInstance.get(`comments/task_comments/?task_id=${taskId}`);
+      const response = await axiosInstance.get(next || `comments/task_comments/?task_id=${taskId}`);
       return response.data;
     } catch (error) {
       throw error;
@@ -662,6 +733,7 @@ const usersAPI = {
 
 export const API = {
   auth: authAPI,
+  workspaces: workspacesAPI,
   projects: projectsAPI,
   boards: boardsAPI,
   columns: columnsAPI,
@@ -1,17 +1,42 @@
 // src/components/task/CommentList.jsx
-import React, { useState } from 'react';
+import React, { useCallback, useEffect, useState } from 'react';
 import { useAuth } from '../../hooks/useAuth';
 import API from '../../api/api';
 import { format } from 'date-fns';
 
-const CommentList = ({ taskId, comments, onCommentsChange }) => {
+const CommentList = ({ taskId, onCommentsChange }) => {
   const { user } = useAuth();
+  const [comments, setComments] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
+  const [isLoading, setIsLoading] = useState(false);
   const [newComment, setNewComment] = useState('');
   const [isSubmitting, setIsSubmitting] = useState(false);
   const [error, setError] = useState(null);
   const [editingId, setEditingId] = useState(null);
   const [editContent, setEditContent] = useState('');
 
+  const loadComments = useCallback(async (next = null) => {
+    setIsLoading(true);
+    try {
+      const page = await API.comments.getTaskComments(taskId, next);
+      setComments((current) => (next ? [...current, ...page.results] : page.results));
+      setNextPage(page.next);
+    } catch (err) {
+      console.error('Error loading comments:', err);
+    } finally {
+      setIsLoading(false);
+    }
+  }, [taskId]);
+
+  useEffect(() => {
+    loadComments();
+  }, [loadComments]);
+
+  const refresh = () => {
+    loadComments();
+    if (onCommentsChange) onCommentsChange();
+  };
+
   const handleAddComment = async (e) => {
     e.preventDefault();
     
@@ -27,7 +52,7 @@ const CommentList = ({ taskId, comments, onCommentsChange }) => {
       });
       
       setNewComment('');
-      if (onCommentsChange) onCommentsChange();
+      refresh();
     } catch (err) {
       console.error('Error adding comment:', err);
       setError('Failed to add comment.');
@@ -56,7 +81,7 @@ const CommentList = ({ taskId, comments, onCommentsChange }) => {
       });
       
       setEditingId(null);
-      if (onCommentsChange) onCommentsChange();
+      refresh();
     } catch (err) {
       console.error('Error updating comment:', err);
     }
@@ -66,7 +91,7 @@ const CommentList = ({ taskId, comments, onCommentsChange }) => {
     if (window.confirm('Are you sure you want to delete this comment?')) {
       try {
         await API.comments.deleteComment(commentId);
-        if (onCommentsChange) onCommentsChange();
+        refresh();
       } catch (err) {
         console.error('Error deleting comment:', err);
       }
@@ -97,7 +122,7 @@ const CommentList = ({ taskId, comments, onCommentsChange }) => {
         </div>
       </form>
       
-      {comments.length === 0 ? (
+      {comments.length === 0 && !isLoading ? (
         <p className="text-gray-500 italic">No comments yet. Add one above.</p>
       ) : (
         <div className="space-y-6">
@@ -170,6 +195,17 @@ const CommentList = ({ taskId, comments, onCommentsChange }) => {
               )}
             </div>
           ))}
+          {nextPage && (
+            <div className="flex justify-center">
+              <button
+                onClick={() => loadComments(nextPage)}
+                disabled={isLoading}
+                className="text-sm text-blue-600 hover:text-blue-800 disabled:opacity-50"
+              >
+                {isLoading ? 'Loading...' : 'Load older comments'}
+              </button>
+            </div>
+          )}
         </div>
       )}
     </div>
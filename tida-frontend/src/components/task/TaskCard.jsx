@@ -185,12 +185,12 @@ const TaskCard = memo(({ task, index, columnId, onTaskUpdated, onTaskDeleted })
             </div>
             
             <div className="px-3 py-1.5 bg-gray-50 text-xs text-gray-500 flex items-center space-x-4 border-t border-gray-200 rounded-b-lg">
-              {task.comments?.length > 0 && (
-                <div className="flex items-center" title={`${task.comments.length} comments`}>
+              {task.comment_count > 0 && (
+                <div className="flex items-center" title={`${task.comment_count} comments`}>
                   <svg className="h-3.5 w-3.5 mr-1 text-gray-400" fill="none" viewBox="0 0 24 24" stroke="currentColor">
                     <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M8 10h.01M12 10h.01M16 10h.01M9 16H5a2 2 0 01-2-2V6a2 2 0 012-2h14a2 2 0 012 2v8a2 2 0 01-2 2h-5l-5 5v-5z" />
                   </svg>
-                  {task.comments.length}
+                  {task.comment_count}
                 </div>
               )}
               
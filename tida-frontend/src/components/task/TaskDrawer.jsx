@@ -298,7 +298,7 @@ const TaskDrawer = ({ taskId, isOpen, onClose, onTaskUpdated, onTaskDeleted }) =
                       >
                         Comments
                         <span className="ml-1.5 px-2 py-0.5 text-xs rounded-full bg-gray-100 text-gray-800">
-                          {task.comments?.length || 0}
+                          {task.comment_count || 0}
                         </span>
                       </button>
                       
@@ -433,7 +433,6 @@ const TaskDrawer = ({ taskId, isOpen, onClose, onTaskUpdated, onTaskDeleted }) =
                     {activeTab === 'comments' && (
                       <CommentList 
                         taskId={task.id} 
-                        comments={task.comments || []} 
                         onCommentsChange={handleTaskUpdate}
                       />
                     )}